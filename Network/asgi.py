@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Network.settings')
+os.environ.setdefault('NETWORK_ROOT_URLCONF', 'Network.asgi_urls')
+os.environ.setdefault('NETWORK_ASGI', '1')
 
 application = get_asgi_application()
@@ -0,0 +1,12 @@
+"""
+URL configuration used under ASGI: the read endpoints of first_lab are served by
+native async views, everything else falls through to Network.urls.
+"""
+from django.urls import path, include
+
+from Network.urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path('api/v1/', include('first_lab.async_urls')),
+    *sync_urlpatterns,
+]
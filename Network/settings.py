@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 import datetime
+import os
 from pathlib import Path
 
+import django
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -59,17 +62,22 @@ JWT_AUTH = {
 }
 
 MIDDLEWARE = [
+    'first_lab.middleware.MetricsMiddleware',
+    'first_lab.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'first_lab.middleware.ReplicaRoutingMiddleware',
+    'first_lab.middleware.HashingBusyMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware'
 ]
 
-ROOT_URLCONF = 'Network.urls'
+# Под ASGI (Network/asgi.py) используются нативные async-представления для чтения
+ROOT_URLCONF = os.environ.get('NETWORK_ROOT_URLCONF', 'Network.urls')
 
 TEMPLATES = [
     {
@@ -91,11 +99,53 @@ TEMPLATES = [
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework_simplejwt.authentication.JWTAuthentication',
-        'rest_framework.authentication.BasicAuthentication',
+        'first_lab.authentication.CachedBasicAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-    ]
+    ],
+    # JSON через orjson (если установлен), вывод тот же, что у JSONRenderer
+    'DEFAULT_RENDERER_CLASSES': [
+        'first_lab.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
+# Сколько отклоненных строк импорта перечисляется в отчете; дальше только счетчик
+IMPORT_REJECTED_LINES_LIMIT = 1000
+
+# Наибольшее число книг в одном запросе POST /books/bulk/
+BOOK_BULK_MAX_SIZE = int(os.environ.get('BOOK_BULK_MAX_SIZE', 50000))
+
+# Наибольшее число id в одном запросе batch_get (/books/batch/, /publishers/batch/, /booklovers/batch/)
+BATCH_GET_MAX_SIZE = int(os.environ.get('BATCH_GET_MAX_SIZE', 100))
+
+# Сжатие ответов (first_lab.middleware.CompressionMiddleware): br и zstd - если установлены brotli и zstandard
+COMPRESSION_ENCODINGS = ['zstd', 'br', 'gzip']
+COMPRESSION_LEVELS = {'zstd': 3, 'br': 4, 'gzip': 4}
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+
+# Списки сериализуются из values() без экземпляров моделей (first_lab.values_serializer); 0 - через DRF
+FAST_SERIALIZATION = os.environ.get('FAST_SERIALIZATION', '1') != '0'
+
+# Кэш проверенных Basic-учетных данных (в памяти процесса), 0 - отключить
+BASIC_AUTH_CACHE_TIMEOUT = 60
+BASIC_AUTH_CACHE_SIZE = 1024
+
+# Пул для хэширования паролей (login, register, change_password); при переполнении очереди - 503.
+# Поток запроса ждет результат хэширования, поэтому HASHING_QUEUE_LIMIT должен быть меньше
+# числа потоков сервера, иначе вход может занять их все
+HASHING_WORKERS = int(os.environ.get('HASHING_WORKERS', os.cpu_count() or 2))
+HASHING_QUEUE_LIMIT = int(os.environ.get('HASHING_QUEUE_LIMIT', HASHING_WORKERS * 4))
+HASHING_RETRY_AFTER = 1
+# Пароли проверяются в пуле и при входе через API, и при Basic-авторизации, и в админке
+AUTHENTICATION_BACKENDS = ['first_lab.hashing.PooledModelBackend']
+
+# Общий каталог снимков метрик для нескольких процессов (gunicorn/uvicorn workers); пусто - только свой процесс
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 1))
+# /metrics отдается только с этих адресов (REMOTE_ADDR) или по заголовку Authorization: Bearer <METRICS_TOKEN>
+METRICS_ALLOWED_IPS = os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+
 WSGI_APPLICATION = 'Network.wsgi.application'
 
 # Database
@@ -112,6 +162,85 @@ DATABASES = {
     }
 }
 
+# Локальный запуск без PostgreSQL (например, manage.py bench_api): DATABASE_SQLITE_PATH=bench.sqlite3
+if os.environ.get('DATABASE_SQLITE_PATH'):
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['DATABASE_SQLITE_PATH'],
+        # IMMEDIATE и WAL: параллельные запросы ждут блокировку, а не падают с "database is locked"
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'init_command': 'PRAGMA journal_mode=WAL;'},
+    }
+
+# Соединения с PostgreSQL переиспользуются между запросами.
+# С psycopg[pool] (Django 5.1+) используется пул с проверкой соединения при выдаче.
+# Без него под WSGI соединение живет в потоке воркера не дольше DB_CONN_MAX_LIFETIME секунд.
+# Под ASGI постоянные соединения Django не поддерживает: нужен пул или PgBouncer.
+DB_POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', 2))
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+DB_CONN_MAX_LIFETIME = int(os.environ.get('DB_CONN_MAX_LIFETIME', 1800))
+DB_CONN_MAX_IDLE = int(os.environ.get('DB_CONN_MAX_IDLE', 300))
+
+try:
+    from psycopg_pool import ConnectionPool
+except ImportError:
+    ConnectionPool = None
+
+USE_DB_POOL = (DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql' and ConnectionPool is not None
+               and django.VERSION >= (5, 1) and os.environ.get('DB_POOL', '1') != '0')
+
+if USE_DB_POOL:
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': DB_POOL_MIN_SIZE,
+            'max_size': DB_POOL_SIZE,
+            'timeout': DB_POOL_TIMEOUT,
+            'max_lifetime': DB_CONN_MAX_LIFETIME,
+            'max_idle': DB_CONN_MAX_IDLE,
+        },
+    }
+    # Для пула Django передает ConnectionPool.check_connection: соединение проверяется при выдаче
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+elif os.environ.get('NETWORK_ASGI') != '1':
+    DATABASES['default']['CONN_MAX_AGE'] = DB_CONN_MAX_LIFETIME
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+# Реплики для чтения: DATABASE_REPLICA_HOSTS=host1,host2:5433 (остальные параметры как у default).
+# GET/HEAD читают с реплик, после записи клиент REPLICA_STICKINESS_SECONDS читает с основной базы.
+REPLICA_DATABASES = []
+for index, address in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_HOSTS', '').split(',')), start=1):
+    host, _, port = address.strip().partition(':')
+    alias = f'replica{index}'
+    DATABASES[alias] = {**DATABASES['default'], 'HOST': host, 'PORT': port or DATABASES['default']['PORT'],
+                        'TEST': {'MIRROR': 'default'}}
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ['first_lab.routers.ReplicaRouter']
+REPLICA_STICKINESS_SECONDS = 5
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+# Локальный кэш у каждого процесса свой; при нескольких воркерах задайте REDIS_URL,
+# чтобы инвалидация списков была видна всем процессам
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'network-default',
+        }
+    }
+
+# Время жизни закэшированных ответов списков регионов и издательств, секунды
+LIST_CACHE_TIMEOUT = 300
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -146,6 +275,24 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Миниатюры обложек строятся в пуле потоков; 0 - синхронно в запросе (для тестов)
+THUMBNAIL_WORKERS = int(os.environ.get('THUMBNAIL_WORKERS', 2))
+BOOK_COVER_THUMBNAIL_SIZES = {
+    'small': (160, 240),
+    'medium': (320, 480),
+    'large': (640, 960),
+}
+
+# Возобновляемая загрузка обложек: части файлов хранятся вне MEDIA_ROOT до финализации.
+# На одном разделе с MEDIA_ROOT готовый файл переносится без копирования.
+COVER_UPLOAD_DIR = os.environ.get('COVER_UPLOAD_DIR', str(BASE_DIR / 'uploads'))
+COVER_UPLOAD_MAX_SIZE = 50 * 1024 * 1024
+COVER_UPLOAD_MAX_CHUNK_SIZE = 8 * 1024 * 1024
+COVER_UPLOAD_EXPIRY_HOURS = 24
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class FirstLabConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'first_lab'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from first_lab.db_metrics import count_connect
+
+        connection_created.connect(count_connect, dispatch_uid='first_lab.count_connect')
@@ -0,0 +1,16 @@
+from django.urls import path
+
+from first_lab import async_views
+
+# Маршруты чтения, обслуживаемые нативными async-представлениями под ASGI.
+# Имена совпадают с first_lab.urls, поэтому reverse() не меняется.
+urlpatterns = [
+    path('regions/<int:pk>/', async_views.region_detail, name='region-detail'),
+    path('regions/', async_views.region_list, name='regions'),
+    path('booklovers/<int:pk>/', async_views.book_lover_detail, name='book-lovers-details'),
+    path('booklovers/', async_views.book_lover_list, name='book-lovers'),
+    path('publishers/', async_views.publisher_list, name='publisher-list'),
+    path('publishers/<int:pk>/', async_views.publisher_detail, name='publisher-detail'),
+    path('books/', async_views.book_list, name='book-list'),
+    path('books/<int:pk>/', async_views.book_detail, name='book-detail'),
+]
@@ -0,0 +1,197 @@
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException, NotFound
+
+from first_lab.models import Book, BookLover, Publisher, Region
+from first_lab.pagination import KeysetPagination
+from first_lab.renderers import ORJSONRenderer
+from first_lab.serializator import BookLoverSerializer, BookSerializer, PublisherSerializer, RegionSerializer
+from first_lab.views import (RegionViewSet, RegionViewSetById, BookLoverViewSet, BookLoverViewSetById,
+                             PublisherViewSet, BookViewSet, MyModelPagination)
+from first_lab.cache import publisher_list_cache, region_list_cache
+
+JSON_MEDIA_TYPE = 'application/json'
+
+
+def json_response(data, status=200):
+    response = HttpResponse(ORJSONRenderer().render(data), content_type=JSON_MEDIA_TYPE, status=status)
+    response['Vary'] = 'Accept'
+    return response
+
+
+def call_sync_view(view, request, *args, **kwargs):
+    response = view(request, *args, **kwargs)
+    if callable(getattr(response, 'render', None)):
+        response = response.render()
+    return response
+
+
+class AsyncReadView(View):
+    """
+    Serves GET with the async ORM so that under ASGI a request waiting on the
+    database does not hold a worker thread. Writes, exports and non-JSON
+    renderers are delegated to ``sync_view``, the existing DRF view for the route;
+    so are reads that its authentication, permissions or throttles refuse.
+    Subclasses implement ``get``.
+    """
+    viewset_class = None
+    serializer_class = None
+    sync_view = None
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method != 'GET' or not self.is_native_request(request):
+            return await self.delegate(request, *args, **kwargs)
+        try:
+            await sync_to_async(self.check_access)(request, *args, **kwargs)
+        except APIException:
+            # Ответ об отказе (401/403/429 с заголовками) строит синхронная view, как и без async
+            return await self.delegate(request, *args, **kwargs)
+        request.accepted_media_type = JSON_MEDIA_TYPE
+        try:
+            return await self.get(request, *args, **kwargs)
+        except Http404 as exc:
+            return json_response({'detail': NotFound(*exc.args).detail}, status=404)
+        except APIException as exc:
+            # Как exception_handler DRF: ошибки валидации отдаются без обертки в detail
+            data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+            return json_response(data, status=exc.status_code)
+
+    def check_access(self, request, *args, **kwargs):
+        """Authentication, permission and throttle checks of the DRF view the route delegates to."""
+        viewset = self.viewset_class()
+        viewset.action_map = self.sync_view.actions
+        viewset.args = args
+        viewset.kwargs = kwargs
+        viewset.format_kwarg = None
+        viewset.request = viewset.initialize_request(request, *args, **kwargs)
+        viewset.perform_authentication(viewset.request)
+        viewset.check_permissions(viewset.request)
+        viewset.check_throttles(viewset.request)
+
+    @staticmethod
+    def is_native_request(request):
+        if 'format' in request.GET:
+            return False
+        accept = request.headers.get('Accept', '').strip()
+        return not accept or accept == '*/*' or JSON_MEDIA_TYPE in accept
+
+    async def delegate(self, request, *args, **kwargs):
+        return await sync_to_async(call_sync_view)(self.sync_view, request, *args, **kwargs)
+
+
+class AsyncListView(AsyncReadView):
+    list_cache = None
+
+    @staticmethod
+    def get_page_bounds(viewset, request):
+        """Same page and page size as MyModelPagination, or None for what only the sync view handles."""
+        pagination_data = viewset.get_pagination(request)
+        page_size = pagination_data['page_size'] if pagination_data else MyModelPagination.page_size
+        try:
+            page_size = int(request.GET[MyModelPagination.page_size_query_param])
+            if page_size <= 0:
+                raise ValueError
+        except (KeyError, ValueError):
+            pass
+        try:
+            page = int(request.GET.get('page', 1))
+        except ValueError:
+            return None
+        if page <= 0 or page_size <= 0:
+            return None
+        return page, page_size
+
+    async def get(self, request, *args, **kwargs):
+        key = None
+        if self.list_cache is not None:
+            key = await self.list_cache.aget_key(request)
+            data = await self.list_cache.aget(key)
+            if data is not None:
+                return json_response(data)
+
+        viewset = self.viewset_class()
+        # Построение queryset может обращаться к БД (например, проверка FTS-таблицы), поэтому в потоке
+        queryset = await sync_to_async(viewset.get_list_queryset)(request)
+        list_serializer = viewset.get_list_serializer(viewset.get_requested_fields(request),
+                                                      viewset.get_requested_expansions(request))
+        queryset = list_serializer.get_queryset(queryset)
+
+        if KeysetPagination.is_requested(request):
+            paginator = KeysetPagination.for_view(viewset, request)
+            rows = await paginator.apaginate_queryset(queryset, request)
+            data = paginator.get_paginated_data(await list_serializer.aserialize(rows))
+        else:
+            bounds = self.get_page_bounds(viewset, request)
+            if bounds is None:
+                # Например, page=last: считать страницы умеет только синхронная пагинация
+                return await self.delegate(request, *args, **kwargs)
+            page, page_size = bounds
+            offset = (page - 1) * page_size
+            rows = [row async for row in queryset[offset:offset + page_size]]
+            if not rows and page != 1:
+                return json_response({'detail': 'Invalid page.'}, status=404)
+            data = await list_serializer.aserialize(rows)
+
+        if key is not None:
+            await self.list_cache.aset(key, data)
+        return json_response(data)
+
+
+class AsyncDetailView(AsyncReadView):
+    model = None
+
+    async def get(self, request, pk, *args, **kwargs):
+        viewset = self.viewset_class()
+        etag = await viewset.aget_not_modified_etag(request, self.model, pk)
+        if etag is not None:
+            response = HttpResponse(status=304)
+            response['ETag'] = etag
+            return response
+
+        instance = await viewset.eager_load(self.model.objects.all()).filter(pk=pk).afirst()
+        if instance is None:
+            raise Http404(f'No {self.model._meta.object_name} matches the given query.')
+        response = json_response(self.serializer_class(instance).data)
+        response['ETag'] = viewset.get_etag(request, self.model, instance.pk, instance.version)
+        return response
+
+
+region_list = AsyncListView.as_view(
+    viewset_class=RegionViewSet, serializer_class=RegionSerializer, list_cache=region_list_cache,
+    sync_view=RegionViewSet.as_view({'get': 'get', 'post': 'post'}),
+)
+region_detail = AsyncDetailView.as_view(
+    viewset_class=RegionViewSetById, serializer_class=RegionSerializer, model=Region,
+    sync_view=RegionViewSetById.as_view({'get': 'get', 'put': 'update', 'delete': 'delete'}),
+)
+book_lover_list = AsyncListView.as_view(
+    viewset_class=BookLoverViewSet, serializer_class=BookLoverSerializer,
+    sync_view=BookLoverViewSet.as_view({'get': 'get', 'post': 'create'}),
+)
+book_lover_detail = AsyncDetailView.as_view(
+    viewset_class=BookLoverViewSetById, serializer_class=BookLoverSerializer, model=BookLover,
+    sync_view=BookLoverViewSetById.as_view({'get': 'get', 'put': 'update', 'delete': 'delete'}),
+)
+publisher_list = AsyncListView.as_view(
+    viewset_class=PublisherViewSet, serializer_class=PublisherSerializer, list_cache=publisher_list_cache,
+    sync_view=PublisherViewSet.as_view({'get': 'list', 'post': 'create'}),
+)
+publisher_detail = AsyncDetailView.as_view(
+    viewset_class=PublisherViewSet, serializer_class=PublisherSerializer, model=Publisher,
+    sync_view=PublisherViewSet.as_view({'get': 'retrieve', 'put': 'update', 'delete': 'destroy'}),
+)
+book_list = AsyncListView.as_view(
+    viewset_class=BookViewSet, serializer_class=BookSerializer,
+    sync_view=BookViewSet.as_view({'get': 'list', 'post': 'create'}),
+)
+book_detail = AsyncDetailView.as_view(
+    viewset_class=BookViewSet, serializer_class=BookSerializer, model=Book,
+    sync_view=BookViewSet.as_view({'get': 'retrieve', 'put': 'update', 'delete': 'destroy'}),
+)
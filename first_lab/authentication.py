@@ -0,0 +1,101 @@
+import hashlib
+import hmac
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from rest_framework.authentication import BasicAuthentication
+
+
+class CredentialCache:
+    """
+    A bounded, per-process LRU of credentials that recently passed the password
+    check. Keys are an HMAC of the credentials under a random per-process key, so
+    neither passwords nor reusable hashes of them are kept in memory.
+    """
+
+    def __init__(self, max_size=None, timeout=None):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.secret = os.urandom(32)
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def get_max_size(self):
+        if self.max_size is not None:
+            return self.max_size
+        return getattr(settings, 'BASIC_AUTH_CACHE_SIZE', 1024)
+
+    def get_timeout(self):
+        if self.timeout is not None:
+            return self.timeout
+        return getattr(settings, 'BASIC_AUTH_CACHE_TIMEOUT', 60)
+
+    def get_key(self, userid, password):
+        message = f'{userid}\0{password}'.encode('utf-8')
+        return hmac.new(self.secret, message, hashlib.sha256).digest()
+
+    def get(self, key):
+        """Returns ``(user_pk, password_hash)`` of a live entry, or None."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[2] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[0], entry[1]
+
+    def set(self, key, user_pk, password_hash):
+        with self.lock:
+            self.entries[key] = (user_pk, password_hash, time.monotonic() + self.get_timeout())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.get_max_size():
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def invalidate_user(self, user_pk):
+        with self.lock:
+            for key in [key for key, entry in self.entries.items() if entry[0] == user_pk]:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+credential_cache = CredentialCache()
+
+
+class CachedBasicAuthentication(BasicAuthentication):
+    """
+    BasicAuthentication that skips the password hasher for credentials verified
+    within BASIC_AUTH_CACHE_TIMEOUT seconds. A hit still loads the user, and is
+    only honoured while the user is active and the stored password hash is the
+    one the credentials were checked against, so a password changed in any
+    process invalidates it.
+    """
+
+    def authenticate_credentials(self, userid, password, request=None):
+        if getattr(settings, 'BASIC_AUTH_CACHE_TIMEOUT', 60) <= 0:
+            return super().authenticate_credentials(userid, password, request)
+
+        key = credential_cache.get_key(userid, password)
+        cached = credential_cache.get(key)
+        if cached is not None:
+            user_pk, password_hash = cached
+            user = get_user_model()._default_manager.filter(pk=user_pk).first()
+            if user is not None and user.is_active and hmac.compare_digest(user.password, password_hash):
+                return user, None
+            credential_cache.delete(key)
+
+        user, auth = super().authenticate_credentials(userid, password, request)
+        credential_cache.set(key, user.pk, user.password)
+        return user, auth
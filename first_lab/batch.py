@@ -0,0 +1,59 @@
+from django.conf import settings
+from rest_framework.exceptions import ValidationError
+
+from first_lab.eager_loading import split_names
+from first_lab.routers import mark_read_only
+
+
+def get_batch_ids(request, max_size):
+    """
+    Primary keys from ``?ids=1,2,3`` or a ``{"ids": [...]}`` body, deduplicated
+    in request order. An empty, malformed or oversized list is a validation error.
+    """
+    if request.method == 'GET':
+        values = split_names(request.GET.get('ids'))
+    else:
+        values = request.data.get('ids') if isinstance(request.data, dict) else None
+        if not isinstance(values, list):
+            raise ValidationError({'ids': ['Expected a list of ids']})
+    try:
+        ids = list(dict.fromkeys(int(value) for value in values))
+    except (TypeError, ValueError):
+        raise ValidationError({'ids': ['Ids must be integers']})
+    if not ids:
+        raise ValidationError({'ids': ['At least one id is required']})
+    if len(ids) > max_size:
+        raise ValidationError({'ids': [f'No more than {max_size} ids per request']})
+    return ids
+
+
+class BatchRetrieveMixin:
+    """
+    Multi-get for an EagerLoadingMixin viewset: the rows for a list of ids in one
+    ``pk__in`` query (plus one per prefetched relation), rendered like a list
+    page and returned in request order with the ids that were not found.
+    """
+
+    def get_batch_max_size(self):
+        return getattr(settings, 'BATCH_GET_MAX_SIZE', 100)
+
+    def get_batch(self, request):
+        # POST здесь только читает: не закрепляем клиента за основной базой
+        mark_read_only()
+        ids = self.get_batch_ids(request)
+        fields = self.get_requested_fields(request)
+        expand = self.get_requested_expansions(request)
+        model = self.eager_serializer_class.Meta.model
+        pk_name = model._meta.pk.attname
+
+        list_serializer = self.get_list_serializer(fields, expand)
+        queryset = self.eager_load(model.objects.all(), fields, expand).filter(pk__in=ids)
+        # Строки values() - словари, у InstanceSerializer - экземпляры модели
+        rows = {row[pk_name] if isinstance(row, dict) else row.pk: row
+                for row in list_serializer.get_queryset(queryset)}
+
+        found = [rows[pk] for pk in ids if pk in rows]
+        return {'results': list_serializer.serialize(found), 'missing': [pk for pk in ids if pk not in rows]}
+
+    def get_batch_ids(self, request):
+        return get_batch_ids(request, self.get_batch_max_size())
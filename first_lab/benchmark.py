@@ -0,0 +1,470 @@
+import hashlib
+import http.client
+import io
+import json
+import math
+import os
+import platform
+import queue
+import random
+import subprocess
+import threading
+import time
+import urllib.parse
+from datetime import date, timedelta
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import Client
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from first_lab.models import Book, BookLover, CoverUpload, Publisher, Region
+from first_lab.seeding import (FIRST_NAMES, LAST_NAMES, TABLES, WORDS, CatalogPlan, finish, seed_chunk, start,
+                               to_base36)
+from first_lab.uploads import advance_offset, write_chunk
+
+API = '/api/v1'
+BENCH_USERNAME = 'bench'
+BENCH_PASSWORD = 'bench-Password-1'
+PAGE_SIZE = 50
+HTTP_TIMEOUT = 60
+
+
+def make_cover():
+    image = Image.new('RGB', (600, 900), (180, 40, 40))
+    output = io.BytesIO()
+    image.save(output, 'JPEG', quality=85)
+    return output.getvalue()
+
+
+class Dataset:
+    """Primary keys of the seeded rows, the benchmark user and a random source shared by all scenarios."""
+
+    def __init__(self, rng, user):
+        self.rng = rng
+        self.user = user
+        self.authorization = get_authorization(user)
+        self.region_ids = []
+        self.publisher_ids = []
+        self.book_ids = []
+        self.book_lover_ids = []
+        self.counter = 0
+        self.cover = make_cover()
+        self.cover_checksum = hashlib.sha256(self.cover).hexdigest()
+
+    def next_number(self):
+        self.counter += 1
+        return self.counter
+
+    def page(self, ids):
+        return self.rng.randint(1, max(1, math.ceil(len(ids) / PAGE_SIZE)))
+
+    def title(self):
+        return ' '.join(self.rng.sample(WORDS, 3)).capitalize()
+
+    def day(self, start_year=1950, days=25000):
+        return (date(start_year, 1, 1) + timedelta(days=self.rng.randrange(days))).isoformat()
+
+    def sizes(self):
+        return {'regions': len(self.region_ids), 'publishers': len(self.publisher_ids),
+                'books': len(self.book_ids), 'book_lovers': len(self.book_lover_ids)}
+
+
+def get_authorization(user):
+    return f'Bearer {RefreshToken.for_user(user).access_token}'
+
+
+def seed_dataset(seed, regions=20, publishers=200, books=5000, max_volumes=3, book_lovers=20000,
+                 chunk_size=5000):
+    """
+    Seeds the catalog with first_lab.seeding, the generator behind
+    ``seed_catalog``, and creates the benchmark user. The same seed always
+    produces the same rows.
+    """
+    counts = {'regions': regions, 'publishers': publishers, 'books': books, 'book_lovers': book_lovers}
+    plan = CatalogPlan.for_database(DEFAULT_DB_ALIAS, seed, counts, max_volumes=max_volumes, chunk_size=chunk_size)
+    plan.validate()
+    start()
+    try:
+        for table in TABLES:
+            for chunk in plan.get_chunks(table):
+                seed_chunk(plan, table, chunk)
+    finally:
+        finish()
+
+    # Повторный прогон на той же базе переиспользует пользователя
+    user, _ = get_user_model().objects.update_or_create(username=BENCH_USERNAME,
+                                                        defaults={'password': make_password(BENCH_PASSWORD)})
+    dataset = Dataset(random.Random(seed), user)
+    dataset.region_ids = list(plan.get_ids('regions'))
+    dataset.publisher_ids = list(plan.get_ids('publishers'))
+    dataset.book_ids = list(plan.get_ids('books'))
+    dataset.book_lover_ids = list(plan.get_ids('book_lovers'))
+    return dataset
+
+
+def json_request(path, payload=None, headers=None):
+    return {'path': API + path, 'data': '' if payload is None else json.dumps(payload),
+            'content_type': 'application/json', 'headers': headers or {}}
+
+
+def multipart_request(path, fields):
+    return {'path': API + path, 'data': encode_multipart(BOUNDARY, fields), 'content_type': MULTIPART_CONTENT,
+            'headers': {}}
+
+
+class Scenario:
+    """
+    One route and method. ``build(dataset, index)`` returns a request; it runs
+    before the clock starts, so rows a request needs (e.g. the one it
+    deletes) are created there and not timed.
+    """
+
+    def __init__(self, route, method, build, expected=(200,), auth=True, label=None):
+        self.route = route
+        self.method = method
+        self.build = build
+        self.expected = set(expected)
+        self.auth = auth
+        self.name = f'{method} {route}' + (f' ({label})' if label else '')
+
+    def prepare(self, dataset, count):
+        requests = []
+        for index in range(count):
+            request = self.build(dataset, index)
+            if self.auth:
+                request['headers'].setdefault('Authorization', dataset.authorization)
+            requests.append(request)
+        return requests
+
+
+def build_region_update(dataset, index):
+    region = Region.objects.get(pk=dataset.rng.choice(dataset.region_ids))
+    return json_request(f'/regions/{region.pk}/', {'code': region.code, 'name': f'{region.name} {index}'})
+
+
+def build_region_delete(dataset, index):
+    region = Region.objects.create(code=f'D{to_base36(dataset.next_number())}', name='Deleted region')
+    return json_request(f'/regions/{region.pk}/')
+
+
+def build_import(dataset, index):
+    rows = ['first_name,last_name,birthday,phone']
+    rows += [f'{dataset.rng.choice(FIRST_NAMES)},{dataset.rng.choice(LAST_NAMES)},{dataset.day()},'
+             f'+8{dataset.next_number():010d}' for _ in range(PAGE_SIZE)]
+    upload = SimpleUploadedFile('members.csv', '\n'.join(rows).encode('utf-8'), content_type='text/csv')
+    return multipart_request('/booklovers/import/', {'file': upload})
+
+
+def build_logout(dataset, index):
+    user = get_user_model().objects.create(username=f'bench-logout-{dataset.next_number()}',
+                                           password=dataset.user.password)
+    Token.objects.create(user=user)
+    return json_request('/auth/logout/', headers={'Authorization': get_authorization(user)})
+
+
+def build_publisher_delete(dataset, index):
+    publisher = Publisher.objects.create(name='Deleted publisher', region_id=dataset.region_ids[0])
+    return json_request(f'/publishers/{publisher.pk}/')
+
+
+def book_payload(dataset, volumes=2):
+    return {
+        'title': dataset.title(),
+        'publisher': dataset.rng.choice(dataset.publisher_ids),
+        'year_of_release': dataset.rng.randint(1900, 2024),
+        'volumes': [{'volume_number': number, 'number_of_pages': dataset.rng.randint(50, 900)}
+                    for number in range(1, volumes + 1)],
+    }
+
+
+def build_book_delete(dataset, index):
+    book = Book.objects.create(title='Deleted book', publisher_id=dataset.publisher_ids[0])
+    return json_request(f'/books/{book.pk}/')
+
+
+def build_cover(dataset, index):
+    upload = SimpleUploadedFile('cover.jpg', dataset.cover, content_type='image/jpeg')
+    return multipart_request(f'/books/{dataset.rng.choice(dataset.book_ids)}/cover/', {'cover_photo': upload})
+
+
+def create_cover_upload(dataset, complete=False):
+    upload = CoverUpload.objects.create(book_id=dataset.rng.choice(dataset.book_ids), owner=dataset.user,
+                                        filename='cover.jpg', size=len(dataset.cover),
+                                        checksum=dataset.cover_checksum)
+    if complete:
+        write_chunk(upload, io.BytesIO(dataset.cover), 0, upload.size - 1, dataset.cover_checksum)
+        advance_offset(upload, 0, upload.size - 1)
+    return f'/books/{upload.book_id}/cover/uploads/{upload.pk}/'
+
+
+def build_chunk(dataset, index):
+    size = len(dataset.cover)
+    return {'path': API + create_cover_upload(dataset), 'data': dataset.cover,
+            'content_type': 'application/octet-stream',
+            'headers': {'Content-Range': f'bytes 0-{size - 1}/{size}', 'X-Chunk-SHA256': dataset.cover_checksum}}
+
+
+def sample_ids(dataset, ids):
+    return dataset.rng.sample(ids, min(PAGE_SIZE, len(ids)))
+
+
+def join_ids(ids):
+    return ','.join(map(str, ids))
+
+
+def get_scenarios(routes=None):
+    """All benchmark scenarios, or only those of the given URL names."""
+    choice = lambda ids: lambda dataset: dataset.rng.choice(getattr(dataset, ids))  # noqa: E731
+    region, publisher, book, book_lover = (choice(ids) for ids in
+                                           ('region_ids', 'publisher_ids', 'book_ids', 'book_lover_ids'))
+    scenarios = [
+        Scenario('regions', 'GET', lambda d, i: json_request(
+            f'/regions/?page={d.page(d.region_ids)}&pagesize={PAGE_SIZE}'), auth=False),
+        Scenario('regions', 'POST', lambda d, i: json_request(
+            '/regions/', {'code': f'N{to_base36(d.next_number())}', 'name': 'New region'}), expected=(201,)),
+        Scenario('region-detail', 'GET', lambda d, i: json_request(f'/regions/{region(d)}/')),
+        Scenario('region-detail', 'PUT', build_region_update),
+        Scenario('region-detail', 'DELETE', build_region_delete, expected=(204,)),
+        Scenario('book-lovers', 'GET', lambda d, i: json_request(
+            f'/booklovers/?page={d.page(d.book_lover_ids)}&pagesize={PAGE_SIZE}'), auth=False),
+        Scenario('book-lovers', 'POST', lambda d, i: json_request('/booklovers/', {
+            'first_name': d.rng.choice(FIRST_NAMES), 'last_name': d.rng.choice(LAST_NAMES), 'birthday': d.day(),
+        }), expected=(201,)),
+        Scenario('book-lovers-details', 'GET', lambda d, i: json_request(f'/booklovers/{book_lover(d)}/'),
+                 auth=False),
+        Scenario('book-lovers-details', 'PUT', lambda d, i: json_request(
+            f'/booklovers/{book_lover(d)}/', {'address': f'{i} {d.rng.choice(WORDS).capitalize()} St'})),
+        Scenario('book-lovers-details', 'DELETE', lambda d, i: json_request(
+            f'/booklovers/{BookLover.objects.create(first_name="Deleted").pk}/'), expected=(204,)),
+        Scenario('book-lovers-batch', 'GET', lambda d, i: json_request(
+            f'/booklovers/batch/?ids={join_ids(sample_ids(d, d.book_lover_ids))}'), auth=False),
+        Scenario('book-lovers-import', 'POST', build_import),
+        Scenario('login', 'POST', lambda d, i: json_request(
+            '/auth/login/', {'username': BENCH_USERNAME, 'password': BENCH_PASSWORD}), auth=False),
+        Scenario('register', 'POST', lambda d, i: json_request('/auth/register/', {
+            'username': f'bench-user-{d.next_number()}', 'password': BENCH_PASSWORD,
+            'email': f'bench-{d.counter}@example.com',
+        }), auth=False),
+        Scenario('change_password', 'POST', lambda d, i: json_request(
+            '/auth/changepassword/', {'old_password': BENCH_PASSWORD, 'new_password': BENCH_PASSWORD})),
+        Scenario('logout', 'POST', build_logout),
+        Scenario('publisher-list', 'GET', lambda d, i: json_request(
+            f'/publishers/?page={d.page(d.publisher_ids)}&pagesize={PAGE_SIZE}'), auth=False),
+        Scenario('publisher-list', 'POST', lambda d, i: json_request(
+            '/publishers/', {'name': f'Publisher {d.next_number()}', 'region': region(d)}), expected=(201,)),
+        Scenario('publisher-batch', 'GET', lambda d, i: json_request(
+            f'/publishers/batch/?ids={join_ids(sample_ids(d, d.publisher_ids))}'), auth=False),
+        Scenario('publisher-detail', 'GET', lambda d, i: json_request(f'/publishers/{publisher(d)}/'), auth=False),
+        Scenario('publisher-detail', 'PUT', lambda d, i: json_request(
+            f'/publishers/{publisher(d)}/', {'name': f'Publisher {d.next_number()}', 'region': region(d)})),
+        Scenario('publisher-detail', 'DELETE', build_publisher_delete, expected=(204,)),
+        Scenario('book-list', 'GET', lambda d, i: json_request(
+            f'/books/?page={d.page(d.book_ids)}&pagesize={PAGE_SIZE}'), auth=False),
+        Scenario('book-list', 'GET', lambda d, i: json_request(
+            f'/books/?search={d.rng.choice(WORDS)}&page=1&pagesize={PAGE_SIZE}'), auth=False, label='search'),
+        Scenario('book-list', 'POST', lambda d, i: json_request('/books/', book_payload(d)), expected=(201,)),
+        Scenario('book-batch', 'GET', lambda d, i: json_request(
+            f'/books/batch/?ids={join_ids(sample_ids(d, d.book_ids))}'), auth=False),
+        Scenario('book-batch', 'POST', lambda d, i: json_request(
+            '/books/batch/', {'ids': sample_ids(d, d.book_ids)}), auth=False),
+        Scenario('book-bulk-create', 'POST', lambda d, i: json_request(
+            '/books/bulk/', [book_payload(d) for _ in range(20)]), expected=(201,)),
+        Scenario('book-cover', 'PUT', build_cover, expected=(202,)),
+        Scenario('book-cover-uploads', 'POST', lambda d, i: json_request(
+            f'/books/{book(d)}/cover/uploads/',
+            {'filename': 'cover.jpg', 'size': len(d.cover), 'checksum': d.cover_checksum}), expected=(201,)),
+        Scenario('book-cover-upload', 'GET', lambda d, i: json_request(create_cover_upload(d))),
+        Scenario('book-cover-upload', 'PUT', build_chunk),
+        Scenario('book-cover-upload', 'DELETE', lambda d, i: json_request(create_cover_upload(d)),
+                 expected=(204,)),
+        Scenario('book-cover-upload-finalize', 'POST', lambda d, i: json_request(
+            create_cover_upload(d, complete=True) + 'finalize/')),
+        Scenario('book-detail', 'GET', lambda d, i: json_request(f'/books/{book(d)}/'), auth=False),
+        Scenario('book-detail', 'PUT', lambda d, i: json_request(f'/books/{book(d)}/', book_payload(d))),
+        Scenario('book-detail', 'DELETE', build_book_delete, expected=(204,)),
+        Scenario('metrics', 'GET', lambda d, i: json_request('/metrics/'), auth=False),
+        Scenario('schema-swagger-ui', 'GET', lambda d, i: json_request('/swagger/'), auth=False),
+        Scenario('schema-redoc', 'GET', lambda d, i: json_request('/redoc/'), auth=False),
+    ]
+    if routes:
+        scenarios = [scenario for scenario in scenarios if scenario.route in routes]
+    return scenarios
+
+
+class InProcessClient:
+    """
+    Smoke mode: django.test.Client calls the handler in this process, so
+    requests pass the middleware and view stack but no server, sockets or
+    HTTP parsing, and all clients share one GIL.
+    """
+
+    def __init__(self):
+        self.client = Client(raise_request_exception=False)
+
+    def send(self, method, request):
+        response = self.client.generic(method, request['path'], request['data'], request['content_type'],
+                                       headers=request['headers'])
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        return response.status_code
+
+    def close(self):
+        pass
+
+
+class HTTPClient:
+    """
+    Sends requests to a running server at ``url`` over one keep-alive
+    connection. A connection error is counted as status 0.
+    """
+
+    def __init__(self, url):
+        parts = urllib.parse.urlsplit(url)
+        self.prefix = parts.path.rstrip('/')
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(parts.netloc, timeout=HTTP_TIMEOUT)
+
+    def send(self, method, request):
+        body = request['data']
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        headers = {'Content-Type': request['content_type'], **request['headers']}
+        try:
+            self.connection.request(method, self.prefix + request['path'], body=body or None, headers=headers)
+            response = self.connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            # Следующий запрос откроет соединение заново
+            self.connection.close()
+            return 0
+        if response.will_close:
+            self.connection.close()
+        return response.status
+
+    def close(self):
+        self.connection.close()
+
+
+def percentile(ordered, fraction):
+    return ordered[max(0, math.ceil(len(ordered) * fraction) - 1)]
+
+
+def summarize(scenario, latencies, statuses, elapsed):
+    ordered = sorted(latencies)
+    to_ms = lambda seconds: round(seconds * 1000, 3)  # noqa: E731
+    return {
+        'route': scenario.route,
+        'method': scenario.method,
+        'requests': len(ordered),
+        'errors': sum(count for code, count in statuses.items() if code not in scenario.expected),
+        'statuses': {str(code): count for code, count in sorted(statuses.items())},
+        'throughput': round(len(ordered) / elapsed, 3) if elapsed else 0,
+        'mean_ms': to_ms(sum(ordered) / len(ordered)) if ordered else 0,
+        'p50_ms': to_ms(percentile(ordered, 0.5)) if ordered else 0,
+        'p95_ms': to_ms(percentile(ordered, 0.95)) if ordered else 0,
+        'p99_ms': to_ms(percentile(ordered, 0.99)) if ordered else 0,
+        'max_ms': to_ms(ordered[-1]) if ordered else 0,
+    }
+
+
+def run_scenario(scenario, requests, concurrency=1, warmup=0, url=None):
+    """
+    Sends the prepared requests with ``concurrency`` client threads and
+    returns throughput and latency percentiles. With ``url`` the clients talk
+    HTTP to that server, which must use this process's database and settings;
+    without it they are InProcessClient smoke clients. The first ``warmup``
+    requests are sent serially and not counted.
+    """
+    get_client = (lambda: HTTPClient(url)) if url else InProcessClient
+    client = get_client()
+    for request in requests[:warmup]:
+        client.send(scenario.method, request)
+
+    jobs = queue.SimpleQueue()
+    for request in requests[warmup:]:
+        jobs.put(request)
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def work(client):
+        while True:
+            try:
+                request = jobs.get_nowait()
+            except queue.Empty:
+                return
+            started = time.perf_counter()
+            code = client.send(scenario.method, request)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses[code] = statuses.get(code, 0) + 1
+
+    def work_in_thread():
+        thread_client = get_client()
+        try:
+            work(thread_client)
+        finally:
+            thread_client.close()
+            # У каждого потока свое соединение с базой
+            connections.close_all()
+
+    started = time.perf_counter()
+    if concurrency <= 1:
+        work(client)
+    else:
+        threads = [threading.Thread(target=work_in_thread) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - started
+    client.close()
+    return summarize(scenario, latencies, statuses, elapsed)
+
+
+def get_environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True,
+                                text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def compare_results(baseline, current, threshold):
+    """
+    Returns ``(rows, regressions)`` for the scenarios present in both runs. A
+    scenario regresses when its p95 latency grew or its throughput fell by
+    more than ``threshold`` (a fraction).
+    """
+    rows = []
+    regressions = []
+    for name, result in current['scenarios'].items():
+        base = baseline['scenarios'].get(name)
+        if base is None:
+            continue
+        for metric, worse in (('throughput', -1), ('p95_ms', 1)):
+            if not base[metric]:
+                continue
+            change = (result[metric] - base[metric]) / base[metric]
+            rows.append((name, metric, base[metric], result[metric], change))
+            if change * worse > threshold:
+                regressions.append((name, metric, base[metric], result[metric], change))
+    return rows, regressions
@@ -0,0 +1,113 @@
+import hashlib
+import time
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+from first_lab.export import is_export_requested
+
+
+class ListResponseCache:
+    """
+    Caches serialized list responses keyed on the query parameters that change the
+    result. Every key embeds a generation number, so a write invalidates all cached
+    pages of the resource at once by bumping the generation.
+    """
+
+    def __init__(self, namespace, params, timeout=None):
+        self.namespace = namespace
+        self.params = tuple(sorted(params))
+        self.timeout = timeout
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'LIST_CACHE_ALIAS', 'default')]
+
+    def get_timeout(self):
+        if self.timeout is not None:
+            return self.timeout
+        return getattr(settings, 'LIST_CACHE_TIMEOUT', 300)
+
+    @property
+    def generation_key(self):
+        return f'list:{self.namespace}:generation'
+
+    def get_generation(self):
+        # Стартуем с текущего времени, чтобы после вытеснения счетчика не всплыли старые записи
+        return self.cache.get_or_set(self.generation_key, time.time_ns(), None)
+
+    async def aget_generation(self):
+        return await self.cache.aget_or_set(self.generation_key, time.time_ns(), None)
+
+    def get_digest(self, request):
+        params = [(name, request.GET.get(name)) for name in self.params if name in request.GET]
+        return hashlib.md5(f'{request.get_host()}?{urlencode(params)}'.encode('utf-8')).hexdigest()
+
+    def get_key(self, request):
+        return f'list:{self.namespace}:{self.get_generation()}:{self.get_digest(request)}'
+
+    async def aget_key(self, request):
+        return f'list:{self.namespace}:{await self.aget_generation()}:{self.get_digest(request)}'
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    async def aget(self, key):
+        return await self.cache.aget(key)
+
+    @property
+    def settling_key(self):
+        return f'list:{self.namespace}:settling'
+
+    @staticmethod
+    def get_settling_timeout():
+        # Реплика может еще не увидеть запись: столько же, сколько длится прилипание к основной базе
+        if not getattr(settings, 'REPLICA_DATABASES', None):
+            return 0
+        return getattr(settings, 'REPLICA_STICKINESS_SECONDS', 0)
+
+    def set(self, key, data):
+        if self.get_settling_timeout() and self.cache.get(self.settling_key):
+            return
+        self.cache.set(key, data, self.get_timeout())
+
+    async def aset(self, key, data):
+        if self.get_settling_timeout() and await self.cache.aget(self.settling_key):
+            return
+        await self.cache.aset(key, data, self.get_timeout())
+
+    def invalidate(self):
+        try:
+            self.cache.incr(self.generation_key)
+        except ValueError:
+            self.cache.set(self.generation_key, time.time_ns(), None)
+        if self.get_settling_timeout():
+            self.cache.set(self.settling_key, True, self.get_settling_timeout())
+
+    def __call__(self, method):
+        """Decorates a list handler so cache hits skip both the ORM and the serializer."""
+
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            if is_export_requested(request):
+                return method(view, request, *args, **kwargs)
+            key = self.get_key(request)
+            data = self.get(key)
+            if data is not None:
+                return Response(data=data)
+            response = method(view, request, *args, **kwargs)
+            if isinstance(response, Response) and response.status_code == status.HTTP_200_OK:
+                self.set(key, response.data)
+            return response
+
+        return wrapper
+
+
+LIST_PARAMS = ('ordering', 'name', 'page', 'pagesize', 'cursor', 'pagination', 'fields', 'exclude', 'expand')
+
+region_list_cache = ListResponseCache('regions', LIST_PARAMS)
+publisher_list_cache = ListResponseCache('publishers', (*LIST_PARAMS, 'min_books', 'sort'))
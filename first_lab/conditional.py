@@ -0,0 +1,95 @@
+import hashlib
+
+from django.http import Http404
+from django.utils.cache import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+
+# Сжатые представления получают свой сильный ETag: "tag" -> "tag-gzip" (first_lab.middleware)
+CONTENT_CODINGS = ('gzip', 'br', 'zstd')
+
+
+def strip_weak(etag):
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def add_content_coding(etag, coding):
+    return f'{etag[:-1]}-{coding}"'
+
+
+def strip_content_coding(etag):
+    for coding in CONTENT_CODINGS:
+        suffix = f'-{coding}"'
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)] + '"'
+    return etag
+
+
+class ConditionalRequestMixin:
+    """
+    Strong ETags for detail endpoints, derived from the ``version`` column of a
+    VersionedModel. If-None-Match is answered from the version alone, and If-Match
+    on PUT gives clients optimistic concurrency instead of last-write-wins.
+    """
+
+    @staticmethod
+    def get_etag(request, model, pk, version):
+        media_type = getattr(request, 'accepted_media_type', None) or ''
+        value = f'{model._meta.label}:{pk}:{version}:{media_type}'
+        return quote_etag(hashlib.md5(value.encode('utf-8')).hexdigest())
+
+    @staticmethod
+    def get_version(model, pk):
+        version = model.objects.filter(pk=pk).values_list('version', flat=True).first()
+        if version is None:
+            raise Http404
+        return version
+
+    @staticmethod
+    async def aget_version(model, pk):
+        version = await model.objects.filter(pk=pk).values_list('version', flat=True).afirst()
+        if version is None:
+            raise Http404
+        return version
+
+    @staticmethod
+    def none_match(header, etag):
+        """The client's tag matching ``etag`` (weak comparison, any content coding), or None."""
+        if header.strip() == '*':
+            return etag
+        for tag in parse_etags(header):
+            if strip_content_coding(strip_weak(tag)) == etag:
+                return tag
+        return None
+
+    def get_not_modified_response(self, request, model, pk):
+        header = request.headers.get('If-None-Match')
+        if not header:
+            return None
+        etag = self.none_match(header, self.get_etag(request, model, pk, self.get_version(model, pk)))
+        if etag is not None:
+            # Отвечаем тем тегом, что есть у клиента: он мог получить сжатое представление
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        return None
+
+    async def aget_not_modified_etag(self, request, model, pk):
+        """Async variant for views without a DRF Response: returns the ETag on a match, otherwise None."""
+        header = request.headers.get('If-None-Match')
+        if not header:
+            return None
+        return self.none_match(header, self.get_etag(request, model, pk, await self.aget_version(model, pk)))
+
+    def get_precondition_failed_response(self, request, instance):
+        header = request.headers.get('If-Match')
+        if not header or header.strip() == '*':
+            return None
+        etag = self.get_etag(request, type(instance), instance.pk, instance.version)
+        if etag not in {strip_content_coding(tag) for tag in parse_etags(header)}:
+            return Response({'error': 'Resource has been modified'}, status=status.HTTP_412_PRECONDITION_FAILED,
+                            headers={'ETag': etag})
+        return None
+
+    def with_etag(self, request, response, instance):
+        response['ETag'] = self.get_etag(request, type(instance), instance.pk, instance.version)
+        return response
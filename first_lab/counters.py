@@ -0,0 +1,142 @@
+COUNTER_TRIGGERS = {
+    'VolumeBook': ('VolumeBook_counters_ai', 'VolumeBook_counters_ad', 'VolumeBook_counters_au'),
+    'Book': ('Book_counters_ai', 'Book_counters_ad', 'Book_counters_au'),
+}
+POSTGRESQL_FUNCTIONS = ('first_lab_volume_counters', 'first_lab_book_counters')
+
+# Изменения счетчиков по строкам переходной таблицы: (ключ родителя, +/-1, +/-страницы)
+POSTGRESQL_VOLUME_DELTAS = {
+    'INSERT': 'SELECT book_id, 1 AS volumes, number_of_pages AS pages FROM new_rows',
+    'DELETE': 'SELECT book_id, -1 AS volumes, -number_of_pages AS pages FROM old_rows',
+}
+POSTGRESQL_BOOK_DELTAS = {
+    'INSERT': 'SELECT publisher_id, 1 AS books FROM new_rows',
+    'DELETE': 'SELECT publisher_id, -1 AS books FROM old_rows',
+}
+
+
+def get_recount_statements(quote):
+    book, volume, publisher = quote('Book'), quote('VolumeBook'), quote('Publisher')
+    return [
+        f'UPDATE {book} SET '
+        f'volume_count = (SELECT COUNT(*) FROM {volume} WHERE {volume}.book_id = {book}.id_book), '
+        f'total_pages = (SELECT COALESCE(SUM(number_of_pages), 0) FROM {volume} '
+        f'WHERE {volume}.book_id = {book}.id_book)',
+        f'UPDATE {publisher} SET '
+        f'book_count = (SELECT COUNT(*) FROM {book} WHERE {book}.publisher_id = {publisher}.id)',
+    ]
+
+
+def get_postgresql_statements():
+    volume_deltas = {**POSTGRESQL_VOLUME_DELTAS, 'UPDATE': ' UNION ALL '.join(POSTGRESQL_VOLUME_DELTAS.values())}
+    book_deltas = {**POSTGRESQL_BOOK_DELTAS, 'UPDATE': ' UNION ALL '.join(POSTGRESQL_BOOK_DELTAS.values())}
+
+    def branches(deltas, update):
+        return ' '.join(
+            f"{'IF' if index == 0 else 'ELSIF'} TG_OP = '{operation}' THEN {update.format(deltas=rows)};"
+            for index, (operation, rows) in enumerate(deltas.items())
+        ) + ' END IF;'
+
+    volume_update = (
+        'UPDATE "Book" AS book SET volume_count = book.volume_count + delta.volumes, '
+        'total_pages = book.total_pages + delta.pages, version = book.version + 1 '
+        'FROM (SELECT book_id, SUM(volumes) AS volumes, SUM(pages) AS pages FROM ({deltas}) AS changes '
+        'GROUP BY book_id HAVING SUM(volumes) <> 0 OR SUM(pages) <> 0) AS delta '
+        'WHERE book.id_book = delta.book_id'
+    )
+    book_update = (
+        'UPDATE "Publisher" AS publisher SET book_count = publisher.book_count + delta.books, '
+        'version = publisher.version + 1 '
+        'FROM (SELECT publisher_id, SUM(books) AS books FROM ({deltas}) AS changes '
+        'WHERE publisher_id IS NOT NULL GROUP BY publisher_id HAVING SUM(books) <> 0) AS delta '
+        'WHERE publisher.id = delta.publisher_id'
+    )
+    statements = []
+    for function, deltas, update in (('first_lab_volume_counters', volume_deltas, volume_update),
+                                     ('first_lab_book_counters', book_deltas, book_update)):
+        statements.append(
+            f'CREATE OR REPLACE FUNCTION {function}() RETURNS trigger LANGUAGE plpgsql AS $$ '
+            f'BEGIN {branches(deltas, update)} RETURN NULL; END $$'
+        )
+    for table, function in (('VolumeBook', 'first_lab_volume_counters'), ('Book', 'first_lab_book_counters')):
+        insert, delete, update = COUNTER_TRIGGERS[table]
+        # Триггеры на уровне оператора: COPY и bulk_create обновляют каждого родителя одним UPDATE
+        statements += [
+            f'CREATE TRIGGER "{insert}" AFTER INSERT ON "{table}" REFERENCING NEW TABLE AS new_rows '
+            f'FOR EACH STATEMENT EXECUTE FUNCTION {function}()',
+            f'CREATE TRIGGER "{delete}" AFTER DELETE ON "{table}" REFERENCING OLD TABLE AS old_rows '
+            f'FOR EACH STATEMENT EXECUTE FUNCTION {function}()',
+            f'CREATE TRIGGER "{update}" AFTER UPDATE ON "{table}" '
+            f'REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows '
+            f'FOR EACH STATEMENT EXECUTE FUNCTION {function}()',
+        ]
+    return statements
+
+
+def get_sqlite_statements():
+    volume_insert, volume_delete, volume_update = COUNTER_TRIGGERS['VolumeBook']
+    book_insert, book_delete, book_update = COUNTER_TRIGGERS['Book']
+    add_volume = ('UPDATE "Book" SET volume_count = volume_count + 1, '
+                  'total_pages = total_pages + {row}.number_of_pages, '
+                  'version = version + 1 WHERE id_book = {row}.book_id;')
+    remove_volume = ('UPDATE "Book" SET volume_count = volume_count - 1, '
+                     'total_pages = total_pages - {row}.number_of_pages, '
+                     'version = version + 1 WHERE id_book = {row}.book_id;')
+    add_book = ('UPDATE "Publisher" SET book_count = book_count + 1, version = version + 1 '
+                'WHERE id = {row}.publisher_id;')
+    remove_book = ('UPDATE "Publisher" SET book_count = book_count - 1, version = version + 1 '
+                   'WHERE id = {row}.publisher_id;')
+    return [
+        f'CREATE TRIGGER "{volume_insert}" AFTER INSERT ON "VolumeBook" BEGIN {add_volume.format(row="new")} END',
+        f'CREATE TRIGGER "{volume_delete}" AFTER DELETE ON "VolumeBook" BEGIN {remove_volume.format(row="old")} END',
+        f'CREATE TRIGGER "{volume_update}" AFTER UPDATE OF book_id, number_of_pages ON "VolumeBook" BEGIN '
+        f'{remove_volume.format(row="old")} {add_volume.format(row="new")} END',
+        f'CREATE TRIGGER "{book_insert}" AFTER INSERT ON "Book" BEGIN {add_book.format(row="new")} END',
+        f'CREATE TRIGGER "{book_delete}" AFTER DELETE ON "Book" BEGIN {remove_book.format(row="old")} END',
+        f'CREATE TRIGGER "{book_update}" AFTER UPDATE OF publisher_id ON "Book" '
+        f'WHEN old.publisher_id IS NOT new.publisher_id BEGIN '
+        f'{remove_book.format(row="old")} {add_book.format(row="new")} END',
+    ]
+
+
+def get_install_statements(vendor, quote):
+    """Trigger DDL for ``vendor`` followed by a full recount; on other backends only the recount."""
+    if vendor == 'postgresql':
+        statements = get_postgresql_statements()
+    elif vendor == 'sqlite':
+        statements = get_sqlite_statements()
+    else:
+        statements = []
+    return [*statements, *get_recount_statements(quote)]
+
+
+def get_uninstall_statements(vendor):
+    statements = []
+    for table, triggers in COUNTER_TRIGGERS.items():
+        for trigger in triggers:
+            if vendor == 'postgresql':
+                statements.append(f'DROP TRIGGER IF EXISTS "{trigger}" ON "{table}"')
+            elif vendor == 'sqlite':
+                statements.append(f'DROP TRIGGER IF EXISTS "{trigger}"')
+    if vendor == 'postgresql':
+        statements += [f'DROP FUNCTION IF EXISTS {function}()' for function in POSTGRESQL_FUNCTIONS]
+    return statements
+
+
+def install_counters(schema_editor):
+    """
+    (Re)creates the triggers that keep Book.volume_count, Book.total_pages and
+    Publisher.book_count in step with VolumeBook and Book, whatever writes them
+    (ORM saves, bulk_create, queryset update/delete, cascades, COPY), then
+    recounts from scratch. Every change also bumps the parent's version, so
+    ETags follow. SQLite drops triggers when a migration remakes Book or
+    VolumeBook, so such migrations must call this again.
+    """
+    vendor = schema_editor.connection.vendor
+    for statement in [*get_uninstall_statements(vendor), *get_install_statements(vendor, schema_editor.quote_name)]:
+        schema_editor.execute(statement)
+
+
+def uninstall_counters(schema_editor):
+    for statement in get_uninstall_statements(schema_editor.connection.vendor):
+        schema_editor.execute(statement)
@@ -0,0 +1,82 @@
+import time
+from contextvars import ContextVar
+
+from django.db import connections
+
+from first_lab.metrics import CallbackMetric, Counter
+
+db_connects = Counter('network_db_connects_total',
+                      'Connections Django set up: new connections, or checkouts when pooling', ['alias'])
+
+# Статистика psycopg_pool: ключ get_stats() -> (метрика, тип, описание, множитель)
+POOL_STATS = {
+    'pool_size': ('network_db_pool_size', 'gauge', 'Connections managed by the pool', 1),
+    'pool_available': ('network_db_pool_available', 'gauge', 'Idle connections in the pool', 1),
+    'requests_waiting': ('network_db_pool_requests_waiting', 'gauge', 'Checkouts waiting for a connection', 1),
+    'requests_num': ('network_db_pool_requests_total', 'counter', 'Connections requested from the pool', 1),
+    'requests_queued': ('network_db_pool_requests_queued_total', 'counter',
+                        'Checkouts that had to wait for a connection', 1),
+    'requests_wait_ms': ('network_db_pool_wait_seconds_total', 'counter',
+                         'Total time checkouts waited for a connection', 0.001),
+    'requests_errors': ('network_db_pool_timeouts_total', 'counter', 'Checkouts that timed out or failed', 1),
+    'connections_num': ('network_db_pool_connections_opened_total', 'counter',
+                        'Connections opened by the pool', 1),
+    'connections_ms': ('network_db_pool_connect_seconds_total', 'counter',
+                       'Total time spent opening connections', 0.001),
+    'connections_lost': ('network_db_pool_connections_lost_total', 'counter',
+                         'Connections found broken by the checkout health check', 1),
+}
+
+
+def get_pools():
+    for connection in connections.all(initialized_only=True):
+        # Пул PostgreSQL-бэкенда Django 5.1+ хранится на классе, по псевдониму базы
+        pool = getattr(connection, '_connection_pools', {}).get(connection.alias)
+        if pool is not None:
+            yield connection.alias, pool
+
+
+def make_pool_callback(key, scale):
+    def callback():
+        return {(alias,): pool.get_stats().get(key, 0) * scale for alias, pool in get_pools()}
+
+    return callback
+
+
+pool_metrics = [
+    CallbackMetric(name, documentation, metric_type, make_pool_callback(key, scale), ['alias'])
+    for key, (name, metric_type, documentation, scale) in POOL_STATS.items()
+]
+
+
+class QueryStats:
+    """Queries run and time spent in the database while serving one request."""
+
+    __slots__ = ('queries', 'seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+
+query_stats = ContextVar('query_stats', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    stats = query_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        # Объект статистики общий для контекста, поэтому учитываются и запросы из sync_to_async
+        stats.queries += 1
+        stats.seconds += time.perf_counter() - started
+
+
+def count_connect(sender, connection, **kwargs):
+    db_connects.inc(alias=connection.alias)
+    if record_query not in connection.execute_wrappers:
+        # В начало списка: connection.execute_wrapper() снимает свои обертки с конца
+        connection.execute_wrappers.insert(0, record_query)
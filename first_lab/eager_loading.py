@@ -0,0 +1,183 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+from first_lab.values_serializer import get_list_serializer
+
+
+def split_names(value):
+    return [name.strip() for name in (value or '').split(',') if name.strip()]
+
+
+def get_requested_fields(request, serializer_class):
+    """
+    The readable fields of ``serializer_class`` selected with ``?fields=`` and
+    ``?exclude=`` (comma separated), in declaration order, or None when the
+    request asks for every field. Unknown names are a validation error.
+    """
+    fields = split_names(request.GET.get('fields'))
+    exclude = split_names(request.GET.get('exclude'))
+    if not fields and not exclude:
+        return None
+    available = [name for name, field in serializer_class().fields.items() if not field.write_only]
+    errors = {}
+    for param, names in (('fields', fields), ('exclude', exclude)):
+        unknown = [name for name in names if name not in available]
+        if unknown:
+            errors[param] = [f'Unknown field(s): {", ".join(unknown)}']
+    if errors:
+        raise ValidationError(errors)
+    return [name for name in available if (not fields or name in fields) and name not in exclude]
+
+
+def get_requested_expansions(request, serializer_class):
+    """
+    The relation paths selected with ``?expand=`` (comma separated, dotted for
+    nested relations such as ``publisher.region``) that ``serializer_class``
+    declares in ``expandable_fields``, parents included, or None when nothing
+    is expanded. Unknown paths are a validation error.
+    """
+    paths = split_names(request.GET.get('expand'))
+    if not paths:
+        return None
+    expansions, unknown = set(), []
+    for path in paths:
+        current = serializer_class
+        names = path.split('.')
+        for index, name in enumerate(names):
+            current = getattr(current, 'expandable_fields', {}).get(name)
+            if current is None:
+                unknown.append(path)
+                break
+            expansions.add('.'.join(names[:index + 1]))
+    if unknown:
+        raise ValidationError({'expand': [f'Unknown relation(s): {", ".join(unknown)}']})
+    return tuple(sorted(expansions))
+
+
+def group_expansions(expand):
+    """``['publisher', 'publisher.region']`` -> ``{'publisher': ['region']}``."""
+    groups = {}
+    for path in expand or ():
+        name, _, rest = path.partition('.')
+        nested = groups.setdefault(name, [])
+        if rest:
+            nested.append(rest)
+    return groups
+
+
+def get_serializer_columns(model, serializer_class, select_related=(), field_names=None, expand=None):
+    """
+    Returns the ``only()`` field list needed to render ``serializer_class`` for
+    ``model``, or None when a field reads from the whole instance (source='*')
+    and the columns can not be pruned safely. ``field_names`` limits it to the
+    fields a sparse fieldset renders, ``expand`` renders those relations with
+    their nested serializers.
+    """
+    opts = model._meta
+    columns = [opts.pk.name]
+    serializer = serializer_class(expand=expand) if expand else serializer_class()
+    for field_name, field in serializer.fields.items():
+        if field.write_only or (field_names is not None and field_name not in field_names):
+            continue
+        if field.source == '*':
+            return None
+        name = field.source.split('.')[0]
+        try:
+            model_field = opts.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        if not model_field.concrete:
+            continue
+        if name not in columns:
+            columns.append(name)
+        if name in select_related and isinstance(field, serializers.BaseSerializer):
+            prefix = f'{name}__'
+            related = get_serializer_columns(
+                model_field.related_model, field.__class__,
+                [path.removeprefix(prefix) for path in select_related if path.startswith(prefix)],
+                expand=group_expansions(expand).get(name))
+            if related is None:
+                return None
+            columns.extend(f'{name}__{column}' for column in related)
+    return columns
+
+
+def eager_load(queryset, serializer_class, select_related=(), prefetch_related=(), extra_columns=(),
+               field_names=None, expand=None):
+    """
+    Applies select_related/prefetch_related for the relations a serializer
+    renders and narrows every query to the columns the serializer reads, plus
+    ``extra_columns`` the view itself needs. With ``field_names`` only those
+    fields count: relations outside them are neither joined nor prefetched.
+    Every ``expand`` path is joined with select_related.
+    """
+    model = queryset.model
+    fields = serializer_class().fields
+    if field_names is not None:
+        select_related = [name for name in select_related if name in field_names]
+        prefetch_related = [name for name in prefetch_related if name in field_names]
+        expand = [path for path in expand or () if path.split('.')[0] in field_names]
+    select_related = [*select_related, *(path.replace('.', '__') for path in expand or ())]
+
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+
+    lookups = []
+    for name in prefetch_related:
+        relation = model._meta.get_field(name)
+        field = fields.get(name)
+        related_queryset = relation.related_model.objects.all()
+        if isinstance(field, serializers.ListSerializer):
+            columns = get_serializer_columns(relation.related_model, field.child.__class__)
+            if columns is not None:
+                if relation.one_to_many:
+                    columns.append(relation.field.name)
+                related_queryset = related_queryset.only(*columns)
+        lookups.append(Prefetch(name, queryset=related_queryset))
+    if lookups:
+        queryset = queryset.prefetch_related(*lookups)
+
+    columns = get_serializer_columns(model, serializer_class, select_related, field_names, expand)
+    if columns is not None:
+        queryset = queryset.only(*columns, *extra_columns)
+    return queryset
+
+
+class EagerLoadingMixin:
+    """
+    Lets a viewset declare the relations its serializer renders. List and
+    retrieve querysets go through ``eager_load`` so that a page costs a constant
+    number of queries instead of one per row.
+
+    List views also accept sparse fieldsets (``?fields=``/``?exclude=``) that
+    narrow both the output and the columns read, and ``?expand=`` that inlines
+    related objects through joins.
+    """
+    eager_serializer_class = None
+    select_related_fields = ()
+    prefetch_related_fields = ()
+    eager_extra_columns = ()
+
+    def get_requested_fields(self, request):
+        return get_requested_fields(request, self.eager_serializer_class)
+
+    def get_requested_expansions(self, request):
+        return get_requested_expansions(request, self.eager_serializer_class)
+
+    def get_ordering_columns(self):
+        # Курсорной пагинации и сортировке нужны их колонки, даже если их не выводят
+        return [name for name in (getattr(self, 'keyset_ordering_field', None), *getattr(self, 'sort_fields', ()))
+                if name]
+
+    def get_list_serializer(self, field_names=None, expand=None):
+        """Serializes list pages from ``values()`` rows where possible (see first_lab.values_serializer)."""
+        return get_list_serializer(self.eager_serializer_class, field_names, self.get_ordering_columns(), expand)
+
+    def eager_load(self, queryset, field_names=None, expand=None):
+        extra_columns = self.eager_extra_columns
+        if field_names is not None:
+            extra_columns = (*extra_columns, *self.get_ordering_columns())
+        return eager_load(queryset, self.eager_serializer_class, self.select_related_fields,
+                          self.prefetch_related_fields, extra_columns, field_names, expand)
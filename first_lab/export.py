@@ -0,0 +1,58 @@
+import csv
+from itertools import islice
+
+from django.http import StreamingHttpResponse
+
+from first_lab.renderers import CSVRenderer, NDJSONRenderer, csv_cells, dump_json
+
+EXPORT_RENDERERS = {renderer.format: renderer for renderer in (NDJSONRenderer, CSVRenderer)}
+
+
+class Echo:
+    """File-like object for csv.writer that returns the written line instead of buffering it."""
+
+    def write(self, value):
+        return value
+
+
+def is_export_requested(request):
+    renderer = getattr(request, 'accepted_renderer', None)
+    return renderer is not None and renderer.format in EXPORT_RENDERERS
+
+
+def iterate_serialized(queryset, serializer_class, chunk_size, fields=None, expand=None):
+    # iterator() читает строки курсором на стороне сервера, в памяти только один пакет
+    rows = queryset.iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        yield from serializer_class(chunk, many=True, fields=fields, expand=expand).data
+
+
+def stream_ndjson(queryset, serializer_class, chunk_size, fields=None, expand=None):
+    for row in iterate_serialized(queryset, serializer_class, chunk_size, fields, expand):
+        yield (dump_json(row) + '\n').encode('utf-8')
+
+
+def stream_csv(queryset, serializer_class, chunk_size, fields=None, expand=None):
+    header = [name for name, field in serializer_class(fields=fields).fields.items() if not field.write_only]
+    writer = csv.writer(Echo())
+    yield writer.writerow(header).encode('utf-8')
+    for row in iterate_serialized(queryset, serializer_class, chunk_size, fields, expand):
+        yield writer.writerow(csv_cells(row, header)).encode('utf-8')
+
+
+def export_response(request, queryset, serializer_class, filename, chunk_size=2000, fields=None, expand=None):
+    """
+    Streams the whole filtered and ordered queryset as NDJSON or CSV, depending on
+    the renderer selected with ``?format=``, without materializing it. ``fields``
+    is a sparse fieldset and ``expand`` the inlined relations for serializers
+    that take them.
+    """
+    renderer = EXPORT_RENDERERS[request.accepted_renderer.format]
+    stream = stream_csv if renderer.format == 'csv' else stream_ndjson
+    response = StreamingHttpResponse(stream(queryset, serializer_class, chunk_size, fields, expand),
+                                     content_type=f'{renderer.media_type}; charset={renderer.charset}')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{renderer.format}"'
+    return response
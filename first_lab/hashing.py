@@ -0,0 +1,125 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth import hashers
+from django.contrib.auth.backends import ModelBackend
+
+from first_lab.metrics import Counter, Gauge, Histogram
+
+HASHING_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+hashing_seconds = Histogram('network_hashing_seconds', 'Time spent in the password hasher',
+                            ['operation'], buckets=HASHING_BUCKETS)
+hashing_wait_seconds = Histogram('network_hashing_queue_wait_seconds',
+                                 'Time a hashing job waited for a free worker', buckets=HASHING_BUCKETS)
+hashing_queue_depth = Gauge('network_hashing_queue_depth', 'Hashing jobs queued or running')
+hashing_rejected = Counter('network_hashing_rejected_total', 'Hashing jobs rejected because the queue was full')
+
+
+class HashingBusy(Exception):
+    pass
+
+
+class HashingExecutor:
+    """
+    Runs password hashing on a fixed-size thread pool (PBKDF2 releases the GIL)
+    and refuses new jobs once HASHING_QUEUE_LIMIT jobs are queued or running.
+    run() blocks the calling request thread until its job is done, so every
+    queued job pins a server worker: a login storm leaves normal reads their
+    workers only while HASHING_QUEUE_LIMIT is below the server's thread count.
+    """
+
+    def __init__(self):
+        self.executor = None
+        self.depth = 0
+        self.lock = Lock()
+
+    @staticmethod
+    def get_workers():
+        return getattr(settings, 'HASHING_WORKERS', os.cpu_count() or 2)
+
+    def get_queue_limit(self):
+        return getattr(settings, 'HASHING_QUEUE_LIMIT', self.get_workers() * 4)
+
+    def get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.get_workers(), thread_name_prefix='hashing')
+            return self.executor
+
+    def run(self, operation, function, *args):
+        with self.lock:
+            if self.depth >= self.get_queue_limit():
+                hashing_rejected.inc()
+                raise HashingBusy
+            self.depth += 1
+            hashing_queue_depth.set(self.depth)
+        try:
+            future = self.get_executor().submit(self.measure, operation, time.perf_counter(), function, args)
+            return future.result()
+        finally:
+            with self.lock:
+                self.depth -= 1
+                hashing_queue_depth.set(self.depth)
+
+    @staticmethod
+    def measure(operation, submitted, function, args):
+        started = time.perf_counter()
+        hashing_wait_seconds.observe(started - submitted)
+        try:
+            return function(*args)
+        finally:
+            hashing_seconds.observe(time.perf_counter() - started, operation=operation)
+
+
+hashing_executor = HashingExecutor()
+
+
+def make_password(password):
+    return hashing_executor.run('make', hashers.make_password, password)
+
+
+def set_password(user, password):
+    user.password = make_password(password)
+    # Как в AbstractBaseUser.set_password: валидаторы узнают о смене пароля при save()
+    user._password = password
+
+
+def check_password(user, password):
+    """User.check_password with the hasher on the pool; an outdated hash is upgraded as Django does."""
+    if not hashing_executor.run('check', hashers.check_password, password, user.password):
+        return False
+    hasher = hashers.identify_hasher(user.password)
+    if hasher.must_update(user.password):
+        set_password(user, password)
+        user._password = None
+        user.save(update_fields=['password'])
+    return True
+
+
+class PooledModelBackend(ModelBackend):
+    """
+    ModelBackend with the password hasher on the pool. It is listed in
+    AUTHENTICATION_BACKENDS, so django.contrib.auth.authenticate() keeps the
+    backend chain and the login signals; a full pool raises HashingBusy.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        user_model = get_user_model()
+        if username is None:
+            username = kwargs.get(user_model.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = user_model._default_manager.get_by_natural_key(username)
+        except user_model.DoesNotExist:
+            # Хэшируем и для несуществующего пользователя, чтобы время ответа не выдавало логины
+            make_password(password)
+            return None
+        if check_password(user, password) and self.user_can_authenticate(user):
+            return user
+        return None
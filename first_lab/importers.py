@@ -0,0 +1,175 @@
+import codecs
+import csv
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, UniqueConstraint
+
+from first_lab.models import BookLover
+from first_lab.serializator import BookLoverSerializer
+
+CSV = 'csv'
+NDJSON = 'ndjson'
+FORMATS = (CSV, NDJSON)
+
+
+class ImportReport:
+    """Counts of the import; only the first IMPORT_REJECTED_LINES_LIMIT rejected lines are kept."""
+
+    def __init__(self, max_rejected_lines=None):
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.rejected = 0
+        self.rejected_lines = []
+        if max_rejected_lines is None:
+            max_rejected_lines = getattr(settings, 'IMPORT_REJECTED_LINES_LIMIT', 1000)
+        self.max_rejected_lines = max_rejected_lines
+
+    def reject(self, line, errors):
+        self.rejected += 1
+        if len(self.rejected_lines) < self.max_rejected_lines:
+            self.rejected_lines.append({'line': line, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'unchanged': self.unchanged,
+            'rejected': self.rejected,
+            'rejected_lines': self.rejected_lines,
+        }
+
+
+def detect_format(name, content_type=None):
+    name = (name or '').lower()
+    content_type = (content_type or '').lower()
+    if name.endswith('.csv') or 'csv' in content_type:
+        return CSV
+    if name.endswith(('.ndjson', '.jsonl')) or 'ndjson' in content_type or 'jsonlines' in content_type:
+        return NDJSON
+    return None
+
+
+def read_csv(stream):
+    reader = csv.DictReader(stream)
+    for row in reader:
+        # Пустая ячейка означает, что поле не передано
+        yield reader.line_num, {key: value for key, value in row.items() if key and value not in ('', None)}
+
+
+def read_ndjson(stream):
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield line_number, ValueError(str(exc))
+            continue
+        yield line_number, row
+
+
+class BookLoverImporter:
+    """
+    Streams BookLover rows from a CSV or NDJSON file and upserts them in
+    batches keyed on a natural key. Only one chunk of rows is held in memory.
+    The key must be a unique constraint of BookLover: rows are written with
+    INSERT ... ON CONFLICT, so concurrent imports of one file do not duplicate them.
+    """
+    default_key_fields = ('first_name', 'last_name', 'birthday')
+    chunk_size = 1000
+
+    def __init__(self, key_fields=None, chunk_size=None):
+        self.key_fields = tuple(key_fields or self.default_key_fields)
+        columns = {field.name for field in BookLover._meta.concrete_fields if not field.primary_key}
+        unknown = [field for field in self.key_fields if field not in columns]
+        if unknown:
+            raise ValueError(f'Unknown key fields: {", ".join(unknown)}')
+        unique_keys = self.get_unique_keys()
+        if set(self.key_fields) not in [set(key) for key in unique_keys]:
+            raise ValueError('Key fields must match a unique constraint: '
+                             + '; '.join(','.join(key) for key in unique_keys))
+        if chunk_size:
+            self.chunk_size = chunk_size
+        self.report = ImportReport()
+
+    @staticmethod
+    def get_unique_keys():
+        return [tuple(constraint.fields) for constraint in BookLover._meta.constraints
+                if isinstance(constraint, UniqueConstraint) and constraint.fields and constraint.condition is None]
+
+    def run(self, lines, file_format):
+        """Imports an iterable of UTF-8 encoded byte lines, e.g. an uploaded or opened binary file."""
+        stream = codecs.iterdecode(lines, 'utf-8-sig')
+        rows = read_csv(stream) if file_format == CSV else read_ndjson(stream)
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            self.import_chunk(chunk)
+        return self.report
+
+    def import_chunk(self, chunk):
+        valid = {}
+        for line, data in chunk:
+            if isinstance(data, Exception):
+                self.report.reject(line, {'non_field_errors': [str(data)]})
+                continue
+            serializer = BookLoverSerializer(data=data)
+            # Проверка уникальности ключа отклонила бы как раз обновляемые строки
+            serializer.validators = []
+            if not serializer.is_valid():
+                self.report.reject(line, serializer.errors)
+                continue
+            values = dict(serializer.validated_data)
+            key = tuple(values.get(field) for field in self.key_fields)
+            if None in key:
+                # NULL не совпадает с NULL в уникальном ограничении: такую строку нельзя сопоставить
+                self.report.reject(line, {field: ['Required by the import key'] for field, value
+                                          in zip(self.key_fields, key) if value is None})
+                continue
+            # Повторы ключа внутри пакета сливаются, последняя строка побеждает
+            valid.setdefault(key, {}).update(values)
+        if valid:
+            self.upsert(valid)
+
+    def get_existing(self, keys):
+        """Primary keys of the rows that already have one of ``keys``."""
+        lookup = Q()
+        for position, field in enumerate(self.key_fields):
+            lookup &= Q(**{f'{field}__in': {key[position] for key in keys}})
+        existing = {}
+        for row in BookLover.objects.filter(lookup).values('pk', *self.key_fields):
+            key = tuple(row[field] for field in self.key_fields)
+            if key in keys:
+                existing[key] = row['pk']
+        return existing
+
+    def upsert(self, rows):
+        # Строки с разным набором полей пишутся отдельно: ON CONFLICT обновляет только переданные поля
+        groups = {}
+        for key, values in rows.items():
+            fields = tuple(sorted(field for field in values if field not in self.key_fields))
+            groups.setdefault(fields, []).append((key, values))
+
+        with transaction.atomic():
+            # Выборка нужна только для отчета и версии; от дублей защищает уникальное ограничение
+            existing = self.get_existing(rows)
+            updated = []
+            for fields, group in groups.items():
+                book_lovers = [BookLover(**values) for _, values in group]
+                if fields:
+                    BookLover.objects.bulk_create(book_lovers, batch_size=self.chunk_size, update_conflicts=True,
+                                                  unique_fields=self.key_fields, update_fields=fields)
+                    updated.extend(existing[key] for key, _ in group if key in existing)
+                else:
+                    BookLover.objects.bulk_create(book_lovers, batch_size=self.chunk_size, ignore_conflicts=True)
+                    self.report.unchanged += sum(key in existing for key, _ in group)
+            if updated:
+                BookLover.objects.filter(pk__in=updated).update(version=F('version') + 1)
+
+        self.report.inserted += len(rows) - len(existing)
+        self.report.updated += len(updated)
@@ -0,0 +1,147 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from first_lab.authentication import credential_cache
+from first_lab.benchmark import compare_results, get_environment, get_scenarios, run_scenario, seed_dataset
+
+
+class Command(BaseCommand):
+    help = ('Drives every API route of a running server (--url) with concurrent HTTP clients, reporting '
+            'throughput and p50/p95/p99 latency. The catalog is seeded with the seed_catalog generator into the '
+            'configured database, which the server must use, together with the same settings and media '
+            'directories. --in-process is a smoke run instead: a fresh test database and django.test.Client '
+            'threads in this process, without a server, so its numbers say nothing about workers, pools or the '
+            'server. Results can be saved as JSON and compared with an earlier run')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Base URL of the server to benchmark, e.g. http://127.0.0.1:8000')
+        parser.add_argument('--in-process', action='store_true',
+                            help='Smoke run: clients call the handler in this process, no server is measured')
+        parser.add_argument('--regions', type=int, default=20)
+        parser.add_argument('--publishers', type=int, default=200)
+        parser.add_argument('--books', type=int, default=5000)
+        parser.add_argument('--max-volumes', type=int, default=3, help='Each book gets 1..N volumes')
+        parser.add_argument('--book-lovers', type=int, default=20000)
+        parser.add_argument('--seed', type=int, default=1, help='Random seed for the dataset and the requests')
+        parser.add_argument('--requests', type=int, default=200, help='Timed requests per scenario')
+        parser.add_argument('--concurrency', type=int, default=8, help='Client threads per scenario')
+        parser.add_argument('--warmup', type=int, default=10, help='Untimed requests sent before each scenario')
+        parser.add_argument('--routes', help='Comma separated URL names to benchmark, all by default')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--compare', help='Compare with the JSON results of an earlier run')
+        parser.add_argument('--threshold', type=float, default=0.1,
+                            help='Relative p95/throughput change reported as a regression')
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive',
+                            help='Seed the configured database, or destroy a leftover test database, without asking')
+
+    def handle(self, *args, **options):
+        if options['requests'] <= 0 or options['concurrency'] <= 0 or options['warmup'] < 0:
+            raise CommandError('--requests and --concurrency must be positive, --warmup not negative')
+        if min(options['regions'], options['publishers'], options['books'], options['max_volumes']) <= 0:
+            raise CommandError('--regions, --publishers, --books and --max-volumes must be positive')
+        routes = set(options['routes'].split(',')) if options['routes'] else None
+        scenarios = get_scenarios(routes)
+        if not scenarios:
+            raise CommandError('No scenario matches --routes')
+        if bool(options['url']) == options['in_process']:
+            raise CommandError('Pass --url of a running server, or --in-process for a smoke run')
+        baseline = self.load(options['compare']) if options['compare'] else None
+
+        if options['url']:
+            results = self.run_against_server(scenarios, options)
+        else:
+            results = self.run_in_process(scenarios, options)
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, indent=2)
+            self.stdout.write(f'Results written to {options["output"]}')
+        if baseline is not None:
+            self.compare(baseline, results, options['threshold'])
+
+    def run_against_server(self, scenarios, options):
+        if options['interactive']:
+            answer = input(f"Benchmark rows will be written to the database '{connection.settings_dict['NAME']}', "
+                           f"which the server at {options['url']} must use. Type 'yes' to continue: ")
+            if answer != 'yes':
+                raise CommandError('Benchmark cancelled')
+        return self.run(scenarios, options)
+
+    def run_in_process(self, scenarios, options):
+        workdir = tempfile.mkdtemp(prefix='network-bench-')
+        if connection.vendor == 'sqlite' and not connection.settings_dict['TEST'].get('NAME'):
+            # Потокам нужна общая база: SQLite в памяти у каждого соединения своя
+            connection.settings_dict['TEST']['NAME'] = os.path.join(workdir, 'bench.sqlite3')
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=not options['interactive'])
+        try:
+            # Миниатюры строятся синхронно, чтобы фоновая работа не попадала в замеры следующих сценариев
+            with override_settings(DEBUG=False, REPLICA_DATABASES=[], THUMBNAIL_WORKERS=0,
+                                   MEDIA_ROOT=os.path.join(workdir, 'media'),
+                                   COVER_UPLOAD_DIR=os.path.join(workdir, 'uploads')):
+                return self.run(scenarios, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def run(self, scenarios, options):
+        cache.clear()
+        credential_cache.clear()
+        started = time.perf_counter()
+        dataset = seed_dataset(options['seed'], options['regions'], options['publishers'], options['books'],
+                               options['max_volumes'], options['book_lovers'])
+        self.stdout.write(f'Seeded {dataset.sizes()} in {time.perf_counter() - started:.1f} s '
+                          f'({connection.vendor})')
+
+        results = {
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'target': options['url'] or 'in-process',
+            'environment': get_environment(),
+            'options': {key: options[key] for key in ('regions', 'publishers', 'books', 'max_volumes', 'book_lovers',
+                                                      'seed', 'requests', 'concurrency', 'warmup')},
+            'scenarios': {},
+        }
+        for scenario in scenarios:
+            requests = scenario.prepare(dataset, options['warmup'] + options['requests'])
+            result = run_scenario(scenario, requests, options['concurrency'], options['warmup'], options['url'])
+            results['scenarios'][scenario.name] = result
+            self.stdout.write(self.format_result(scenario.name, result))
+        return results
+
+    @staticmethod
+    def load(path):
+        try:
+            with open(path) as file:
+                return json.load(file)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f'Can not read {path}: {exc}')
+
+    @staticmethod
+    def format_result(name, result):
+        line = (f'{name:<44} {result["throughput"]:9.1f} req/s  p50 {result["p50_ms"]:8.1f} ms  '
+                f'p95 {result["p95_ms"]:8.1f} ms  p99 {result["p99_ms"]:8.1f} ms')
+        if result['errors']:
+            line += f'  errors {result["errors"]} {result["statuses"]}'
+        return line
+
+    def compare(self, baseline, results, threshold):
+        if baseline.get('target') != results['target']:
+            self.stderr.write(f"Comparing runs against different targets: {baseline.get('target')} and "
+                              f"{results['target']}")
+        rows, regressions = compare_results(baseline, results, threshold)
+        for name, metric, before, after, change in rows:
+            self.stdout.write(f'{name:<44} {metric:<10} {before:10.1f} -> {after:10.1f} ({change:+.1%})')
+        if regressions:
+            names = ', '.join(f'{name} {metric}' for name, metric, *_ in regressions)
+            raise CommandError(f'{len(regressions)} regression(s) over {threshold:.0%}: {names}')
+        self.stdout.write(self.style.SUCCESS(f'No regressions over {threshold:.0%}'))
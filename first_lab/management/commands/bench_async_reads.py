@@ -0,0 +1,95 @@
+import asyncio
+import statistics
+import time
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+SYNC_URLCONF = 'Network.urls'
+ASYNC_URLCONF = 'Network.asgi_urls'
+
+
+class Command(BaseCommand):
+    help = ('Compares the synchronous and the native async read views under ASGI by sending concurrent '
+            'GET requests to the in-process ASGI application')
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', default=['/api/v1/books/', '/api/v1/booklovers/',
+                                                         '/api/v1/publishers/?page=1&pagesize=50'])
+        parser.add_argument('--requests', type=int, default=500, help='Requests per path and per mode')
+        parser.add_argument('--concurrency', type=int, default=100, help='Requests in flight at once')
+        parser.add_argument('--client-delay', type=float, default=0.0,
+                            help='Seconds a simulated slow client takes to read the response body')
+        parser.add_argument('--host', default='localhost')
+
+    def handle(self, *args, **options):
+        if options['requests'] <= 0 or options['concurrency'] <= 0:
+            raise CommandError('--requests and --concurrency must be positive')
+        for path in options['paths']:
+            for mode, urlconf in (('sync', SYNC_URLCONF), ('async', ASYNC_URLCONF)):
+                with override_settings(ROOT_URLCONF=urlconf):
+                    result = asyncio.run(self.run_path(path, options))
+                self.stdout.write(self.format_result(path, mode, result))
+
+    async def run_path(self, path, options):
+        application = ASGIHandler()
+        semaphore = asyncio.Semaphore(options['concurrency'])
+        latencies = []
+        statuses = {}
+
+        async def one():
+            async with semaphore:
+                started = time.perf_counter()
+                status = await self.request(application, path, options['host'], options['client_delay'])
+                latencies.append(time.perf_counter() - started)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        # Прогрев: первый запрос импортирует URLconf и открывает соединение с БД
+        await self.request(application, path, options['host'], 0)
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(options['requests'])))
+        elapsed = time.perf_counter() - started
+        return {'elapsed': elapsed, 'latencies': sorted(latencies), 'statuses': statuses}
+
+    @staticmethod
+    async def request(application, path, host, client_delay):
+        path, _, query_string = path.partition('?')
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': path, 'raw_path': path.encode('utf-8'), 'query_string': query_string.encode('utf-8'),
+            'headers': [(b'host', host.encode('ascii')), (b'accept', b'application/json')],
+            'server': (host, 80), 'client': ('127.0.0.1', 0),
+        }
+        disconnected = asyncio.Event()
+        status = None
+
+        async def receive():
+            if not receive.sent:
+                receive.sent = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        receive.sent = False
+
+        async def send(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            elif message['type'] == 'http.response.body' and client_delay:
+                await asyncio.sleep(client_delay)
+
+        try:
+            await application(scope, receive, send)
+        finally:
+            disconnected.set()
+        return status
+
+    @staticmethod
+    def format_result(path, mode, result):
+        latencies = result['latencies']
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        statuses = ', '.join(f'{status}: {count}' for status, count in sorted(result['statuses'].items()))
+        return (f'{mode:>5} {path}: {len(latencies) / result["elapsed"]:.1f} req/s, '
+                f'p50 {statistics.median(latencies) * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms ({statuses})')
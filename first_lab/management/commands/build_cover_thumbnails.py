@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from first_lab.models import Book
+from first_lab.thumbnails import generate_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Builds cover thumbnails for books uploaded before the thumbnail pipeline or whose processing failed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Rebuild thumbnails that already exist too')
+
+    def handle(self, *args, **options):
+        books = Book.objects.exclude(cover_photo='').exclude(cover_photo__isnull=True)
+        if not options['all']:
+            books = books.filter(cover_thumbnails__isnull=True)
+
+        built = failed = 0
+        for book_id, name in books.values_list('pk', 'cover_photo').iterator():
+            if generate_thumbnails(book_id, name) is None:
+                failed += 1
+            else:
+                built += 1
+        self.stdout.write(f'Built thumbnails for {built} books, failed: {failed}')
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from first_lab.models import CoverUpload
+from first_lab.uploads import discard, get_expired
+
+
+class Command(BaseCommand):
+    help = 'Deletes cover upload sessions older than COVER_UPLOAD_EXPIRY_HOURS together with their part files'
+
+    def handle(self, *args, **options):
+        expired = list(get_expired(CoverUpload.objects.all()))
+        for upload in expired:
+            discard(upload)
+        self.stdout.write(f'Deleted {len(expired)} expired uploads')
@@ -0,0 +1,33 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from first_lab.importers import BookLoverImporter, FORMATS, detect_format
+
+
+class Command(BaseCommand):
+    help = 'Imports BookLover records from a CSV or NDJSON file, upserting on a natural key'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to the CSV or NDJSON file')
+        parser.add_argument('--format', choices=FORMATS, help='File format, detected from the extension by default')
+        parser.add_argument('--key', default=','.join(BookLoverImporter.default_key_fields),
+                            help='Comma separated natural key fields, a unique constraint of BookLover')
+        parser.add_argument('--chunk-size', type=int, default=BookLoverImporter.chunk_size)
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or detect_format(options['path'])
+        if file_format is None:
+            raise CommandError('Can not detect the file format, pass --format')
+
+        try:
+            importer = BookLoverImporter(key_fields=options['key'].split(','), chunk_size=options['chunk_size'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        try:
+            with open(options['path'], 'rb') as lines:
+                report = importer.run(lines, file_format)
+        except (OSError, UnicodeDecodeError) as exc:
+            raise CommandError(str(exc))
+
+        self.stdout.write(json.dumps(report.as_dict(), ensure_ascii=False, indent=2, default=str))
@@ -0,0 +1,99 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from first_lab.cache import publisher_list_cache, region_list_cache
+from first_lab.seeding import TABLES, CatalogPlan, finish, generate_chunk, seed_chunk, start, store_chunk
+
+
+def run_chunk(plan, table, chunk, alias):
+    try:
+        return seed_chunk(plan, table, chunk, alias)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = ('Generates a large, referentially consistent catalog: regions -> publishers -> books -> volumes, '
+            'plus book lovers. Uses COPY on PostgreSQL and batched inserts elsewhere; the data is '
+            'deterministic for a given --seed and --chunk-size, and chunks can be written by several processes')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--regions', type=int, default=85)
+        parser.add_argument('--publishers', type=int, default=10000)
+        parser.add_argument('--books', type=int, default=1000000)
+        parser.add_argument('--max-volumes', type=int, default=4, help='Each book gets 1..N volumes')
+        parser.add_argument('--book-lovers', type=int, default=1000000)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--chunk-size', type=int, default=50000, help='Rows generated and committed at once')
+        parser.add_argument('--workers', type=int, default=1, help='Processes writing chunks in parallel')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        counts = {table: options[table] for table in TABLES}
+        if min(counts.values()) < 0 or options['chunk_size'] <= 0 or options['workers'] <= 0:
+            raise CommandError('Counts must not be negative, --chunk-size and --workers must be positive')
+        if options['max_volumes'] <= 0:
+            raise CommandError('--max-volumes must be positive')
+
+        alias = options['database']
+        plan = CatalogPlan.for_database(alias, options['seed'], counts, max_volumes=options['max_volumes'],
+                                        chunk_size=options['chunk_size'])
+        try:
+            plan.validate()
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        if options['workers'] > 1 and 'fork' not in multiprocessing.get_all_start_methods():
+            raise CommandError('--workers needs the fork start method, which this platform does not have')
+
+        started = time.perf_counter()
+        # Триггеры счетчиков выключены только в соединениях загрузки; finish() пересчитывает счетчики один раз
+        try:
+            start(alias)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        try:
+            if options['workers'] == 1:
+                totals = self.seed(plan, lambda table, chunks: (seed_chunk(plan, table, chunk, alias)
+                                                                for chunk in chunks))
+            else:
+                # fork наследует настройки вместе с тестовой базой; соединения закрываем, дочерние откроют свои
+                concurrent_writes = connections[alias].vendor == 'postgresql'
+                connections.close_all()
+                with ProcessPoolExecutor(options['workers'],
+                                         mp_context=multiprocessing.get_context('fork')) as executor:
+                    if concurrent_writes:
+                        totals = self.seed(plan, lambda table, chunks: executor.map(
+                            run_chunk, repeat(plan), repeat(table), chunks, repeat(alias)))
+                    else:
+                        # SQLite пишет только один процесс: дочерние генерируют строки, родитель их записывает
+                        totals = self.seed(plan, lambda table, chunks: (
+                            store_chunk(rows, alias)
+                            for rows in executor.map(generate_chunk, repeat(plan), repeat(table), chunks)))
+        finally:
+            finish(alias)
+        region_list_cache.invalidate()
+        publisher_list_cache.invalidate()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {sum(totals.values())} rows in {elapsed:.1f} s '
+            f'({sum(totals.values()) / max(elapsed, 1e-9):.0f} rows/s)'))
+
+    def seed(self, plan, map_chunks):
+        """Writes the tables in dependency order; chunks of one table may run in parallel."""
+        totals = {}
+        for table in TABLES:
+            started = time.perf_counter()
+            written = {}
+            for result in map_chunks(table, plan.get_chunks(table)):
+                for name, count in result.items():
+                    written[name] = written.get(name, 0) + count
+            for name, count in written.items():
+                totals[name] = totals.get(name, 0) + count
+                self.stdout.write(f'{name}: {count} rows in {time.perf_counter() - started:.1f} s')
+        return totals
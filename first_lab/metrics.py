@@ -0,0 +1,226 @@
+import json
+import os
+import tempfile
+import time
+from threading import Lock
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = Lock()
+        (registry or default_registry).register(self)
+
+    def get_key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def collect(self):
+        """Returns a snapshot ``{label values: value}`` of this process."""
+        with self.lock:
+            return dict(self.values)
+
+    @staticmethod
+    def merge(total, values):
+        for key, value in values.items():
+            total[key] = total.get(key, 0) + value
+
+    def samples(self, values):
+        return [(self.name, format_labels(self.labelnames, key), value) for key, value in sorted(values.items())]
+
+    def render(self, values):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        for name, labels, value in self.samples(values):
+            lines.append(f'{name}{labels} {format_value(value)}')
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.get_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self.get_key(labels)
+        with self.lock:
+            self.values[key] = value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value, **labels):
+        key = self.get_key(labels)
+        with self.lock:
+            counts = self.values.get(key)
+            if counts is None:
+                # Счетчики по корзинам (не накопительные), затем сумма и количество
+                counts = self.values[key] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            counts[-2] += value
+            counts[-1] += 1
+
+    def collect(self):
+        with self.lock:
+            return {key: list(counts) for key, counts in self.values.items()}
+
+    @staticmethod
+    def merge(total, values):
+        for key, counts in values.items():
+            current = total.get(key)
+            total[key] = list(counts) if current is None else [a + b for a, b in zip(current, counts)]
+
+    def samples(self, values):
+        samples = []
+        for key, counts in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = format_labels(self.labelnames, key, [('le', format_value(bound))])
+                samples.append((f'{self.name}_bucket', labels, cumulative))
+            samples.append((f'{self.name}_bucket', format_labels(self.labelnames, key, [('le', '+Inf')]), counts[-1]))
+            samples.append((f'{self.name}_sum', format_labels(self.labelnames, key), counts[-2]))
+            samples.append((f'{self.name}_count', format_labels(self.labelnames, key), counts[-1]))
+        return samples
+
+
+class CallbackMetric(Metric):
+    """A gauge or counter read at scrape time from ``callback``, which returns ``{label values: value}``."""
+
+    def __init__(self, name, documentation, type, callback, labelnames=(), registry=None):
+        self.type = type
+        self.callback = callback
+        super().__init__(name, documentation, labelnames, registry)
+
+    def collect(self):
+        return dict(self.callback())
+
+
+def is_process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Registry:
+    """
+    Metrics of this process. With a shared ``directory`` (METRICS_DIR) every
+    worker periodically writes a snapshot there and a scrape sums the snapshots
+    of all workers, as prometheus_client does in multiprocess mode. Gauges of
+    exited workers are dropped, their counters and histograms are kept.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = Lock()
+        self.flushed_at = 0
+
+    def register(self, metric):
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError(f'Metric {metric.name} is already registered')
+            self.metrics[metric.name] = metric
+
+    def get_metrics(self):
+        with self.lock:
+            return list(self.metrics.values())
+
+    def collect(self):
+        return {metric.name: metric.collect() for metric in self.get_metrics()}
+
+    @staticmethod
+    def get_snapshot_path(directory, pid):
+        return os.path.join(directory, f'metrics-{pid}.json')
+
+    def flush(self, directory):
+        """Atomically writes this process's snapshot into ``directory``."""
+        snapshot = {name: [[list(key), value] for key, value in values.items()]
+                    for name, values in self.collect().items()}
+        os.makedirs(directory, exist_ok=True)
+        descriptor, path = tempfile.mkstemp(dir=directory, prefix='.metrics-')
+        with os.fdopen(descriptor, 'w') as file:
+            json.dump(snapshot, file, separators=(',', ':'))
+        os.replace(path, self.get_snapshot_path(directory, os.getpid()))
+        self.flushed_at = time.monotonic()
+
+    def maybe_flush(self, directory, interval):
+        if directory and time.monotonic() - self.flushed_at >= interval:
+            # Отметка ставится до записи, чтобы параллельные потоки не писали снимок одновременно
+            self.flushed_at = time.monotonic()
+            self.flush(directory)
+
+    def load_snapshots(self, directory):
+        """Yields ``(alive, snapshot)`` for every other process that wrote into ``directory``."""
+        if not directory or not os.path.isdir(directory):
+            return
+        own = self.get_snapshot_path(directory, os.getpid())
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if not name.startswith('metrics-') or not name.endswith('.json') or path == own:
+                continue
+            try:
+                with open(path) as file:
+                    snapshot = json.load(file)
+                pid = int(name[len('metrics-'):-len('.json')])
+            except (OSError, ValueError):
+                continue
+            yield is_process_alive(pid), {
+                metric: {tuple(key): value for key, value in values} for metric, values in snapshot.items()
+            }
+
+    def render(self, directory=None):
+        metrics = self.get_metrics()
+        totals = {metric.name: metric.collect() for metric in metrics}
+        for alive, snapshot in self.load_snapshots(directory):
+            for metric in metrics:
+                if metric.name in snapshot and (alive or metric.type != 'gauge'):
+                    metric.merge(totals[metric.name], snapshot[metric.name])
+        return '\n'.join(metric.render(totals[metric.name]) for metric in metrics) + '\n'
+
+
+default_registry = Registry()
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
@@ -0,0 +1,342 @@
+import time
+import zlib
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.cache import patch_vary_headers
+
+from first_lab.conditional import add_content_coding
+from first_lab.db_metrics import QueryStats, query_stats
+from first_lab.hashing import HashingBusy
+from first_lab.metrics import Histogram, default_registry
+from first_lab.routers import ReplicaState, replica_state
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# text/html не сжимаем: страницы browsable API содержат CSRF-токен (атака BREACH)
+COMPRESSIBLE_TYPES = {'application/json', 'application/x-ndjson', 'application/javascript', 'application/xml',
+                      'text/csv', 'text/plain', 'text/css', 'image/svg+xml'}
+# Сжатый поток сбрасывается клиенту не чаще, чем раз на столько байт исходных данных
+STREAM_FLUSH_SIZE = 64 * 1024
+
+request_seconds = Histogram('network_request_duration_seconds', 'Time spent serving a request',
+                            ['route', 'method', 'status'])
+request_queries = Histogram('network_request_db_queries', 'Database queries run while serving a request',
+                            ['route', 'method', 'status'], buckets=QUERY_BUCKETS)
+request_db_seconds = Histogram('network_request_db_seconds', 'Time spent in the database while serving a request',
+                               ['route', 'method', 'status'])
+
+
+class MetricsMiddleware:
+    """
+    Records latency, query count and database time of every request, labelled
+    by URL name, method and status code. With METRICS_DIR set the process
+    snapshot is written there at most every METRICS_FLUSH_INTERVAL seconds, so
+    the metrics endpoint of any worker reports the totals of all of them.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.directory = getattr(settings, 'METRICS_DIR', None)
+        self.interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 1)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = QueryStats()
+        token = query_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            query_stats.reset(token)
+        self.observe(request, response, stats, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        stats = QueryStats()
+        token = query_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            query_stats.reset(token)
+        self.observe(request, response, stats, time.perf_counter() - started)
+        return response
+
+    def observe(self, request, response, stats, seconds):
+        match = getattr(request, 'resolver_match', None)
+        # Только имена маршрутов и известные методы: число рядов метрик остается ограниченным
+        labels = {
+            'route': match.url_name or 'unnamed' if match is not None else 'unmatched',
+            'method': request.method if request.method in METHODS else 'other',
+            'status': response.status_code,
+        }
+        request_seconds.observe(seconds, **labels)
+        request_queries.observe(stats.queries, **labels)
+        request_db_seconds.observe(stats.seconds, **labels)
+        default_registry.maybe_flush(self.directory, self.interval)
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Lets ReplicaRouter see the current request, and after a successful write
+    pins the client to the primary for REPLICA_STICKINESS_SECONDS so it reads
+    its own writes.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = ReplicaState(request)
+        token = replica_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            replica_state.reset(token)
+        return self.process_response(state, request, response)
+
+    async def __acall__(self, request):
+        state = ReplicaState(request)
+        token = replica_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            replica_state.reset(token)
+        return self.process_response(state, request, response)
+
+    @staticmethod
+    def process_response(state, request, response):
+        # Чтения с небезопасным методом (POST batch/) помечает сама view через mark_read_only()
+        if not state.read_only and response.status_code < 400:
+            state.mark_write(response)
+        return response
+
+
+class HashingBusyMiddleware:
+    """
+    Answers 503 with Retry-After when the password hashing pool is full,
+    wherever the password was checked: API login, Basic authentication or
+    the admin login form.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
+
+    @staticmethod
+    def process_exception(request, exception):
+        if not isinstance(exception, HashingBusy):
+            return None
+        return JsonResponse({'error': 'Too many authentication requests, retry later'},
+                            status=503, headers={'Retry-After': str(getattr(settings, 'HASHING_RETRY_AFTER', 1))})
+
+
+class GzipEncoder:
+    available = True
+
+    def __init__(self, level):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data, flush=False):
+        output = self.compressor.compress(data)
+        return output + self.compressor.flush(zlib.Z_SYNC_FLUSH) if flush else output
+
+    def finish(self):
+        return self.compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliEncoder:
+    available = brotli is not None
+
+    def __init__(self, level):
+        self.compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data, flush=False):
+        output = self.compressor.process(data)
+        return output + self.compressor.flush() if flush else output
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+class ZstdEncoder:
+    available = zstandard is not None
+
+    def __init__(self, level):
+        self.compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data, flush=False):
+        output = self.compressor.compress(data)
+        return output + self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK) if flush else output
+
+    def finish(self):
+        return self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+# В порядке предпочтения сервера при равных q; уровни - компромисс между размером и CPU на запрос
+ENCODERS = {'zstd': ZstdEncoder, 'br': BrotliEncoder, 'gzip': GzipEncoder}
+DEFAULT_LEVELS = {'zstd': 3, 'br': 4, 'gzip': 4}
+
+
+def parse_accept_encoding(header):
+    """{coding: q} from an Accept-Encoding header."""
+    weights = {}
+    for item in header.split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights['gzip' if coding == 'x-gzip' else coding] = weight
+    return weights
+
+
+def choose_encoding(header, codings):
+    """The acceptable coding with the highest q, ``codings`` order breaking ties; None for identity."""
+    weights = parse_accept_encoding(header)
+    best, best_weight = None, 0.0
+    for coding in codings:
+        weight = weights.get(coding, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+def is_compressible(content_type):
+    media_type = content_type.split(';')[0].strip().lower()
+    return media_type in COMPRESSIBLE_TYPES or media_type.endswith('+json')
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses with the best coding the client accepts: zstd, br or
+    gzip, whichever are installed and listed in COMPRESSION_ENCODINGS. Bodies
+    under COMPRESSION_MIN_SIZE bytes and non-text types are sent as is.
+    Streaming responses are compressed incrementally and flushed every
+    STREAM_FLUSH_SIZE bytes of input. A compressed response keeps a strong
+    ETag with the coding appended, which ConditionalRequestMixin understands.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+        levels = {**DEFAULT_LEVELS, **getattr(settings, 'COMPRESSION_LEVELS', {})}
+        enabled = getattr(settings, 'COMPRESSION_ENCODINGS', list(ENCODERS))
+        self.encoders = {coding: (encoder, levels[coding]) for coding, encoder in ENCODERS.items()
+                         if coding in enabled and encoder.available}
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def get_encoder(self, coding):
+        encoder, level = self.encoders[coding]
+        return encoder(level)
+
+    def process_response(self, request, response):
+        if (not self.encoders or response.has_header('Content-Encoding') or response.status_code in (204, 206, 304)
+                or not is_compressible(response.get('Content-Type', ''))):
+            return response
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        coding = choose_encoding(request.headers.get('Accept-Encoding', ''), self.encoders)
+        if coding is None:
+            return response
+
+        encoder = self.get_encoder(coding)
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = acompress_stream(encoder, response.streaming_content)
+            else:
+                response.streaming_content = compress_stream(encoder, response.streaming_content)
+            del response['Content-Length']
+        else:
+            content = encoder.compress(response.content) + encoder.finish()
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response['Content-Length'] = str(len(content))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = add_content_coding(etag, coding)
+        response['Content-Encoding'] = coding
+        return response
+
+
+def compress_stream(encoder, chunks):
+    pending = 0
+    for chunk in chunks:
+        pending += len(chunk)
+        flush = pending >= STREAM_FLUSH_SIZE
+        if flush:
+            pending = 0
+        output = encoder.compress(chunk, flush)
+        if output:
+            yield output
+    yield encoder.finish()
+
+
+async def acompress_stream(encoder, chunks):
+    pending = 0
+    async for chunk in chunks:
+        pending += len(chunk)
+        flush = pending >= STREAM_FLUSH_SIZE
+        if flush:
+            pending = 0
+        output = encoder.compress(chunk, flush)
+        if output:
+            yield output
+    yield encoder.finish()
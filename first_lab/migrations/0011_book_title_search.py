@@ -0,0 +1,40 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+from first_lab.search import get_title_indexes, install_sqlite_search, uninstall_sqlite_search
+
+
+def create_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        book = apps.get_model('first_lab', 'Book')
+        for index in get_title_indexes():
+            schema_editor.add_index(book, index)
+    elif vendor == 'sqlite':
+        try:
+            install_sqlite_search(schema_editor)
+        except OperationalError:
+            # SQLite собран без FTS5: поиск откатится на icontains
+            uninstall_sqlite_search(schema_editor)
+
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        book = apps.get_model('first_lab', 'Book')
+        for index in get_title_indexes():
+            schema_editor.remove_index(book, index)
+    elif vendor == 'sqlite':
+        uninstall_sqlite_search(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('first_lab', '0010_book_version_booklover_version_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('first_lab', '0011_book_title_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['title'], name='book_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['year_of_release', 'id_book'], name='book_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booklover',
+            index=models.Index(fields=['birthday', 'id_book_lover'], name='booklover_birthday_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booklover',
+            index=models.Index(fields=['first_name', 'birthday', 'id_book_lover'], name='booklover_first_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booklover',
+            index=models.Index(fields=['date_of_joining'], name='booklover_joining_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='publisher',
+            index=models.Index(fields=['name'], name='publisher_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='publisher',
+            index=models.Index(fields=['region', 'id'], name='publisher_region_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='region',
+            index=models.Index(fields=['name'], name='region_name_idx'),
+        ),
+    ]
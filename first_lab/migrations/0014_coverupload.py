@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:53
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('first_lab', '0013_book_cover_thumbnails'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoverUpload',
+            fields=[
+                ('id_upload', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255)),
+                ('size', models.PositiveBigIntegerField()),
+                ('offset', models.PositiveBigIntegerField(default=0)),
+                ('checksum', models.CharField(blank=True, max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cover_uploads', to='first_lab.book')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cover_uploads', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'CoverUpload',
+            },
+        ),
+    ]
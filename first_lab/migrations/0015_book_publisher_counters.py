@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:20
+
+from django.db import migrations, models
+from django.db.utils import OperationalError
+
+from first_lab.counters import install_counters, uninstall_counters
+from first_lab.search import install_sqlite_search, uninstall_sqlite_search
+
+
+def restore_search(apps, schema_editor):
+    # AddField/RemoveField пересоздают Book в SQLite, а вместе с таблицей пропадают триггеры поиска
+    if schema_editor.connection.vendor == 'sqlite':
+        try:
+            install_sqlite_search(schema_editor)
+        except OperationalError:
+            uninstall_sqlite_search(schema_editor)
+
+
+def create_counters(apps, schema_editor):
+    restore_search(apps, schema_editor)
+    install_counters(schema_editor)
+
+
+def drop_counters(apps, schema_editor):
+    uninstall_counters(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('first_lab', '0014_coverupload'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_search),
+        migrations.AddField(
+            model_name='book',
+            name='total_pages',
+            field=models.PositiveIntegerField(db_default=0, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='volume_count',
+            field=models.PositiveIntegerField(db_default=0, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='publisher',
+            name='book_count',
+            field=models.PositiveIntegerField(db_default=0, default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['total_pages', 'id_book'], name='book_total_pages_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['volume_count', 'id_book'], name='book_volume_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='publisher',
+            index=models.Index(fields=['book_count', 'id'], name='publisher_book_count_idx'),
+        ),
+        migrations.RunPython(create_counters, drop_counters),
+    ]
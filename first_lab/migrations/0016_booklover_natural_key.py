@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:19
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicates(apps, schema_editor):
+    # Импорт всегда обновлял строку с наименьшим ключом, она и остается
+    BookLover = apps.get_model('first_lab', 'BookLover')
+    duplicates = (BookLover.objects.filter(birthday__isnull=False)
+                  .values('first_name', 'last_name', 'birthday')
+                  .annotate(first=Min('pk'), count=Count('pk'))
+                  .filter(count__gt=1))
+    for duplicate in duplicates:
+        BookLover.objects.filter(first_name=duplicate['first_name'], last_name=duplicate['last_name'],
+                                 birthday=duplicate['birthday']).exclude(pk=duplicate['first']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('first_lab', '0015_book_publisher_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='booklover',
+            constraint=models.UniqueConstraint(fields=('first_name', 'last_name', 'birthday'),
+                                               name='booklover_natural_key'),
+        ),
+    ]
@@ -1,9 +1,49 @@
+import uuid
+
+from django.conf import settings
 from django.db import models
 
 
-class BookLover(models.Model):
+class VersionedModel(models.Model):
+    """
+    Keeps a row version that is bumped on every save. Detail endpoints build ETags
+    from it and check If-Match against it without loading the whole row.
+    """
+
+    class Meta:
+        abstract = True
+
+    # Счетчики ведут триггеры базы (first_lab.counters), поэтому save() их не перезаписывает
+    counter_fields = ()
+
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            self.version = models.F('version') + 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+            elif self.counter_fields:
+                skipped = {*self.counter_fields, *self.get_deferred_fields()}
+                kwargs['update_fields'] = [field.attname for field in self._meta.concrete_fields
+                                           if not field.primary_key and field.attname not in skipped]
+        super().save(*args, **kwargs)
+        if isinstance(self.version, models.Expression):
+            self.refresh_from_db(fields=['version'])
+
+
+class BookLover(VersionedModel):
     class Meta:
         db_table = 'BookLover'
+        indexes = [
+            models.Index(fields=['birthday', 'id_book_lover'], name='booklover_birthday_idx'),
+            models.Index(fields=['first_name', 'birthday', 'id_book_lover'], name='booklover_first_name_idx'),
+            models.Index(fields=['date_of_joining'], name='booklover_joining_idx'),
+        ]
+        constraints = [
+            # Естественный ключ импорта (first_lab.importers): по нему идет upsert через ON CONFLICT
+            models.UniqueConstraint(fields=['first_name', 'last_name', 'birthday'], name='booklover_natural_key'),
+        ]
 
     id_book_lover = models.AutoField(primary_key=True)
     first_name = models.CharField(max_length=255)
@@ -18,15 +58,27 @@ class BookLover(models.Model):
         return f"{self.first_name} {self.last_name} {self.middle_name}"
 
 
-class Book(models.Model):
+class Book(VersionedModel):
     class Meta:
         db_table = "Book"
+        indexes = [
+            models.Index(fields=['title'], name='book_title_idx'),
+            models.Index(fields=['year_of_release', 'id_book'], name='book_year_idx'),
+            models.Index(fields=['total_pages', 'id_book'], name='book_total_pages_idx'),
+            models.Index(fields=['volume_count', 'id_book'], name='book_volume_count_idx'),
+        ]
 
     id_book = models.AutoField(primary_key=True)
     title = models.CharField(max_length=255)
     publisher = models.ForeignKey("Publisher", on_delete=models.CASCADE, null=True)
     year_of_release = models.PositiveIntegerField(null=True)
     cover_photo = models.ImageField(upload_to='book_covers/', null=True)
+    # Имена файлов миниатюр обложки: {size: {extension: name}}, заполняются first_lab.thumbnails
+    cover_thumbnails = models.JSONField(null=True, blank=True, editable=False)
+    volume_count = models.PositiveIntegerField(default=0, db_default=0, editable=False)
+    total_pages = models.PositiveIntegerField(default=0, db_default=0, editable=False)
+
+    counter_fields = ('volume_count', 'total_pages')
 
     def __str__(self):
         return self.title
@@ -45,10 +97,13 @@ class Volume(models.Model):
         return f"Volume {self.volume_number} of {self.book.title}"
 
 
-class Region(models.Model):
+class Region(VersionedModel):
     class Meta:
         db_table = "Region"
         unique_together = (('code', 'id'),)
+        indexes = [
+            models.Index(fields=['name'], name='region_name_idx'),
+        ]
 
     code = models.CharField(max_length=5, unique=True, verbose_name='Код области')
     name = models.CharField(max_length=100, verbose_name='Название области')
@@ -57,14 +112,40 @@ class Region(models.Model):
         return f"{self.code} - {self.name}"
 
 
-class Publisher(models.Model):
+class Publisher(VersionedModel):
     class Meta:
         db_table = "Publisher"
+        indexes = [
+            models.Index(fields=['name'], name='publisher_name_idx'),
+            models.Index(fields=['region', 'id'], name='publisher_region_idx'),
+            models.Index(fields=['book_count', 'id'], name='publisher_book_count_idx'),
+        ]
 
     name = models.CharField(max_length=255, verbose_name='Название издательства')
     region = models.ForeignKey(Region, on_delete=models.CASCADE, verbose_name='Область', related_name='publishers')
+    book_count = models.PositiveIntegerField(default=0, db_default=0, editable=False)
+
+    counter_fields = ('book_count',)
 
     def __str__(self):
         return self.name
 
 
+class CoverUpload(models.Model):
+    """A resumable cover upload session; the received bytes live in a part file on disk, see first_lab.uploads."""
+
+    class Meta:
+        db_table = "CoverUpload"
+
+    id_upload = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='cover_uploads')
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='cover_uploads')
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    # Число подтвержденных байт: следующий фрагмент должен начинаться не дальше этой позиции
+    offset = models.PositiveBigIntegerField(default=0)
+    checksum = models.CharField(max_length=64, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Upload {self.id_upload} of {self.filename} ({self.offset}/{self.size})"
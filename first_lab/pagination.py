@@ -0,0 +1,178 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination: a page is selected with a WHERE condition on the
+    last row of the previous page, so there is no COUNT(*) and no OFFSET scan.
+
+    Rows are ordered by ``ordering_field`` with the primary key as a tiebreaker;
+    NULLs always come last in forward order.
+    """
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    page_size_query_param = 'pagesize'
+    page_size = 10
+    max_page_size = 1000
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, ordering_field, descending=False):
+        self.ordering_field = ordering_field
+        self.descending = descending
+
+    @classmethod
+    def for_view(cls, view, request):
+        """Pages in the order of the view's ``sort`` parameter if it has one, else by its keyset field."""
+        sort = view.get_sort(request) if hasattr(view, 'get_sort') else None
+        if sort is not None:
+            return cls(*sort)
+        return cls(view.keyset_ordering_field, descending=view.get_ordering(request) == 'desc')
+
+    @classmethod
+    def is_requested(cls, request):
+        return cls.cursor_query_param in request.GET or request.GET.get(cls.mode_query_param) == 'cursor'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.GET.get(self.page_size_query_param))
+        except (TypeError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        segments = self.prepare(queryset, request)
+        limit = self.page_size + 1
+        results = []
+        for segment in segments:
+            results.extend(segment[:limit - len(results)])
+            if len(results) >= limit:
+                break
+        return self.finish(results)
+
+    async def apaginate_queryset(self, queryset, request):
+        """Same as paginate_queryset, but reads the segments with the async ORM."""
+        segments = self.prepare(queryset, request)
+        limit = self.page_size + 1
+        results = []
+        for segment in segments:
+            results.extend([row async for row in segment[:limit - len(results)]])
+            if len(results) >= limit:
+                break
+        return self.finish(results)
+
+    def prepare(self, queryset, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        opts = queryset.model._meta
+        self.field = opts.get_field(self.ordering_field)
+        self.column = self.field.attname
+        self.pk_column = opts.pk.attname
+        self.position = self.decode_cursor(request)
+        self.reverse = self.position is not None and self.position['reverse']
+        return self.get_segments(queryset, self.position, self.reverse)
+
+    def finish(self, results):
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if self.reverse:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.position is not None
+
+        self.page = results
+        return results
+
+    def get_segments(self, queryset, position, reverse):
+        """
+        Splits the traversal into the non-NULL and NULL parts of the ordering
+        column. Each part is a plain range over the (column, pk) index, so no
+        query needs an OR with IS NULL or a NULLS FIRST/LAST sort.
+        """
+        ascending = self.descending == reverse
+        compare = 'gt' if ascending else 'lt'
+        prefix = '' if ascending else '-'
+        values = queryset.order_by(f'{prefix}{self.column}', f'{prefix}{self.pk_column}')
+        if not self.field.null:
+            if position is None:
+                return [values]
+            return [values.filter(self.get_position_filter(position['value'], position['pk'], compare))]
+
+        values = values.filter(**{f'{self.column}__isnull': False})
+        nulls = queryset.filter(**{f'{self.column}__isnull': True}).order_by(f'{prefix}{self.pk_column}')
+        if position is None:
+            return [values, nulls]
+        if position['value'] is None:
+            nulls = nulls.filter(**{f'{self.pk_column}__{compare}': position['pk']})
+            # NULL-значения идут в конце прямого обхода и в начале обратного
+            return [nulls, values] if reverse else [nulls]
+        values = values.filter(self.get_position_filter(position['value'], position['pk'], compare))
+        return [values] if reverse else [values, nulls]
+
+    def get_position_filter(self, value, pk, compare):
+        return Q(**{f'{self.column}__{compare}e': value}) & (
+            Q(**{f'{self.column}__{compare}': value}) | Q(**{f'{self.pk_column}__{compare}': pk})
+        )
+
+    def encode_cursor(self, instance, reverse):
+        # Строка страницы - экземпляр модели или словарь из values()
+        if isinstance(instance, dict):
+            value, pk = instance[self.column], instance[self.pk_column]
+        else:
+            value, pk = getattr(instance, self.column), getattr(instance, self.pk_column)
+        payload = {
+            'v': None if value is None else str(value),
+            'pk': pk,
+            'r': reverse,
+        }
+        encoded = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param,
+                                   encoded.decode('ascii'))
+
+    def decode_cursor(self, request):
+        encoded = request.GET.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            value = payload['v']
+            return {
+                'value': None if value is None else self.field.to_python(value),
+                'pk': int(payload['pk']),
+                'reverse': bool(payload['r']),
+            }
+        except Exception:
+            raise ValidationError({self.cursor_query_param: [self.invalid_cursor_message]})
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_data(self, data):
+        return OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ])
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
@@ -0,0 +1,93 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+PRIMARY = 'default'
+# Приложения, которые всегда читаются с основной базы: вход, токены и сессии не должны отставать
+PRIMARY_APPS = {'auth', 'authtoken', 'sessions', 'contenttypes', 'admin'}
+STICKY_COOKIE = 'primary_sticky'
+
+replica_state = ContextVar('replica_state', default=None)
+
+
+def get_stickiness():
+    return getattr(settings, 'REPLICA_STICKINESS_SECONDS', 5)
+
+
+def get_sticky_key(user_pk):
+    return f'replica:sticky:user:{user_pk}'
+
+
+def mark_read_only():
+    """
+    Declares the current request a read although its method is not (e.g. a
+    POST multi-get): it may use replicas and does not pin the client to the primary.
+    """
+    state = replica_state.get()
+    if state is not None:
+        state.read_only = True
+
+
+class ReplicaState:
+    """
+    Decides once per request whether reads may go to a replica. The decision is
+    made lazily on the first routed read, after DRF has authenticated the user,
+    so per-user stickiness works for clients that do not keep cookies.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.read_only = request.method in ('GET', 'HEAD', 'OPTIONS')
+        self.use_replica = None
+
+    def may_use_replica(self):
+        if self.use_replica is None:
+            self.use_replica = self.read_only and self.request.method != 'OPTIONS' and not self.is_sticky()
+        return self.use_replica
+
+    def is_sticky(self):
+        if STICKY_COOKIE in self.request.COOKIES:
+            return True
+        # Пользователь и сессия читаются с основной базы (PRIMARY_APPS), рекурсии в роутер нет
+        user = getattr(self.request, 'user', None)
+        return bool(user is not None and user.is_authenticated and cache.get(get_sticky_key(user.pk)))
+
+    def mark_write(self, response):
+        stickiness = get_stickiness()
+        if stickiness <= 0:
+            return
+        response.set_cookie(STICKY_COOKIE, '1', max_age=stickiness, httponly=True, samesite='Lax')
+        user = getattr(self.request, 'user', None)
+        if user is not None and user.is_authenticated:
+            cache.set(get_sticky_key(user.pk), True, stickiness)
+
+
+class ReplicaRouter:
+    """
+    Sends reads of GET/HEAD requests to a random replica from REPLICA_DATABASES
+    and everything else to the primary. Code running outside a request
+    (management commands, workers) always uses the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = getattr(settings, 'REPLICA_DATABASES', [])
+        state = replica_state.get()
+        if not replicas or state is None or model._meta.app_label in PRIMARY_APPS:
+            return PRIMARY
+        if not state.may_use_replica():
+            return PRIMARY
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY, *getattr(settings, 'REPLICA_DATABASES', [])}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
@@ -0,0 +1,109 @@
+from django.db import connections
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = 'simple'
+TRIGRAM_INDEX_NAME = 'book_title_trgm_idx'
+VECTOR_INDEX_NAME = 'book_title_search_idx'
+SQLITE_SEARCH_TABLE = 'BookTitleSearch'
+SQLITE_MIN_TERM_LENGTH = 3
+
+_sqlite_search_tables = {}
+
+
+def get_title_indexes():
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    return [
+        GinIndex(SearchVector('title', config=SEARCH_CONFIG), name=VECTOR_INDEX_NAME),
+        GinIndex(fields=['title'], name=TRIGRAM_INDEX_NAME, opclasses=['gin_trgm_ops']),
+    ]
+
+
+def install_sqlite_search(schema_editor):
+    """
+    (Re)creates the FTS5 trigram table over Book.title and the triggers keeping it
+    in sync. SQLite drops triggers when a migration remakes the Book table, so
+    such migrations must call this again.
+    """
+    table = schema_editor.quote_name(SQLITE_SEARCH_TABLE)
+    uninstall_sqlite_search(schema_editor)
+    statements = [
+        f"CREATE VIRTUAL TABLE {table} USING fts5("
+        f"title, content='Book', content_rowid='id_book', tokenize='trigram')",
+        f'CREATE TRIGGER "{SQLITE_SEARCH_TABLE}_ai" AFTER INSERT ON "Book" BEGIN '
+        f'INSERT INTO {table}(rowid, title) VALUES (new.id_book, new.title); END',
+        f'CREATE TRIGGER "{SQLITE_SEARCH_TABLE}_ad" AFTER DELETE ON "Book" BEGIN '
+        f"INSERT INTO {table}({table}, rowid, title) VALUES ('delete', old.id_book, old.title); END",
+        f'CREATE TRIGGER "{SQLITE_SEARCH_TABLE}_au" AFTER UPDATE OF title ON "Book" BEGIN '
+        f"INSERT INTO {table}({table}, rowid, title) VALUES ('delete', old.id_book, old.title); "
+        f'INSERT INTO {table}(rowid, title) VALUES (new.id_book, new.title); END',
+        f"INSERT INTO {table}({table}) VALUES ('rebuild')",
+    ]
+    for statement in statements:
+        schema_editor.execute(statement)
+    _sqlite_search_tables.pop(schema_editor.connection.alias, None)
+
+
+def uninstall_sqlite_search(schema_editor):
+    for trigger in ('ai', 'ad', 'au'):
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS "{SQLITE_SEARCH_TABLE}_{trigger}"')
+    schema_editor.execute(f'DROP TABLE IF EXISTS {schema_editor.quote_name(SQLITE_SEARCH_TABLE)}')
+    _sqlite_search_tables.pop(schema_editor.connection.alias, None)
+
+
+def has_sqlite_search_table(alias):
+    if alias not in _sqlite_search_tables:
+        with connections[alias].cursor() as cursor:
+            tables = connections[alias].introspection.table_names(cursor)
+        _sqlite_search_tables[alias] = SQLITE_SEARCH_TABLE in tables
+    return _sqlite_search_tables[alias]
+
+
+def search_postgresql(queryset, term):
+    from django.contrib.postgres.lookups import TrigramSimilar
+    from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+
+    vector = SearchVector('title', config=SEARCH_CONFIG)
+    query = SearchQuery(term, config=SEARCH_CONFIG, search_type='websearch')
+    # Оба условия совпадают с выражениями GIN-индексов из миграции 0011
+    return queryset.alias(search=vector).annotate(
+        rank=SearchRank(vector, query) + TrigramSimilarity('title', term),
+    ).filter(Q(search=query) | TrigramSimilar(F('title'), term))
+
+
+def search_sqlite(queryset, term):
+    words = [word for word in term.split() if len(word) >= SQLITE_MIN_TERM_LENGTH]
+    if not words or not has_sqlite_search_table(queryset.db):
+        return queryset.filter(title__icontains=term).annotate(rank=Value(0.0, output_field=FloatField()))
+
+    # Триграммный индекс не ищет слова короче трех символов, они проверяются подстрокой поверх MATCH
+    for word in term.split():
+        if len(word) < SQLITE_MIN_TERM_LENGTH:
+            queryset = queryset.filter(title__icontains=word)
+
+    match = ' AND '.join('"{}"'.format(word.replace('"', '""')) for word in words)
+    table = connections[queryset.db].ops.quote_name(SQLITE_SEARCH_TABLE)
+    book_id = f'{connections[queryset.db].ops.quote_name("Book")}.{connections[queryset.db].ops.quote_name("id_book")}'
+    # bm25 отрицателен и тем меньше, чем релевантнее строка
+    return queryset.filter(
+        id_book__in=RawSQL(f'SELECT rowid FROM {table} WHERE {table} MATCH %s', (match,)),
+    ).annotate(rank=RawSQL(
+        f'SELECT -bm25({table}) FROM {table} WHERE {table} MATCH %s AND rowid = {book_id}',
+        (match,), output_field=FloatField(),
+    ))
+
+
+def search_books(queryset, term):
+    """
+    Filters books by ``term`` and annotates a relevance ``rank`` (higher is better).
+    PostgreSQL uses full-text search plus trigram similarity backed by GIN
+    indexes; SQLite uses an FTS5 trigram table, or icontains for short terms.
+    """
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        return search_postgresql(queryset, term)
+    if vendor == 'sqlite':
+        return search_sqlite(queryset, term)
+    return queryset.filter(title__icontains=term).annotate(rank=Value(0.0, output_field=FloatField()))
@@ -0,0 +1,259 @@
+import io
+import random
+from datetime import date, timedelta
+
+from django.core.management.color import no_style
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Max
+
+from first_lab.counters import get_recount_statements
+from first_lab.models import Book, BookLover, Publisher, Region, Volume
+
+REGION_NAMES = ['Moscow', 'Leningrad', 'Novosibirsk', 'Sverdlovsk', 'Kazan', 'Samara', 'Omsk', 'Rostov',
+                'Ufa', 'Krasnoyarsk', 'Voronezh', 'Perm', 'Volgograd', 'Tomsk', 'Irkutsk', 'Yaroslavl']
+FIRST_NAMES = ['Ivan', 'Anna', 'Petr', 'Olga', 'Sergey', 'Maria', 'Dmitry', 'Elena', 'Alexey', 'Irina',
+               'John', 'Jane', 'Pavel', 'Natalia', 'Nikolay', 'Tatiana']
+LAST_NAMES = ['Ivanov', 'Petrova', 'Sidorov', 'Smirnova', 'Kuznetsov', 'Popova', 'Volkov', 'Sokolova',
+              'Lebedev', 'Kozlova', 'Doe', 'Morozov']
+WORDS = ['river', 'winter', 'night', 'garden', 'silent', 'city', 'war', 'peace', 'storm', 'letters', 'north',
+         'journey', 'shadow', 'island', 'mountain', 'secret', 'house', 'summer', 'song', 'stone']
+PUBLISHER_SUFFIXES = ['Press', 'Books', 'Publishing', 'House', 'Media']
+STREETS = ['Lenina', 'Mira', 'Sadovaya', 'Gagarina', 'Pushkina', 'Central', 'Lesnaya', 'Shkolnaya']
+
+# Порядок важен: строки ссылаются на уже загруженные таблицы
+TABLES = ['regions', 'publishers', 'books', 'book_lovers']
+MODELS = {'regions': Region, 'publishers': Publisher, 'books': Book, 'book_lovers': BookLover}
+COLUMNS = {
+    Region: ['id', 'code', 'name', 'version'],
+    Publisher: ['id', 'name', 'region', 'version'],
+    Book: ['id_book', 'title', 'publisher', 'year_of_release', 'cover_photo', 'cover_thumbnails', 'version'],
+    Volume: ['book', 'volume_number', 'number_of_pages'],
+    BookLover: ['id_book_lover', 'first_name', 'last_name', 'middle_name', 'birthday', 'date_of_joining',
+                'address', 'phone', 'version'],
+}
+COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def to_base36(number):
+    digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+    result = ''
+    while True:
+        number, remainder = divmod(number, 36)
+        result = digits[remainder] + result
+        if not number:
+            return result
+
+
+def get_day(rng, start, end):
+    return (start + timedelta(days=rng.randrange((end - start).days))).isoformat()
+
+
+class CatalogPlan:
+    """
+    What to generate: row counts, the first primary key of every table and the
+    seed. Rows are generated in chunks of ``chunk_size`` and every chunk has its
+    own random source derived from the seed, so the data depends only on the
+    seed and the chunk size, not on the number of workers or the order they run.
+    """
+
+    def __init__(self, seed, counts, first_ids, max_volumes=4, chunk_size=50000):
+        self.seed = seed
+        self.counts = counts
+        self.first_ids = first_ids
+        self.max_volumes = max_volumes
+        self.chunk_size = chunk_size
+
+    @classmethod
+    def for_database(cls, alias, seed, counts, **kwargs):
+        """A plan whose keys follow the rows already in the database."""
+        first_ids = {}
+        for table, model in MODELS.items():
+            last = model.objects.using(alias).aggregate(last=Max('pk'))['last']
+            first_ids[table] = (last or 0) + 1
+        return cls(seed, counts, first_ids, **kwargs)
+
+    def validate(self):
+        for table, parent in (('publishers', 'regions'), ('books', 'publishers')):
+            if self.counts[table] and not self.counts[parent]:
+                raise ValueError(f'Seeding {table} needs {parent} to reference')
+        if self.first_ids['regions'] + self.counts['regions'] > 36 ** 4:
+            # Код области - 'C' и ключ в base36, поле вмещает 5 символов
+            raise ValueError('Region keys are too large for 5 character region codes')
+
+    def get_ids(self, table):
+        return range(self.first_ids[table], self.first_ids[table] + self.counts[table])
+
+    def get_chunks(self, table):
+        return range((self.counts[table] + self.chunk_size - 1) // self.chunk_size)
+
+    def get_random(self, table, chunk):
+        return random.Random(f'{self.seed}:{table}:{chunk}')
+
+    def pick(self, rng, table):
+        # Квадрат равномерной величины: небольшая часть издательств и областей получает большую часть строк
+        ids = self.get_ids(table)
+        return ids[int(len(ids) * rng.random() ** 2)]
+
+
+def generate_regions(plan, rng, ids):
+    for pk in ids:
+        yield pk, f'C{to_base36(pk)}', f'{rng.choice(REGION_NAMES)} region {pk}', 1
+
+
+def generate_publishers(plan, rng, ids):
+    for pk in ids:
+        name = f'{rng.choice(WORDS).capitalize()} {rng.choice(PUBLISHER_SUFFIXES)} {pk}'
+        yield pk, name, plan.pick(rng, 'regions'), 1
+
+
+def generate_books(plan, rng, ids):
+    for pk in ids:
+        title = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))).capitalize()
+        yield pk, title, plan.pick(rng, 'publishers'), rng.randint(1850, 2024), None, None, 1
+
+
+def generate_volumes(plan, rng, book_ids):
+    for book_id in book_ids:
+        for number in range(1, rng.randint(1, plan.max_volumes) + 1):
+            yield book_id, number, rng.randint(40, 1200)
+
+
+def generate_book_lovers(plan, rng, ids):
+    for pk in ids:
+        birthday = get_day(rng, date(1940, 1, 1), date(2010, 1, 1))
+        yield (
+            pk,
+            rng.choice(FIRST_NAMES),
+            # Номер в фамилии, как у издательств и областей: (имя, фамилия, дата рождения) уникальны
+            f'{rng.choice(LAST_NAMES)} {pk}',
+            rng.choice(FIRST_NAMES) + 'ovich' if rng.random() < 0.7 else None,
+            birthday,
+            get_day(rng, max(date.fromisoformat(birthday) + timedelta(days=16 * 365), date(2000, 1, 1)),
+                    date(2026, 1, 1)),
+            f'{rng.randint(1, 150)} {rng.choice(STREETS)} St, apt {rng.randint(1, 300)}',
+            f'+7{rng.randint(9000000000, 9999999999)}',
+            1,
+        )
+
+
+GENERATORS = {
+    'regions': generate_regions,
+    'publishers': generate_publishers,
+    'books': generate_books,
+    'book_lovers': generate_book_lovers,
+}
+
+
+def get_columns(model):
+    return [model._meta.get_field(name).column for name in COLUMNS[model]]
+
+
+def copy_rows(connection, model, rows):
+    """Loads rows with COPY FROM STDIN (psycopg 3 or psycopg2)."""
+    quote = connection.ops.quote_name
+    sql = f'COPY {quote(model._meta.db_table)} ({", ".join(map(quote, get_columns(model)))}) FROM STDIN'
+    with connection.cursor() as cursor:
+        raw = cursor.cursor
+        if hasattr(raw, 'copy'):
+            with raw.copy(sql) as copy:
+                for row in rows:
+                    copy.write_row(row)
+            return
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write('\t'.join('\\N' if value is None else str(value).translate(COPY_ESCAPES)
+                                   for value in row))
+            buffer.write('\n')
+        buffer.seek(0)
+        raw.copy_expert(sql, buffer)
+
+
+def insert_rows(connection, model, rows, batch_size=5000):
+    quote = connection.ops.quote_name
+    columns = get_columns(model)
+    sql = (f'INSERT INTO {quote(model._meta.db_table)} ({", ".join(map(quote, columns))}) '
+           f'VALUES ({", ".join(["%s"] * len(columns))})')
+    batch = []
+    with connection.cursor() as cursor:
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                cursor.executemany(sql, batch)
+                batch = []
+        if batch:
+            cursor.executemany(sql, batch)
+
+
+def write_rows(connection, model, rows):
+    if connection.vendor == 'postgresql':
+        copy_rows(connection, model, rows)
+    else:
+        insert_rows(connection, model, rows)
+    return len(rows)
+
+
+def generate_chunk(plan, table, chunk):
+    """Returns ``{table: rows}`` for one chunk of ``table``; a chunk of books brings its volumes along."""
+    ids = plan.get_ids(table)[chunk * plan.chunk_size:(chunk + 1) * plan.chunk_size]
+    rows = {table: list(GENERATORS[table](plan, plan.get_random(table, chunk), ids))}
+    if table == 'books':
+        rows['volumes'] = list(generate_volumes(plan, plan.get_random('volumes', chunk), ids))
+    return rows
+
+
+def pause_counters(connection):
+    """
+    Turns the counter triggers (first_lab.counters) off for the current
+    transaction of this connection only: otherwise every chunk updates the same
+    hot publisher and book rows, and parallel workers wait on, or deadlock
+    over, those row locks. Other sessions keep their triggers, and finish()
+    recounts what the load skipped. SQLite can not turn triggers off for one
+    connection, so there they stay on; it has a single writer anyway.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            # В режиме replica не срабатывают и проверки внешних ключей: строки плана ссылаются
+            # только на уже загруженные строки
+            cursor.execute('SET LOCAL session_replication_role = replica')
+
+
+def store_chunk(rows, alias='default'):
+    """Writes generated rows in one transaction; returns the number of rows per table."""
+    connection = connections[alias]
+    with transaction.atomic(using=alias):
+        pause_counters(connection)
+        return {table: write_rows(connection, Volume if table == 'volumes' else MODELS[table], table_rows)
+                for table, table_rows in rows.items()}
+
+
+def seed_chunk(plan, table, chunk, alias='default'):
+    return store_chunk(generate_chunk(plan, table, chunk), alias)
+
+
+def start(alias='default'):
+    """Checks that the seeding role may pause the counter triggers, see pause_counters()."""
+    connection = connections[alias]
+    try:
+        with transaction.atomic(using=alias):
+            pause_counters(connection)
+    except DatabaseError as exc:
+        raise ValueError(f'Seeding needs a role allowed to set session_replication_role (a superuser, or '
+                         f'GRANT SET ON PARAMETER on PostgreSQL 15+): {exc}')
+
+
+def finish(alias='default'):
+    """
+    Moves the sequences past the explicit keys, recounts the counters the
+    load did not maintain and refreshes the planner statistics. Running it
+    again repairs the counters after a load that was killed.
+    """
+    connection = connections[alias]
+    models = [*MODELS.values(), Volume]
+    with transaction.atomic(using=alias), connection.cursor() as cursor:
+        for statement in connection.ops.sequence_reset_sql(no_style(), models):
+            cursor.execute(statement)
+        for statement in get_recount_statements(connection.ops.quote_name):
+            cursor.execute(statement)
+    with connection.cursor() as cursor:
+        for model in models:
+            cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
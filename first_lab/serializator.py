@@ -1,18 +1,51 @@
 from django.contrib.auth.models import User
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.validators import FileExtensionValidator, get_available_image_extensions
+from django.db import transaction
 from rest_framework import serializers
 from first_lab.models import *
+from first_lab.eager_loading import group_expansions
+from first_lab.hashing import set_password
+from first_lab.thumbnails import discard_thumbnails, schedule_thumbnails
+from first_lab.uploads import SHA256_RE, get_max_size
 
 
-class RegionSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """Takes ``fields``, the names to render (see get_requested_fields); None renders all of them."""
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in [name for name in self.fields if name not in fields]:
+                self.fields.pop(name)
+
+
+class ExpandableFieldsMixin:
+    """
+    Takes ``expand``, relation paths (see get_requested_expansions) whose fields
+    are rendered as nested objects with the serializers in ``expandable_fields``
+    instead of primary keys. Expanded fields are read-only.
+    """
+    expandable_fields = {}
+
+    def __init__(self, *args, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        for name, nested in group_expansions(expand).items():
+            if name in self.fields:
+                self.fields[name] = self.expandable_fields[name](read_only=True, expand=nested)
+
+
+class RegionSerializer(ExpandableFieldsMixin, SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Region
-        fields = '__all__'
+        exclude = ['version']
 
 
-class BookLoverSerializer(serializers.ModelSerializer):
+class BookLoverSerializer(ExpandableFieldsMixin, SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = BookLover
-        fields = '__all__'
+        exclude = ['version']
         extra_kwargs = {
             'first_name': {'required': False},
             'last_name': {'required': False},
@@ -31,14 +64,22 @@ class UserSerializer(serializers.ModelSerializer):
         extra_kwargs = {'password': {'write_only': True}}
 
     def create(self, validated_data):
-        user = User.objects.create_user(**validated_data)  # Создаем пользователя с помощью метода create_user
+        # То же, что User.objects.create_user, но пароль хэшируется в пуле first_lab.hashing
+        password = validated_data.pop('password', None)
+        validated_data['username'] = User.normalize_username(validated_data['username'])
+        validated_data['email'] = User.objects.normalize_email(validated_data.get('email'))
+        user = User(**validated_data)
+        set_password(user, password)
+        user.save()
         return user
 
 
-class PublisherSerializer(serializers.ModelSerializer):
+class PublisherSerializer(ExpandableFieldsMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {'region': RegionSerializer}
+
     class Meta:
         model = Publisher
-        fields = ['id', 'name', 'region']
+        fields = ['id', 'name', 'region', 'book_count']
 
 
 class VolumeSerializer(serializers.ModelSerializer):
@@ -47,16 +88,179 @@ class VolumeSerializer(serializers.ModelSerializer):
         fields = ['id_volume', 'volume_number', 'number_of_pages']
 
 
-class BookSerializer(serializers.ModelSerializer):
+class PublisherLookupField(serializers.PrimaryKeyRelatedField):
+    """
+    Resolves publishers from context['publishers'] when a batch has preloaded them,
+    so validating thousands of books does not query the publisher once per book.
+    """
+
+    def to_internal_value(self, data):
+        publishers = self.context.get('publishers')
+        if publishers is None:
+            return super().to_internal_value(data)
+        try:
+            return publishers[int(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
+class BookListSerializer(serializers.ListSerializer):
+    batch_size = 1000
+
+    def preload_publishers(self):
+        ids = set()
+        for item in self.initial_data:
+            if not isinstance(item, dict) or item.get('publisher') is None:
+                continue
+            try:
+                ids.add(int(item['publisher']))
+            except (TypeError, ValueError):
+                continue
+        return Publisher.objects.in_bulk(ids)
+
+    def validate_items(self):
+        """
+        Validates every item independently and returns the validated items with
+        their indexes and a list of per-item errors.
+        """
+        self.context['publishers'] = self.preload_publishers()
+        items, errors = [], []
+        for index, item in enumerate(self.initial_data):
+            try:
+                items.append((index, self.child.run_validation(item)))
+            except serializers.ValidationError as exc:
+                errors.append({'index': index, 'errors': exc.detail})
+        return items, errors
+
+    def create(self, validated_data):
+        books = []
+        volumes_data = []
+        for item in validated_data:
+            item = dict(item)
+            volumes_data.append(item.pop('volumes', []))
+            books.append(Book(**item))
+
+        with transaction.atomic():
+            Book.objects.bulk_create(books, batch_size=self.batch_size)
+            volumes = [Volume(book=book, **volume_data)
+                       for book, book_volumes in zip(books, volumes_data)
+                       for volume_data in book_volumes]
+            Volume.objects.bulk_create(volumes, batch_size=self.batch_size)
+        return books
+
+
+class CoverPhotoField(serializers.FileField):
+    """
+    The cover upload, checked by extension and size only: ImageField would decode
+    the image with Pillow on the request thread, the thumbnail pool decodes it anyway.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('validators', [FileExtensionValidator(get_available_image_extensions())])
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        file = super().to_internal_value(data)
+        if file.size > get_max_size():
+            raise serializers.ValidationError(f'The file must not be larger than {get_max_size()} bytes')
+        return file
+
+
+class CoverThumbnailsField(serializers.ReadOnlyField):
+    """Renders the stored thumbnail names as URLs, the same way ImageField renders the cover."""
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        request = self.context.get('request')
+        thumbnails = {}
+        for size, names in value.items():
+            thumbnails[size] = {}
+            for extension, name in names.items():
+                url = default_storage.url(name)
+                thumbnails[size][extension] = request.build_absolute_uri(url) if request is not None else url
+        return thumbnails
+
+
+class BookSerializer(ExpandableFieldsMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    publisher = PublisherLookupField(queryset=Publisher.objects.all(), allow_null=True, required=False)
+    cover_photo = CoverPhotoField(allow_null=True, required=False)
     volumes = VolumeSerializer(many=True)
+    cover_thumbnails = CoverThumbnailsField()
+
+    expandable_fields = {'publisher': PublisherSerializer}
 
     class Meta:
         model = Book
-        fields = ['id_book', 'title', 'publisher', 'year_of_release', 'cover_photo', 'volumes']
+        fields = ['id_book', 'title', 'publisher', 'year_of_release', 'cover_photo', 'cover_thumbnails', 'volumes',
+                  'volume_count', 'total_pages']
+        list_serializer_class = BookListSerializer
 
     def create(self, validated_data):
         volumes_data = validated_data.pop('volumes', [])
         book = Book.objects.create(**validated_data)
         for volume_data in volumes_data:
             Volume.objects.create(book=book, **volume_data)
+        if volumes_data:
+            # Счетчики и версию книги обновили триггеры
+            book.refresh_from_db(fields=[*Book.counter_fields, 'version'])
+        schedule_thumbnails(book)
         return book
+
+    def update(self, instance, validated_data):
+        volumes_data = validated_data.pop('volumes', None)
+        with transaction.atomic():
+            if 'cover_photo' in validated_data:
+                # Файлы старых миниатюр удаляются после коммита, новые строит пул
+                discard_thumbnails(instance)
+                validated_data['cover_thumbnails'] = None
+            instance = super().update(instance, validated_data)
+            if 'cover_photo' in validated_data:
+                schedule_thumbnails(instance)
+            if volumes_data is not None:
+                instance.volumes.all().delete()
+                Volume.objects.bulk_create([Volume(book=instance, **volume_data) for volume_data in volumes_data])
+                instance._prefetched_objects_cache = {}
+                instance.refresh_from_db(fields=[*Book.counter_fields, 'version'])
+        return instance
+
+
+class BookCoverSerializer(serializers.ModelSerializer):
+    cover_photo = CoverPhotoField()
+    cover_thumbnails = CoverThumbnailsField()
+
+    class Meta:
+        model = Book
+        fields = ['id_book', 'cover_photo', 'cover_thumbnails']
+
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            discard_thumbnails(instance)
+            validated_data['cover_thumbnails'] = None
+            instance = super().update(instance, validated_data)
+            schedule_thumbnails(instance)
+        return instance
+
+
+class CoverUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CoverUpload
+        fields = ['id_upload', 'book', 'filename', 'size', 'offset', 'checksum', 'created_at']
+        read_only_fields = ['book', 'offset']
+
+    def validate_filename(self, value):
+        FileExtensionValidator(get_available_image_extensions())(File(None, name=value))
+        return value
+
+    def validate_size(self, value):
+        if not 0 < value <= get_max_size():
+            raise serializers.ValidationError(f'Size must be between 1 and {get_max_size()} bytes')
+        return value
+
+    def validate_checksum(self, value):
+        value = value.lower()
+        if value and not SHA256_RE.match(value):
+            raise serializers.ValidationError('Checksum must be a hex SHA-256 digest')
+        return value
@@ -1,14 +1,56 @@
-from django.test import TestCase
+import base64
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import zlib
+from datetime import date, timedelta
+from unittest import mock, skipUnless
+
+from django.contrib.auth import user_logged_in, user_login_failed
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, router
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from django.test import LiveServerTestCase, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from asgiref.sync import sync_to_async
+from PIL import Image
 from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
 
-from first_lab.models import BookLover
+from first_lab import seeding, uploads, urls
+from first_lab.authentication import credential_cache
+from first_lab.benchmark import compare_results, get_scenarios, run_scenario, seed_dataset
+from first_lab.counters import COUNTER_TRIGGERS
+from first_lab.hashing import PooledModelBackend
+from first_lab.management.commands import seed_catalog
+from first_lab.metrics import Counter, Gauge, Registry
+from first_lab.middleware import CompressionMiddleware, ReplicaRoutingMiddleware, choose_encoding
+from first_lab.models import BookLover, Book, CoverUpload, Publisher, Region, Volume
+from first_lab.renderers import ORJSONRenderer
+from first_lab.routers import get_sticky_key, mark_read_only
+from first_lab.seeding import CatalogPlan, generate_chunk
+from first_lab.serializator import BookLoverSerializer, BookSerializer, PublisherSerializer, RegionSerializer
+from first_lab.values_serializer import InstanceSerializer, ValuesSerializer
+from first_lab.views import BookViewSet
 
 
 # Create your tests here.
 class BookLoverViewSetByIdTestCase(TestCase):
     def setUp(self):
         self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='librarian', password='secret'))
         self.book_lover = BookLover.objects.create(
             first_name='John',
             last_name='Doe',
@@ -20,7 +62,7 @@ class BookLoverViewSetByIdTestCase(TestCase):
         )
 
     def test_get_book_lover(self):
-        response = self.client.get(f'/your-api-endpoint/{self.book_lover.pk}/')
+        response = self.client.get(f'/api/v1/booklovers/{self.book_lover.pk}/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
     def test_update_book_lover(self):
@@ -28,11 +70,1410 @@ class BookLoverViewSetByIdTestCase(TestCase):
             'first_name': 'Jane',
             'last_name': 'Smith'
         }
-        response = self.client.put(f'/your-api-endpoint/{self.book_lover.pk}/', updated_data, format='json')
+        response = self.client.put(f'/api/v1/booklovers/{self.book_lover.pk}/', updated_data, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(BookLover.objects.get(pk=self.book_lover.pk).first_name, updated_data['first_name'])
         self.assertEqual(BookLover.objects.get(pk=self.book_lover.pk).last_name, updated_data['last_name'])
 
     def test_delete_book_lover(self):
-        response = self.client.delete(f'/your-api-endpoint/{self.book_lover.pk}/')
+        response = self.client.delete(f'/api/v1/booklovers/{self.book_lover.pk}/')
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+
+class KeysetPaginationTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        birthdays = ['1990-01-01', '1985-05-05', None, '1990-01-01', '2000-12-31', None, '1985-05-05']
+        for i in range(21):
+            BookLover.objects.create(first_name=f'Reader {i}', last_name='Doe', birthday=birthdays[i % len(birthdays)])
+
+    def walk(self, url):
+        ids = []
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append(response.data)
+            ids.extend(item['id_book_lover'] for item in response.data['results'])
+            url = response.data['next']
+        return ids, pages
+
+    def test_forward_pages_follow_ordering_with_pk_tiebreaker(self):
+        for ordering in ('asc', 'desc'):
+            ids, pages = self.walk(f'/api/v1/booklovers/?cursor=&pagesize=4&ordering={ordering}')
+            with_birthday = BookLover.objects.filter(birthday__isnull=False)
+            if ordering == 'asc':
+                expected = list(with_birthday.order_by('birthday', 'pk').values_list('pk', flat=True))
+            else:
+                expected = list(with_birthday.order_by('-birthday', '-pk').values_list('pk', flat=True))
+            nulls = BookLover.objects.filter(birthday__isnull=True).order_by('pk' if ordering == 'asc' else '-pk')
+            expected += list(nulls.values_list('pk', flat=True))
+            self.assertEqual(ids, expected)
+            self.assertEqual(len(pages), 6)
+            self.assertIsNone(pages[0]['previous'])
+
+    def test_previous_link_returns_preceding_page(self):
+        _, pages = self.walk('/api/v1/booklovers/?cursor=&pagesize=4')
+        response = self.client.get(pages[3]['previous'])
+        self.assertEqual(response.data['results'], pages[2]['results'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/v1/booklovers/?cursor=garbage')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {'cursor': ['Invalid cursor']})
+
+
+class EagerLoadingTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        region = Region.objects.create(code='77', name='Moscow')
+        publisher = Publisher.objects.create(name='Publisher', region=region)
+        for i in range(30):
+            book = Book.objects.create(title=f'Book {i}', publisher=publisher, year_of_release=2000 + i)
+            for number in range(1, 4):
+                Volume.objects.create(book=book, volume_number=number, number_of_pages=100 * number)
+
+    def test_book_list_runs_constant_number_of_queries(self):
+        for page_size in (5, 30):
+            with self.assertNumQueries(3):
+                response = self.client.get(f'/api/v1/books/?page=1&pagesize={page_size}')
+            self.assertEqual(len(response.data), page_size)
+            self.assertEqual(len(response.data[0]['volumes']), 3)
+
+    def test_book_retrieve_prefetches_volumes(self):
+        book = Book.objects.first()
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/v1/books/{book.pk}/')
+        self.assertEqual([v['volume_number'] for v in response.data['volumes']], [1, 2, 3])
+
+
+class BookBulkCreateTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='loader', password='secret'))
+        region = Region.objects.create(code='50', name='Moscow Oblast')
+        self.publisher = Publisher.objects.create(name='Publisher', region=region)
+        self.payload = [
+            {'title': 'First', 'publisher': self.publisher.pk, 'year_of_release': 2001,
+             'volumes': [{'volume_number': 1, 'number_of_pages': 100}, {'volume_number': 2, 'number_of_pages': 150}]},
+            {'title': 'Broken', 'publisher': 9999, 'volumes': []},
+            {'title': 'Second', 'volumes': [{'volume_number': 1, 'number_of_pages': 300}]},
+        ]
+
+    def test_invalid_item_aborts_batch_by_default(self):
+        response = self.client.post('/api/v1/books/bulk/', self.payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([error['index'] for error in response.data['errors']], [1])
+        self.assertEqual(Book.objects.count(), 0)
+
+    def test_allow_partial_creates_valid_items(self):
+        response = self.client.post('/api/v1/books/bulk/?allow_partial=true', self.payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(Book.objects.count(), 2)
+        first = Book.objects.get(title='First')
+        self.assertEqual(first.publisher, self.publisher)
+        self.assertEqual(sorted(first.volumes.values_list('number_of_pages', flat=True)), [100, 150])
+        self.assertEqual(Volume.objects.count(), 3)
+
+    def test_list_post_to_books_is_bulk(self):
+        response = self.client.post('/api/v1/books/', [self.payload[0], self.payload[2]], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data['ids']), 2)
+
+    @override_settings(BOOK_BULK_MAX_SIZE=2)
+    def test_batch_size_is_limited_by_setting(self):
+        response = self.client.post('/api/v1/books/bulk/', self.payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {'error': 'No more than 2 books per request'})
+
+
+class BookLoverImportTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='importer', password='secret'))
+        BookLover.objects.create(first_name='John', last_name='Doe', birthday='1990-01-01', phone='1')
+
+    def test_csv_import_upserts_on_natural_key(self):
+        content = (
+            'first_name,last_name,birthday,phone\n'
+            'John,Doe,1990-01-01,2\n'
+            'Jane,Roe,1991-02-02,3\n'
+            'Bad,Date,not-a-date,4\n'
+        ).encode('utf-8')
+        upload = SimpleUploadedFile('members.csv', content, content_type='text/csv')
+        response = self.client.post('/api/v1/booklovers/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['inserted'], response.data['updated'], response.data['rejected']), (1, 1, 1))
+        self.assertEqual(response.data['rejected_lines'][0]['line'], 4)
+        self.assertEqual(BookLover.objects.get(first_name='John').phone, '2')
+        self.assertEqual(BookLover.objects.count(), 2)
+
+    def test_ndjson_import(self):
+        content = (b'{"first_name": "Ann", "last_name": "Lee", "birthday": "1985-05-05"}\n\n{broken\n'
+                   b'{"first_name": "John", "last_name": "Doe", "birthday": "1990-01-01", "address": "Street"}\n')
+        upload = SimpleUploadedFile('members.ndjson', content)
+        response = self.client.post('/api/v1/booklovers/import/', {'file': upload}, format='multipart')
+        self.assertEqual((response.data['inserted'], response.data['updated']), (1, 1))
+        self.assertEqual(response.data['rejected_lines'][0]['line'], 3)
+        self.assertEqual(BookLover.objects.get(first_name='John').address, 'Street')
+
+    def post_csv(self, content, key=None):
+        upload = SimpleUploadedFile('members.csv', content.encode('utf-8'), content_type='text/csv')
+        url = '/api/v1/booklovers/import/' + (f'?key={key}' if key else '')
+        return self.client.post(url, {'file': upload}, format='multipart')
+
+    def test_upsert_writes_only_given_fields_and_counts_key_only_rows_as_unchanged(self):
+        version = BookLover.objects.get(first_name='John').version
+        response = self.post_csv('first_name,last_name,birthday,address\n'
+                                 'John,Doe,1990-01-01,Street\n'
+                                 'John,Doe,1990-01-01,\n'
+                                 'Ann,Lee,,Avenue\n')
+        self.assertEqual((response.data['inserted'], response.data['updated'], response.data['unchanged']), (0, 1, 0))
+        self.assertEqual(response.data['rejected_lines'],
+                         [{'line': 4, 'errors': {'birthday': ['Required by the import key']}}])
+        john = BookLover.objects.get(first_name='John')
+        self.assertEqual((john.phone, john.address, john.version), ('1', 'Street', version + 1))
+
+        response = self.post_csv('first_name,last_name,birthday\nJohn,Doe,1990-01-01\n')
+        self.assertEqual((response.data['inserted'], response.data['updated'], response.data['unchanged']), (0, 0, 1))
+        self.assertEqual(BookLover.objects.get(first_name='John').version, version + 1)
+
+    def test_row_inserted_concurrently_is_updated_not_duplicated(self):
+        # Другой импорт вставил строку между выборкой существующих и записью
+        with mock.patch('first_lab.importers.BookLoverImporter.get_existing', return_value={}):
+            self.post_csv('first_name,last_name,birthday,phone\nJohn,Doe,1990-01-01,5\n')
+        self.assertEqual(list(BookLover.objects.values_list('phone', flat=True)), ['5'])
+
+    def test_key_must_be_a_unique_constraint(self):
+        response = self.post_csv('first_name,phone\nJohn,1\n', key='first_name')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(IMPORT_REJECTED_LINES_LIMIT=2)
+    def test_rejected_lines_are_capped(self):
+        response = self.post_csv('first_name,last_name,birthday\n' + 'Bad,Date,not-a-date\n' * 5)
+        self.assertEqual(response.data['rejected'], 5)
+        self.assertEqual([row['line'] for row in response.data['rejected_lines']], [2, 3])
+
+
+class ExportTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        for i in range(5):
+            BookLover.objects.create(first_name='John' if i % 2 else 'Jane', last_name=f'Doe {i}',
+                                     birthday=f'199{i}-01-01')
+        region = Region.objects.create(code='78', name='Saint Petersburg')
+        publisher = Publisher.objects.create(name='Publisher', region=region)
+        book = Book.objects.create(title='Book', publisher=publisher, year_of_release=2010)
+        Volume.objects.create(book=book, volume_number=1, number_of_pages=120)
+
+    def test_ndjson_export_honors_filters_and_ordering(self):
+        response = self.client.get('/api/v1/booklovers/?format=ndjson&first_name=Jane&ordering=desc')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['birthday'] for row in rows], ['1994-01-01', '1992-01-01', '1990-01-01'])
+
+    def test_csv_export_nests_volumes_as_json(self):
+        response = self.client.get('/api/v1/books/?format=csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['title'], 'Book')
+        self.assertEqual(json.loads(rows[0]['volumes'])[0]['number_of_pages'], 120)
+
+
+class ListResponseCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.region = Region.objects.create(code='01', name='Adygea')
+        Publisher.objects.create(name='Publisher', region=self.region)
+
+    def test_cache_hit_skips_database(self):
+        first = self.client.get('/api/v1/regions/?ordering=asc')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/v1/regions/?ordering=asc')
+        self.assertEqual(first.data, second.data)
+
+    def test_write_invalidates_cached_pages(self):
+        self.client.get('/api/v1/regions/')
+        self.client.post('/api/v1/regions/', {'code': '02', 'name': 'Bashkortostan'}, format='json')
+        response = self.client.get('/api/v1/regions/')
+        self.assertEqual(len(response.data), 2)
+
+    def test_region_delete_invalidates_publishers(self):
+        self.assertEqual(len(self.client.get('/api/v1/publishers/').data), 1)
+        self.client.force_authenticate(User.objects.create_user(username='admin', password='secret'))
+        self.client.delete(f'/api/v1/regions/{self.region.pk}/')
+        self.assertEqual(len(self.client.get('/api/v1/publishers/').data), 0)
+
+
+class ConditionalRequestTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='editor', password='secret'))
+        self.book = Book.objects.create(title='Book', year_of_release=2000)
+        Volume.objects.create(book=self.book, volume_number=1, number_of_pages=10)
+        self.url = f'/api/v1/books/{self.book.pk}/'
+
+    def test_if_none_match_returns_304_from_version_only(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_if_match_rejects_stale_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        payload = {'title': 'New title', 'volumes': [{'volume_number': 1, 'number_of_pages': 20}]}
+        response = self.client.put(self.url, payload, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['volumes'][0]['number_of_pages'], 20)
+
+        response = self.client.put(self.url, payload, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+
+class BookSearchTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        for title in ('War and Peace', 'Peaceful Warrior', 'Anna Karenina', 'Peace Talks Peace'):
+            Book.objects.create(title=title)
+
+    def titles(self, query):
+        response = self.client.get(f'/api/v1/books/?search={query}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [book['title'] for book in response.data]
+
+    def test_search_matches_substrings_and_ranks(self):
+        self.assertEqual(set(self.titles('peace')), {'War and Peace', 'Peaceful Warrior', 'Peace Talks Peace'})
+        self.assertEqual(self.titles('peace')[0], 'Peace Talks Peace')
+        self.assertEqual(self.titles('karen'), ['Anna Karenina'])
+
+    def test_short_words_still_filter_with_long_ones(self):
+        Book.objects.create(title='Book 1')
+        Book.objects.create(title='Book 12')
+        self.assertEqual(self.titles('Book 12'), ['Book 12'])
+        self.assertEqual(set(self.titles('book 1')), {'Book 1', 'Book 12'})
+        self.assertEqual(self.titles('war an'), ['War and Peace'])
+
+    def test_cursor_needs_an_explicit_order(self):
+        response = self.client.get('/api/v1/books/?search=peace&cursor=')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('cursor', response.data)
+
+        response = self.client.get('/api/v1/books/?search=peace&pagination=cursor&ordering=desc')
+        self.assertEqual([book['title'] for book in response.data['results']],
+                         ['Peace Talks Peace', 'Peaceful Warrior', 'War and Peace'])
+
+    def test_index_follows_title_updates(self):
+        book = Book.objects.get(title='Anna Karenina')
+        book.title = 'Resurrection'
+        book.save()
+        self.assertEqual(self.titles('karen'), [])
+        self.assertEqual(self.titles('resurrect'), ['Resurrection'])
+
+
+@skipUnless(connection.vendor == 'postgresql',
+            'Needs PostgreSQL: the SQLite planner does not cost sequential scans, so it can not reveal a missing index')
+class QueryPlanTestCase(TestCase):
+    """
+    Seeds a large dataset, runs ANALYZE and EXPLAIN (FORMAT JSON) on every query
+    issued by the list endpoints, and fails if any plan has a Seq Scan node.
+    """
+    rows = int(os.environ.get('QUERY_PLAN_ROWS', 100000))
+    batch_size = 5000
+
+    @classmethod
+    def setUpTestData(cls):
+        # Областей тоже много: крошечную таблицу планировщик законно читает целиком
+        regions = Region.objects.bulk_create([Region(code=f'{i:05}', name=f'Region {i}')
+                                              for i in range(max(cls.rows // 100, 1))], batch_size=cls.batch_size)
+        publishers = Publisher.objects.bulk_create([
+            Publisher(name=f'Publisher {i}', region=regions[i % len(regions)]) for i in range(max(cls.rows // 10, 1))
+        ], batch_size=cls.batch_size)
+        books = Book.objects.bulk_create([
+            Book(title=f'Book {i}', publisher=publishers[i % len(publishers)], year_of_release=1900 + i % 120)
+            for i in range(cls.rows)
+        ], batch_size=cls.batch_size)
+        Volume.objects.bulk_create([Volume(book=book, volume_number=1, number_of_pages=100) for book in books],
+                                   batch_size=cls.batch_size)
+        BookLover.objects.bulk_create([
+            BookLover(first_name=f'Name {i % 300}', last_name=f'Last {i}',
+                      birthday=None if i % 10 == 0 else date(1950, 1, 1) + timedelta(days=i % 20000),
+                      date_of_joining=date(2000, 1, 1) + timedelta(days=i % 3000))
+            for i in range(cls.rows)
+        ], batch_size=cls.batch_size)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    @staticmethod
+    def explain(sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+            plan = cursor.fetchone()[0]
+        return json.loads(plan) if isinstance(plan, str) else plan
+
+    @classmethod
+    def get_sequential_scans(cls, node):
+        scans = [node['Relation Name']] if node.get('Node Type') == 'Seq Scan' else []
+        for child in node.get('Plans', ()):
+            scans.extend(cls.get_sequential_scans(child))
+        return scans
+
+    def assert_index_only_plans(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        selects = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('SELECT')]
+        self.assertTrue(selects)
+        for sql in selects:
+            plan = self.explain(sql)
+            scans = self.get_sequential_scans(plan[0]['Plan'])
+            self.assertEqual(scans, [], f'{url}\n{sql}\n{json.dumps(plan, indent=2)}')
+        return response
+
+    def assert_deep_page_uses_indexes(self, url):
+        response = self.client.get(url)
+        for _ in range(3):
+            response = self.client.get(response.data['next'])
+        self.assert_index_only_plans(response.data['next'])
+
+    def test_booklovers(self):
+        self.assert_index_only_plans('/api/v1/booklovers/?cursor=&first_name=Name 7')
+        self.assert_index_only_plans('/api/v1/booklovers/?cursor=&birthday=1950-01-08')
+        self.assert_index_only_plans('/api/v1/booklovers/?cursor=&date_of_joining=2000-01-08')
+        self.assert_index_only_plans('/api/v1/booklovers/?cursor=&ordering=desc')
+        self.assert_deep_page_uses_indexes('/api/v1/booklovers/?cursor=&ordering=asc')
+
+    def test_publishers(self):
+        self.assert_index_only_plans('/api/v1/publishers/?cursor=&name=Publisher 7')
+        self.assert_index_only_plans('/api/v1/publishers/?cursor=&ordering=asc')
+        self.assert_deep_page_uses_indexes('/api/v1/publishers/?cursor=&ordering=desc')
+        self.assert_deep_page_uses_indexes('/api/v1/publishers/?cursor=&sort=-book_count')
+
+    def test_books(self):
+        self.assert_index_only_plans('/api/v1/books/?cursor=&title=Book 7')
+        self.assert_index_only_plans('/api/v1/books/?cursor=&year=1907&ordering=desc')
+        self.assert_deep_page_uses_indexes('/api/v1/books/?cursor=&ordering=asc')
+        self.assert_deep_page_uses_indexes('/api/v1/books/?cursor=&sort=-total_pages')
+        self.assert_index_only_plans('/api/v1/books/?cursor=&sort=volume_count')
+
+    def test_regions(self):
+        self.assert_index_only_plans('/api/v1/regions/?cursor=&name=Region 7')
+        self.assert_index_only_plans('/api/v1/regions/?cursor=&ordering=asc')
+        self.assert_deep_page_uses_indexes('/api/v1/regions/?cursor=&ordering=desc')
+
+
+class AsyncReadViewTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        region = Region.objects.create(code='47', name='Leningrad Oblast')
+        publisher = Publisher.objects.create(name='Lenizdat', region=region)
+        for i in range(12):
+            BookLover.objects.create(first_name='Anna', last_name=f'Petrova {i}',
+                                     birthday=date(1990, 1, 1) + timedelta(days=i))
+            book = Book.objects.create(title=f'Chronicle {i}', publisher=publisher, year_of_release=2000 + i % 3)
+            Volume.objects.create(book=book, volume_number=1, number_of_pages=100 + i)
+        self.book = book
+
+    async def get_both(self, url, **extra):
+        expected = await sync_to_async(self.client.get)(url, **extra)
+        await cache.aclear()
+        with override_settings(ROOT_URLCONF='Network.asgi_urls'):
+            response = await self.async_client.get(url, **extra)
+        return expected, response
+
+    async def test_lists_match_sync_views(self):
+        urls = [
+            '/api/v1/regions/',
+            '/api/v1/booklovers/?ordering=desc&page=2&pagesize=5',
+            '/api/v1/booklovers/?page_size=4&first_name=Anna',
+            '/api/v1/publishers/?name=Lenizdat',
+            '/api/v1/books/?year=2001&ordering=desc',
+            '/api/v1/books/?search=chronicle&pagesize=3&page=1',
+            '/api/v1/books/?pagination=cursor&pagesize=5',
+            '/api/v1/books/?fields=id_book,title,total_pages&sort=-total_pages',
+            '/api/v1/booklovers/?cursor=&pagesize=5&exclude=address,phone',
+            '/api/v1/books/?expand=publisher.region&pagesize=4',
+            '/api/v1/publishers/?pagination=cursor&expand=region',
+        ]
+        for url in urls:
+            expected, response = await self.get_both(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, url)
+            self.assertEqual(response.json(), expected.json(), url)
+
+    async def test_out_of_range_page_is_404(self):
+        expected, response = await self.get_both('/api/v1/books/?page=5')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.json(), expected.json())
+
+    async def test_detail_sets_etag_and_answers_if_none_match(self):
+        url = f'/api/v1/books/{self.book.pk}/'
+        expected, response = await self.get_both(url)
+        self.assertEqual(response.json(), expected.json())
+        self.assertEqual(response['ETag'], expected['ETag'])
+        with override_settings(ROOT_URLCONF='Network.asgi_urls'):
+            response = await self.async_client.get(url, headers={'If-None-Match': expected['ETag']})
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            response = await self.async_client.get('/api/v1/books/0/')
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_writes_and_protected_reads_are_delegated(self):
+        region = await Region.objects.afirst()
+        with override_settings(ROOT_URLCONF='Network.asgi_urls'):
+            response = await self.async_client.get(f'/api/v1/regions/{region.pk}/')
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+            response = await self.async_client.post('/api/v1/regions/', {'code': '10', 'name': 'Karelia'},
+                                                    content_type='application/json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            response = await self.async_client.get('/api/v1/regions/?ordering=asc')
+        self.assertEqual([row['code'] for row in response.json()], ['10', '47'])
+
+    async def test_anonymous_reads_get_the_sync_status(self):
+        urls = ['/api/v1/regions/', f'/api/v1/regions/{self.book.publisher.region_id}/', '/api/v1/booklovers/',
+                f'/api/v1/booklovers/{await BookLover.objects.values_list("pk", flat=True).afirst()}/',
+                '/api/v1/publishers/', f'/api/v1/publishers/{self.book.publisher_id}/',
+                '/api/v1/books/', f'/api/v1/books/{self.book.pk}/']
+        for url in urls:
+            expected, response = await self.get_both(url)
+            self.assertEqual(response.status_code, expected.status_code, url)
+
+        # Закрытая чтением view закрыта и в async-варианте
+        with mock.patch.object(BookViewSet, 'permission_classes', [IsAuthenticated]):
+            for url in ('/api/v1/books/', f'/api/v1/books/{self.book.pk}/'):
+                expected, response = await self.get_both(url)
+                self.assertEqual((expected.status_code, response.status_code),
+                                 (status.HTTP_401_UNAUTHORIZED, status.HTTP_401_UNAUTHORIZED), url)
+
+    async def test_instance_serializer_runs_off_the_event_loop(self):
+        # Без FAST_SERIALIZATION строки - экземпляры модели, DRF может дочитывать отложенные поля
+        rows = [book async for book in Book.objects.only('pk').order_by('pk')[:2]]
+        data = await InstanceSerializer(BookSerializer, ['title', 'volumes']).aserialize(rows)
+        self.assertEqual([book['title'] for book in data], ['Chronicle 0', 'Chronicle 1'])
+        self.assertEqual(data[0]['volumes'][0]['number_of_pages'], 100)
+
+        with override_settings(FAST_SERIALIZATION=False):
+            expected, response = await self.get_both('/api/v1/books/?pagination=cursor&pagesize=4')
+        self.assertEqual(response.json(), expected.json())
+
+
+class CoverThumbnailTestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, THUMBNAIL_WORKERS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='editor', password='secret'))
+        self.book = Book.objects.create(title='Book', year_of_release=2000)
+        Volume.objects.create(book=self.book, volume_number=1, number_of_pages=10)
+
+    @staticmethod
+    def make_cover(name='cover.png', size=(1200, 1800)):
+        buffer = io.BytesIO()
+        Image.effect_noise(size, 64).convert('RGB').save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def upload(self, cover):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.put(f'/api/v1/books/{self.book.pk}/cover/', {'cover_photo': cover},
+                                   format='multipart')
+
+    def test_upload_builds_smaller_thumbnails(self):
+        cover = self.make_cover()
+        response = self.upload(cover)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertIsNone(response.data['cover_thumbnails'])
+
+        thumbnails = self.client.get('/api/v1/books/').data[0]['cover_thumbnails']
+        self.assertEqual(set(thumbnails), {'small', 'medium', 'large'})
+        book = Book.objects.get(pk=self.book.pk)
+        for size, bounds in (('small', (160, 240)), ('large', (640, 960))):
+            with Image.open(os.path.join(self.media_root, book.cover_thumbnails[size]['webp'])) as image:
+                self.assertEqual(image.format, 'WEBP')
+                self.assertLessEqual(image.size, bounds)
+        small = os.path.getsize(os.path.join(self.media_root, book.cover_thumbnails['small']['jpeg']))
+        self.assertLess(small * 10, cover.size)
+
+    def test_rejects_non_image_and_replaced_cover_discards_stale_thumbnails(self):
+        response = self.upload(SimpleUploadedFile('cover.txt', b'text'))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        from first_lab.thumbnails import generate_thumbnails
+        self.upload(self.make_cover(size=(300, 300)))
+        old_name = Book.objects.get(pk=self.book.pk).cover_photo.name
+        self.upload(self.make_cover(size=(300, 300)))
+        self.assertIsNone(generate_thumbnails(self.book.pk, old_name))
+        self.assertIsNotNone(Book.objects.get(pk=self.book.pk).cover_thumbnails)
+
+    def test_book_serializer_leaves_decoding_to_the_pool(self):
+        with mock.patch('PIL.Image.open', side_effect=AssertionError('decoded on the request thread')):
+            serializer = BookSerializer(self.book, data={'cover_photo': self.make_cover(size=(300, 300))},
+                                        partial=True)
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+        with self.captureOnCommitCallbacks(execute=True):
+            serializer.save()
+        self.assertIsNotNone(Book.objects.get(pk=self.book.pk).cover_thumbnails)
+
+        serializer = BookSerializer(self.book, data={'cover_photo': SimpleUploadedFile('cover.txt', b'text')},
+                                    partial=True)
+        self.assertFalse(serializer.is_valid())
+        with override_settings(COVER_UPLOAD_MAX_SIZE=10):
+            self.assertEqual(self.upload(self.make_cover(size=(30, 30))).status_code, status.HTTP_400_BAD_REQUEST)
+            serializer = BookSerializer(self.book, data={'cover_photo': self.make_cover(size=(30, 30))}, partial=True)
+            self.assertFalse(serializer.is_valid())
+
+    def test_replaced_cover_deletes_old_thumbnail_files(self):
+        self.upload(self.make_cover(size=(300, 300)))
+        old_paths = [os.path.join(self.media_root, name)
+                     for names in Book.objects.get(pk=self.book.pk).cover_thumbnails.values()
+                     for name in names.values()]
+        self.assertTrue(all(os.path.exists(path) for path in old_paths))
+
+        self.upload(self.make_cover(size=(300, 300)))
+        self.assertFalse(any(os.path.exists(path) for path in old_paths))
+        for names in Book.objects.get(pk=self.book.pk).cover_thumbnails.values():
+            for name in names.values():
+                self.assertTrue(os.path.exists(os.path.join(self.media_root, name)))
+
+
+class CoverUploadTestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.upload_dir = tempfile.mkdtemp()
+        for directory in (self.media_root, self.upload_dir):
+            self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, COVER_UPLOAD_DIR=self.upload_dir,
+                                              THUMBNAIL_WORKERS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='editor', password='secret'))
+        self.book = Book.objects.create(title='Book', year_of_release=2000)
+        buffer = io.BytesIO()
+        Image.effect_noise((400, 600), 64).convert('RGB').save(buffer, 'PNG')
+        self.content = buffer.getvalue()
+        response = self.client.post(f'/api/v1/books/{self.book.pk}/cover/uploads/', {
+            'filename': 'cover.png',
+            'size': len(self.content),
+            'checksum': hashlib.sha256(self.content).hexdigest(),
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.url = f'/api/v1/books/{self.book.pk}/cover/uploads/{response.data["id_upload"]}/'
+
+    def put_chunk(self, start, end, checksum=None):
+        chunk = self.content[start:end + 1]
+        return self.client.generic('PUT', self.url, chunk, content_type='application/octet-stream',
+                                   HTTP_CONTENT_RANGE=f'bytes {start}-{end}/{len(self.content)}',
+                                   HTTP_X_CHUNK_SHA256=checksum or hashlib.sha256(chunk).hexdigest())
+
+    def test_chunks_resume_and_finalize_attaches_cover(self):
+        middle = len(self.content) // 2
+        self.assertEqual(self.put_chunk(0, middle - 1).data['offset'], middle)
+        self.assertEqual(self.put_chunk(middle, len(self.content) - 1, checksum='0' * 64).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post(self.url + 'finalize/').status_code, status.HTTP_409_CONFLICT)
+
+        self.assertEqual(self.client.get(self.url).data['offset'], middle)
+        self.assertEqual(self.put_chunk(middle + 10, len(self.content) - 1).status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(self.put_chunk(middle - 10, len(self.content) - 1).data['offset'], len(self.content))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url + 'finalize/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        book = Book.objects.get(pk=self.book.pk)
+        with book.cover_photo.open('rb') as cover:
+            self.assertEqual(cover.read(), self.content)
+        self.assertIsNotNone(book.cover_thumbnails)
+        self.assertEqual(os.listdir(self.upload_dir), [])
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_chunk_is_received_outside_a_transaction(self):
+        atomic_depth = len(connection.atomic_blocks)
+        depths = []
+
+        def write_chunk(*args):
+            depths.append(len(connection.atomic_blocks))
+            return uploads.write_chunk(*args)
+
+        with mock.patch('first_lab.views.write_chunk', write_chunk):
+            self.assertEqual(self.put_chunk(0, 99).data['offset'], 100)
+        self.assertEqual(depths, [atomic_depth])
+
+    def test_offset_is_checked_again_under_the_lock(self):
+
+        def write_chunk(upload, *args):
+            uploads.write_chunk(upload, *args)
+            # Пока фрагмент принимался, другой запрос откатил сессию
+            CoverUpload.objects.filter(pk=upload.pk).update(offset=0)
+
+        self.put_chunk(0, 99)
+        with mock.patch('first_lab.views.write_chunk', write_chunk):
+            response = self.put_chunk(100, 199)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['offset'], 0)
+
+    def test_failed_finalize_keeps_the_session_and_no_cover(self):
+        self.put_chunk(0, len(self.content) - 1)
+        with mock.patch('first_lab.views.discard', side_effect=RuntimeError('database went away')):
+            with self.assertRaises(RuntimeError):
+                self.client.post(self.url + 'finalize/')
+
+        self.assertEqual(self.client.get(self.url).data['offset'], len(self.content))
+        self.assertEqual(len(os.listdir(self.upload_dir)), 1)
+        self.assertFalse(Book.objects.get(pk=self.book.pk).cover_photo)
+        covers = os.path.join(self.media_root, 'book_covers')
+        self.assertEqual(os.listdir(covers) if os.path.isdir(covers) else [], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post(self.url + 'finalize/').status_code, status.HTTP_200_OK)
+        self.assertEqual(os.listdir(self.upload_dir), [])
+
+    def test_sessions_are_private_to_their_owner(self):
+        self.client.force_authenticate(User.objects.create_user(username='other', password='secret'))
+        self.assertEqual(self.put_chunk(0, 9).status_code, status.HTTP_404_NOT_FOUND)
+
+
+class CachedBasicAuthenticationTestCase(TestCase):
+    def setUp(self):
+        credential_cache.clear()
+        self.client = APIClient()
+        User.objects.create_user(username='partner', password='old-secret')
+        self.url = f'/api/v1/regions/{Region.objects.create(code="66", name="Sverdlovsk").pk}/'
+
+    @staticmethod
+    def basic(password, username='partner'):
+        return 'Basic ' + base64.b64encode(f'{username}:{password}'.encode()).decode()
+
+    def get(self, password):
+        return self.client.get(self.url, HTTP_AUTHORIZATION=self.basic(password))
+
+    def test_verified_credentials_skip_password_check(self):
+        with mock.patch.object(PooledModelBackend, 'authenticate', autospec=True,
+                               side_effect=PooledModelBackend.authenticate) as authenticate:
+            for _ in range(3):
+                self.assertEqual(self.get('old-secret').status_code, status.HTTP_200_OK)
+            self.assertEqual(self.get('wrong').status_code, status.HTTP_401_UNAUTHORIZED)
+            self.assertEqual(self.get('wrong').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(authenticate.call_count, 3)
+
+    def test_password_change_invalidates_cache(self):
+        self.assertEqual(self.get('old-secret').status_code, status.HTTP_200_OK)
+        response = self.client.post('/api/v1/auth/changepassword/',
+                                    {'old_password': 'old-secret', 'new_password': 'new-secret'},
+                                    format='json', HTTP_AUTHORIZATION=self.basic('old-secret'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.get('old-secret').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.get('new-secret').status_code, status.HTTP_200_OK)
+
+        # Пароль, смененный в обход API, тоже не пускает по записи из кэша
+        user = User.objects.get(username='partner')
+        user.set_password('third-secret')
+        user.save()
+        self.assertEqual(self.get('new-secret').status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class HashingExecutorTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        User.objects.create_user(username='reader', password='secret-1')
+
+    def test_auth_endpoints_hash_on_the_pool(self):
+        response = self.client.post('/api/v1/auth/register/', {'username': 'writer', 'password': 'secret-2'},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(User.objects.get(username='writer').check_password('secret-2'))
+        response = self.client.post('/api/v1/auth/login/', {'username': 'writer', 'password': 'secret-2'},
+                                    format='json')
+        self.assertIn('access', response.data)
+        response = self.client.post('/api/v1/auth/login/', {'username': 'nobody', 'password': 'secret-2'},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        metrics = self.client.get('/api/v1/metrics/').content.decode()
+        self.assertRegex(metrics, r'network_hashing_seconds_count\{operation="check"\} [1-9]')
+        self.assertRegex(metrics, r'network_hashing_seconds_count\{operation="make"\} [1-9]')
+        self.assertIn('network_hashing_queue_depth 0', metrics)
+
+    @override_settings(HASHING_QUEUE_LIMIT=0, HASHING_RETRY_AFTER=2)
+    def test_full_queue_returns_503(self):
+        response = self.client.post('/api/v1/auth/login/', {'username': 'reader', 'password': 'secret-1'},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '2')
+        self.client.force_authenticate(User.objects.get(username='reader'))
+        response = self.client.post('/api/v1/auth/changepassword/',
+                                    {'old_password': 'secret-1', 'new_password': 'secret-3'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertTrue(User.objects.get(username='reader').check_password('secret-1'))
+
+    def test_login_goes_through_backends_and_signals(self):
+        logged_in, failed = [], []
+        user_logged_in.connect(lambda user, **kwargs: logged_in.append(user.username), weak=False,
+                               dispatch_uid='test-logged-in')
+        user_login_failed.connect(lambda credentials, **kwargs: failed.append(credentials['username']),
+                                  weak=False, dispatch_uid='test-login-failed')
+        self.addCleanup(user_logged_in.disconnect, dispatch_uid='test-logged-in')
+        self.addCleanup(user_login_failed.disconnect, dispatch_uid='test-login-failed')
+
+        response = self.client.post('/api/v1/auth/login/', {'username': 'reader', 'password': 'secret-1'},
+                                    format='json')
+        self.assertIn('access', response.data)
+        response = self.client.post('/api/v1/auth/login/', {'username': 'reader', 'password': 'wrong'},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual((logged_in, failed), (['reader'], ['reader']))
+        # Обработчик Django update_last_login срабатывает на тот же сигнал
+        self.assertIsNotNone(User.objects.get(username='reader').last_login)
+
+    @override_settings(HASHING_QUEUE_LIMIT=0, HASHING_RETRY_AFTER=2)
+    def test_full_queue_fails_basic_authentication_with_503(self):
+        credential_cache.clear()
+        credentials = base64.b64encode(b'reader:secret-1').decode()
+        response = self.client.get('/api/v1/regions/', HTTP_AUTHORIZATION=f'Basic {credentials}')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '2')
+
+    @override_settings(HASHING_QUEUE_LIMIT=0, HASHING_RETRY_AFTER=2)
+    def test_full_queue_fails_admin_login_with_503(self):
+        response = self.client.post('/admin/login/', {'username': 'reader', 'password': 'secret-1'})
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '2')
+
+
+class DatabaseMetricsTestCase(TestCase):
+    class FakePool:
+        @staticmethod
+        def get_stats():
+            return {'pool_size': 4, 'pool_available': 1, 'requests_waiting': 2, 'requests_wait_ms': 1500}
+
+    def test_pool_stats_and_connects_are_exported(self):
+        connection._connection_pools = {connection.alias: self.FakePool()}
+        self.addCleanup(delattr, connection, '_connection_pools')
+        connection_created.send(sender=type(connection), connection=connection)
+
+        metrics = APIClient().get('/api/v1/metrics/').content.decode()
+        self.assertIn('network_db_pool_size{alias="default"} 4', metrics)
+        self.assertIn('network_db_pool_requests_waiting{alias="default"} 2', metrics)
+        self.assertIn('network_db_pool_wait_seconds_total{alias="default"} 1.5', metrics)
+        self.assertRegex(metrics, r'network_db_connects_total\{alias="default"\} [1-9]')
+
+
+@override_settings(REPLICA_DATABASES=['replica1'], REPLICA_STICKINESS_SECONDS=5)
+class ReplicaRoutingTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user(username='editor', password='secret')
+
+    @staticmethod
+    def route(request, status_code=200):
+        seen = {}
+
+        def get_response(request):
+            seen['book'] = router.db_for_read(Book)
+            seen['user'] = router.db_for_read(User)
+            return HttpResponse(status=status_code)
+
+        response = ReplicaRoutingMiddleware(get_response)(request)
+        return seen, response
+
+    def test_reads_of_get_requests_go_to_replicas(self):
+        seen, _ = self.route(self.factory.get('/api/v1/books/'))
+        self.assertEqual(seen, {'book': 'replica1', 'user': 'default'})
+        seen, _ = self.route(self.factory.post('/api/v1/books/'))
+        self.assertEqual(seen['book'], 'default')
+        self.assertEqual(router.db_for_read(Book), 'default')
+
+    def test_successful_write_makes_client_sticky(self):
+        request = self.factory.put('/api/v1/books/1/')
+        request.user = self.user
+        _, response = self.route(request)
+        self.assertEqual(response.cookies['primary_sticky']['max-age'], 5)
+
+        # Клиент без cookie (например, с Basic-авторизацией) прилипает по пользователю
+        request = self.factory.get('/api/v1/books/')
+        request.user = self.user
+        self.assertEqual(self.route(request)[0]['book'], 'default')
+        request = self.factory.get('/api/v1/books/')
+        request.COOKIES['primary_sticky'] = '1'
+        self.assertEqual(self.route(request)[0]['book'], 'default')
+
+        request = self.factory.put('/api/v1/books/1/')
+        self.assertNotIn('primary_sticky', self.route(request, status_code=400)[1].cookies)
+
+    def test_list_cache_skips_writes_while_replicas_catch_up(self):
+        from first_lab.cache import region_list_cache
+        region_list_cache.invalidate()
+        request = self.factory.get('/api/v1/regions/')
+        key = region_list_cache.get_key(request)
+        region_list_cache.set(key, ['stale'])
+        self.assertIsNone(region_list_cache.get(key))
+
+    def test_batch_post_reads_without_making_client_sticky(self):
+        seen = {}
+
+        def get_response(request):
+            mark_read_only()
+            seen['book'] = router.db_for_read(Book)
+            return HttpResponse()
+
+        request = self.factory.post('/api/v1/books/batch/')
+        request.user = self.user
+        response = ReplicaRoutingMiddleware(get_response)(request)
+        self.assertEqual(seen['book'], 'replica1')
+        self.assertNotIn('primary_sticky', response.cookies)
+        self.assertIsNone(cache.get(get_sticky_key(self.user.pk)))
+
+        # Настоящая view помечает запрос сама; реплик нет, чтобы чтение прошло по тестовой базе
+        region = Region.objects.create(code='77', name='Moscow')
+        book = Book.objects.create(title='Batch', publisher=Publisher.objects.create(name='P', region=region))
+        with self.settings(REPLICA_DATABASES=[]):
+            response = self.client.post('/api/v1/books/batch/', {'ids': [book.pk]}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('primary_sticky', response.cookies)
+
+
+class RequestMetricsTestCase(TestCase):
+    def setUp(self):
+        Region.objects.create(code='N', name='North')
+
+    def test_requests_are_recorded_per_route_and_status(self):
+        client = APIClient()
+        status_code = client.get('/api/v1/regions/').status_code
+        client.get('/api/v1/no-such-route/')
+
+        metrics = client.get('/api/v1/metrics/').content.decode()
+        labels = f'{{route="regions",method="GET",status="{status_code}"}}'
+        self.assertRegex(metrics, re.escape(f'network_request_duration_seconds_count{labels} ') + r'[1-9]')
+        self.assertRegex(metrics, re.escape(f'network_request_db_queries_sum{labels} ') + r'[1-9]')
+        self.assertIn(f'network_request_db_seconds_count{labels}', metrics)
+        self.assertIn('network_request_duration_seconds_count{route="unmatched",method="GET",status="404"}', metrics)
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.5'], METRICS_TOKEN='scrape-token')
+    def test_metrics_need_an_allowed_address_or_the_token(self):
+        client = APIClient()
+        self.assertEqual(client.get('/api/v1/metrics/').status_code, status.HTTP_403_FORBIDDEN)
+        response = client.get('/api/v1/metrics/', HTTP_AUTHORIZATION='Bearer wrong-token')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = client.get('/api/v1/metrics/', HTTP_AUTHORIZATION='Bearer scrape-token')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(client.get('/api/v1/metrics/', REMOTE_ADDR='10.0.0.5').status_code, status.HTTP_200_OK)
+        with self.settings(METRICS_TOKEN=None):
+            response = client.get('/api/v1/metrics/', HTTP_AUTHORIZATION='Bearer ')
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_snapshots_of_other_processes_are_merged(self):
+        registry = Registry()
+        requests = Counter('test_requests_total', 'Requests', ['route'], registry=registry)
+        busy = Gauge('test_busy', 'Busy workers', registry=registry)
+        requests.inc(2, route='regions')
+        busy.set(1)
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        registry.flush(directory)
+        # Снимок текущего процесса выдаем за снимки живого и завершившегося воркеров
+        own = Registry.get_snapshot_path(directory, os.getpid())
+        shutil.copy(own, Registry.get_snapshot_path(directory, os.getppid()))
+        os.replace(own, Registry.get_snapshot_path(directory, 2 ** 22 + 1))
+
+        metrics = registry.render(directory)
+        self.assertIn('test_requests_total{route="regions"} 6', metrics)
+        self.assertIn('test_busy 2', metrics)
+
+
+class BenchmarkTestCase(TestCase):
+    def test_every_route_has_a_passing_scenario(self):
+        dataset = seed_dataset(1, regions=2, publishers=3, books=4, max_volumes=2, book_lovers=5)
+        self.assertEqual(dataset.sizes(), {'regions': 2, 'publishers': 3, 'books': 4, 'book_lovers': 5})
+        self.assertEqual(sorted(Book.objects.values_list('pk', flat=True)), dataset.book_ids)
+        scenarios = get_scenarios()
+        self.assertEqual({scenario.route for scenario in scenarios},
+                         {pattern.name for pattern in urls.urlpatterns if pattern.name})
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with override_settings(MEDIA_ROOT=directory, COVER_UPLOAD_DIR=directory, THUMBNAIL_WORKERS=0):
+            for scenario in scenarios:
+                result = run_scenario(scenario, scenario.prepare(dataset, 2))
+                self.assertEqual(result['errors'], 0, (scenario.name, result['statuses']))
+                self.assertEqual(result['requests'], 2)
+                self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+
+    def test_regressions_are_reported(self):
+        baseline = {'scenarios': {'GET book-list': {'throughput': 100, 'p95_ms': 10},
+                                  'GET regions': {'throughput': 100, 'p95_ms': 10}}}
+        current = {'scenarios': {'GET book-list': {'throughput': 95, 'p95_ms': 15},
+                                 'GET regions': {'throughput': 120, 'p95_ms': 9}}}
+        rows, regressions = compare_results(baseline, current, 0.1)
+        self.assertEqual(len(rows), 4)
+        self.assertEqual([(name, metric) for name, metric, *_ in regressions], [('GET book-list', 'p95_ms')])
+
+
+class BenchmarkServerTestCase(LiveServerTestCase):
+    def test_scenarios_run_over_http(self):
+        dataset = seed_dataset(1, regions=2, publishers=3, books=4, max_volumes=2, book_lovers=5)
+        for scenario in get_scenarios({'regions', 'book-detail', 'login'}):
+            # Потоки live-сервера делят одно соединение с SQLite в памяти, поэтому запись - по одному клиенту
+            concurrency = 2 if scenario.method == 'GET' else 1
+            result = run_scenario(scenario, scenario.prepare(dataset, 5), concurrency=concurrency, warmup=1,
+                                  url=self.live_server_url)
+            self.assertEqual(result['errors'], 0, (scenario.name, result['statuses']))
+            self.assertEqual(result['requests'], 4)
+
+    def test_unreachable_server_is_counted_as_errors(self):
+        dataset = seed_dataset(1, regions=2, publishers=3, books=4, max_volumes=2, book_lovers=5)
+        scenario = get_scenarios({'regions'})[0]
+        result = run_scenario(scenario, scenario.prepare(dataset, 2), url='http://127.0.0.1:9')
+        self.assertEqual(result['statuses'], {'0': 2})
+
+
+class SeedCatalogTestCase(TestCase):
+    def test_seeded_catalog_is_consistent(self):
+        Region.objects.create(code='R1', name='Existing')
+        call_command('seed_catalog', regions=3, publishers=5, books=30, book_lovers=12, max_volumes=3, chunk_size=7,
+                     stdout=io.StringIO())
+
+        self.assertEqual((Region.objects.count(), Publisher.objects.count(), Book.objects.count(),
+                          BookLover.objects.count()), (4, 5, 30, 12))
+        self.assertFalse(Publisher.objects.filter(region__code='R1').exists())
+        for book in Book.objects.prefetch_related('volumes'):
+            numbers = sorted(volume.volume_number for volume in book.volumes.all())
+            self.assertEqual(numbers, list(range(1, len(numbers) + 1)))
+            self.assertLessEqual(len(numbers), 3)
+        for lover in BookLover.objects.all():
+            self.assertGreater(lover.date_of_joining, lover.birthday)
+
+        # Последовательности сдвинуты за явно заданные ключи
+        self.assertGreater(Region.objects.create(code='R2', name='New').pk, 4)
+        word = Book.objects.first().title.split()[0].lower()
+        self.assertGreater(len(self.client.get(f'/api/v1/books/?search={word}').json()), 0)
+
+    def test_parallel_seeding_keeps_triggers_and_recounts_counters_once(self):
+        triggers, statements = [], []
+
+        def store_chunk(rows, alias):
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE '%counters%'")
+                triggers.append(sorted(name for name, in cursor.fetchall()))
+            return seeding.store_chunk(rows, alias)
+
+        def record(execute, sql, params, many, context):
+            statements.append(sql)
+            return execute(sql, params, many, context)
+
+        with mock.patch.object(seed_catalog, 'store_chunk', store_chunk), connection.execute_wrapper(record):
+            call_command('seed_catalog', regions=2, publishers=4, books=40, book_lovers=0, max_volumes=3,
+                         chunk_size=6, workers=2, stdout=io.StringIO())
+        # Триггеры не удаляются из базы: другие соединения продолжают вести счетчики; пересчет один, в finish()
+        expected = sorted(name for names in COUNTER_TRIGGERS.values() for name in names)
+        self.assertTrue(triggers)
+        self.assertTrue(all(names == expected for names in triggers))
+        self.assertEqual(sum(1 for sql in statements if sql.startswith('UPDATE "Publisher" SET book_count = (')), 1)
+
+        for publisher in Publisher.objects.all():
+            self.assertEqual(publisher.book_count, publisher.book_set.count())
+        for book in Book.objects.prefetch_related('volumes'):
+            volumes = book.volumes.all()
+            self.assertEqual((book.volume_count, book.total_pages),
+                             (len(volumes), sum(volume.number_of_pages for volume in volumes)))
+
+        # Триггеры работают и после загрузки
+        book = Book.objects.first()
+        Volume.objects.create(book=book, volume_number=10, number_of_pages=5)
+        book.refresh_from_db()
+        self.assertEqual(book.volume_count, book.volumes.count())
+
+    def test_seeding_refuses_a_role_that_can_not_pause_triggers(self):
+        with mock.patch.object(seeding, 'pause_counters', side_effect=DatabaseError('permission denied')):
+            with self.assertRaisesMessage(CommandError, 'session_replication_role'):
+                call_command('seed_catalog', regions=2, publishers=4, books=4, book_lovers=0, stdout=io.StringIO())
+        self.assertFalse(Region.objects.exists())
+
+    def test_generation_depends_only_on_seed(self):
+        counts = {'regions': 2, 'publishers': 3, 'books': 10, 'book_lovers': 0}
+        first_ids = dict.fromkeys(counts, 1)
+        chunk = generate_chunk(CatalogPlan(7, counts, first_ids, chunk_size=4), 'books', 1)
+        self.assertEqual(chunk, generate_chunk(CatalogPlan(7, counts, first_ids, chunk_size=4), 'books', 1))
+        self.assertNotEqual(chunk, generate_chunk(CatalogPlan(8, counts, first_ids, chunk_size=4), 'books', 1))
+        self.assertEqual([row[0] for row in chunk['books']], [5, 6, 7, 8])
+        self.assertTrue(all(1 <= row[2] <= 3 for row in chunk['books']))
+
+
+class CounterTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='editor', password='secret'))
+        self.region = Region.objects.create(code='50', name='Moscow Oblast')
+        self.publisher = Publisher.objects.create(name='First', region=self.region)
+        self.other = Publisher.objects.create(name='Second', region=self.region)
+
+    def create_book(self, pages, publisher=None):
+        response = self.client.post('/api/v1/books/', {
+            'title': 'Book', 'publisher': (publisher or self.publisher).pk,
+            'volumes': [{'volume_number': number, 'number_of_pages': count}
+                        for number, count in enumerate(pages, start=1)],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response
+
+    def assert_counters(self, book_id, volume_count, total_pages):
+        book = Book.objects.get(pk=book_id)
+        self.assertEqual((book.volume_count, book.total_pages), (volume_count, total_pages))
+
+    def assert_book_counts(self, first, second):
+        self.assertEqual(Publisher.objects.get(pk=self.publisher.pk).book_count, first)
+        self.assertEqual(Publisher.objects.get(pk=self.other.pk).book_count, second)
+
+    def test_create_and_update_return_counters(self):
+        response = self.create_book([100, 250])
+        self.assertEqual((response.data['volume_count'], response.data['total_pages']), (2, 350))
+        book_id = response.data['id_book']
+        etag = self.client.get(f'/api/v1/books/{book_id}/').headers['ETag']
+
+        response = self.client.put(f'/api/v1/books/{book_id}/', {
+            'title': 'Book', 'publisher': self.other.pk, 'volumes': [{'volume_number': 1, 'number_of_pages': 40}],
+        }, format='json')
+        self.assertEqual((response.data['volume_count'], response.data['total_pages']), (1, 40))
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assert_book_counts(0, 1)
+        self.assertEqual(self.client.get(f'/api/v1/publishers/{self.other.pk}/').data['book_count'], 1)
+
+    def test_bulk_paths_and_cascades(self):
+        self.client.post('/api/v1/books/bulk/', [
+            {'title': 'A', 'publisher': self.publisher.pk, 'volumes': [{'volume_number': 1, 'number_of_pages': 10}]},
+            {'title': 'B', 'publisher': self.publisher.pk, 'volumes': []},
+        ], format='json')
+        book = Book.objects.get(title='A')
+        self.assert_counters(book.pk, 1, 10)
+        self.assert_book_counts(2, 0)
+
+        Volume.objects.filter(book=book).update(number_of_pages=30)
+        Volume.objects.bulk_create([Volume(book=book, volume_number=2, number_of_pages=5)])
+        self.assert_counters(book.pk, 2, 35)
+        Volume.objects.filter(book=book, volume_number=1).delete()
+        self.assert_counters(book.pk, 1, 5)
+
+        Book.objects.filter(title='B').update(publisher=self.other)
+        self.assert_book_counts(1, 1)
+        Book.objects.filter(title='B').delete()
+        self.assert_book_counts(1, 0)
+        self.region.delete()
+        self.assertFalse(Volume.objects.exists())
+
+    def test_save_does_not_overwrite_counters(self):
+        book_id = self.create_book([100]).data['id_book']
+        book = Book.objects.get(pk=book_id)
+        publisher = Publisher.objects.get(pk=self.publisher.pk)
+        Volume.objects.create(book=book, volume_number=2, number_of_pages=20)
+        Book.objects.create(title='Other', publisher=self.publisher)
+        book.title = 'Renamed'
+        book.save()
+        publisher.name = 'Renamed'
+        publisher.save()
+        self.assert_counters(book_id, 2, 120)
+        self.assert_book_counts(2, 0)
+
+    def test_filter_and_sort(self):
+        small = self.create_book([50]).data['id_book']
+        large = self.create_book([300, 300, 300]).data['id_book']
+        middle = self.create_book([200, 200], publisher=self.other).data['id_book']
+
+        def ids(url):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            rows = response.data['results'] if 'results' in response.data else response.data
+            return [row.get('id_book', row.get('id')) for row in rows]
+
+        self.assertEqual(ids('/api/v1/books/?sort=-total_pages'), [large, middle, small])
+        self.assertEqual(ids('/api/v1/books/?cursor=&sort=volume_count&pagesize=2'), [small, middle])
+        self.assertEqual(ids('/api/v1/books/?min_pages=100&max_pages=500'), [middle])
+        self.assertEqual(ids('/api/v1/books/?volume_count=3'), [large])
+        self.assertEqual(ids('/api/v1/publishers/?sort=-book_count'), [self.publisher.pk, self.other.pk])
+        self.assertEqual(ids('/api/v1/publishers/?min_books=2'), [self.publisher.pk])
+
+
+class SparseFieldsetTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        region = Region.objects.create(code='77', name='Moscow')
+        publisher = Publisher.objects.create(name='Publisher', region=region)
+        for i in range(10):
+            book = Book.objects.create(title=f'Book {i}', publisher=publisher, year_of_release=2000 + i)
+            Volume.objects.create(book=book, volume_number=1, number_of_pages=100)
+            Publisher.objects.create(name=f'Publisher {i}', region=region)
+            BookLover.objects.create(first_name=f'Name {i}', last_name='Last', birthday=date(1990, 1, 1 + i))
+
+    def test_fields_prune_columns_and_prefetch(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/v1/books/?page=1&pagesize=5&fields=id_book,title')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([list(row) for row in response.data], [['id_book', 'title']] * 5)
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('year_of_release', queries[-1]['sql'])
+
+    def test_exclude(self):
+        response = self.client.get('/api/v1/books/?exclude=volumes,cover_photo,cover_thumbnails')
+        self.assertNotIn('volumes', response.data[0])
+        self.assertIn('total_pages', response.data[0])
+        response = self.client.get('/api/v1/regions/?fields=code,name&exclude=name')
+        self.assertEqual(list(response.data[0]), ['code'])
+
+    def test_cursor_pages_on_column_left_out(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/v1/booklovers/?cursor=&pagesize=3&fields=first_name')
+        self.assertEqual([list(row) for row in response.data['results']], [['first_name']] * 3)
+        self.assertEqual(len(queries), 1)
+        response = self.client.get(response.data['next'])
+        self.assertEqual([row['first_name'] for row in response.data['results']], ['Name 3', 'Name 4', 'Name 5'])
+
+        response = self.client.get('/api/v1/publishers/?cursor=&pagesize=4&fields=name')
+        self.assertEqual(len(response.data['results']), 4)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_export_header_follows_fields(self):
+        response = self.client.get('/api/v1/booklovers/?format=csv&fields=first_name,last_name')
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(lines[0], 'first_name,last_name')
+        self.assertEqual(len(lines), 11)
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get('/api/v1/books/?fields=id_book,isbn')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('fields', response.data)
+
+
+class ValuesSerializerTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        region = Region.objects.create(code='77', name='Москва \u2028')
+        publisher = Publisher.objects.create(name='Издательство "Мир"', region=region)
+        Book.objects.create(title='No publisher')
+        for i in range(5):
+            book = Book.objects.create(title=f'Книга {i}', publisher=publisher,
+                                       year_of_release=None if i == 2 else 1990 + i,
+                                       cover_photo=f'book_covers/{i}.png' if i % 2 else None,
+                                       cover_thumbnails={'64': {'webp': f'thumbnails/{i}.webp'}} if i == 3 else None)
+            for number in range(1, i + 1):
+                Volume.objects.create(book=book, volume_number=number, number_of_pages=10 * number)
+            BookLover.objects.create(first_name=f'Имя {i}', last_name='Last', middle_name=None if i % 2 else 'M',
+                                     birthday=date(1980, 2, 1 + i) if i != 1 else None,
+                                     date_of_joining=date(2020, 1, 1))
+
+    def assert_equivalent(self, serializer_class, queryset, fields=None):
+        expected = serializer_class(queryset, many=True, fields=fields).data
+        values_serializer = ValuesSerializer.compile(serializer_class, fields)
+        self.assertIsNotNone(values_serializer)
+        actual = values_serializer.serialize(values_serializer.get_queryset(queryset))
+        self.assertEqual(actual, expected)
+        self.assertEqual([list(row) for row in actual], [list(row) for row in expected])
+        self.assertEqual(ORJSONRenderer().render(actual), JSONRenderer().render(expected))
+
+    def test_matches_model_serializers(self):
+        self.assert_equivalent(BookSerializer, Book.objects.order_by('id_book'))
+        self.assert_equivalent(BookSerializer, Book.objects.order_by('-id_book'), ['title', 'volumes', 'cover_photo'])
+        self.assert_equivalent(BookLoverSerializer, BookLover.objects.order_by('birthday'))
+        self.assert_equivalent(PublisherSerializer, Publisher.objects.all())
+        self.assert_equivalent(RegionSerializer, Region.objects.all())
+
+    def test_list_responses_match_drf_path(self):
+        urls = ['/api/v1/books/', '/api/v1/books/?cursor=&pagesize=2&ordering=desc', '/api/v1/booklovers/',
+                '/api/v1/publishers/?cursor=', '/api/v1/regions/',
+                '/api/v1/books/?fields=title,volumes&sort=-total_pages']
+        for url in urls:
+            with override_settings(FAST_SERIALIZATION=False):
+                expected = self.client.get(url)
+            cache.clear()
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, url)
+            self.assertEqual(response.content, expected.content, url)
+
+    def test_renderer_falls_back_for_indent(self):
+        data = [{'day': date(2020, 1, 2), 'text': 'й'}]
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(ORJSONRenderer().render(data, 'application/json; indent=2'),
+                         JSONRenderer().render(data, 'application/json; indent=2'))
+
+
+class CompressionTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='editor', password='secret'))
+        for i in range(30):
+            BookLover.objects.create(first_name='Anna', last_name=f'Petrova {i}', address='Nevsky prospekt 1')
+        self.book = Book.objects.create(title='Book ' * 300, year_of_release=2000)
+        Volume.objects.create(book=self.book, volume_number=1, number_of_pages=10)
+        self.url = f'/api/v1/books/{self.book.pk}/'
+
+    def test_choose_encoding_honors_q_values(self):
+        codings = ['zstd', 'br', 'gzip']
+        self.assertEqual(choose_encoding('gzip, deflate, br', codings), 'br')
+        self.assertEqual(choose_encoding('gzip;q=1.0, br;q=0.5', codings), 'gzip')
+        self.assertEqual(choose_encoding('*;q=0.1, gzip;q=0', codings), 'zstd')
+        self.assertIsNone(choose_encoding('gzip;q=0, identity', codings))
+        self.assertIsNone(choose_encoding('', codings))
+
+    @override_settings(COMPRESSION_ENCODINGS=['gzip'])
+    def test_json_list_is_gzipped(self):
+        plain = self.client.get('/api/v1/booklovers/?pagesize=30')
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertIn('Accept-Encoding', plain['Vary'])
+        response = self.client.get('/api/v1/booklovers/?pagesize=30', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertLess(len(response.content), len(plain.content))
+        self.assertEqual(zlib.decompress(response.content, 31), plain.content)
+
+    def test_small_and_html_responses_are_not_compressed(self):
+        response = self.client.get('/api/v1/regions/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertNotIn('Accept-Encoding', response.get('Vary', ''))
+        response = self.client.get('/api/v1/booklovers/?pagesize=30', HTTP_ACCEPT='text/html',
+                                   HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', response)
+
+    @override_settings(COMPRESSION_ENCODINGS=['gzip'])
+    def test_etag_carries_coding_and_validates(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['ETag'], etag[:-1] + '-gzip"')
+
+        not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'], HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(not_modified['ETag'], response['ETag'])
+
+        payload = {'title': 'New title', 'volumes': [{'volume_number': 1, 'number_of_pages': 20}]}
+        updated = self.client.put(self.url, payload, format='json', HTTP_IF_MATCH=response['ETag'])
+        self.assertEqual(updated.status_code, status.HTTP_200_OK)
+
+    @override_settings(COMPRESSION_ENCODINGS=['gzip'])
+    def test_streamed_export_is_compressed_incrementally(self):
+        plain = b''.join(self.client.get('/api/v1/booklovers/?format=ndjson').streaming_content)
+        response = self.client.get('/api/v1/booklovers/?format=ndjson', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertNotIn('Content-Length', response)
+        self.assertEqual(zlib.decompress(b''.join(response.streaming_content), 31), plain)
+
+    def test_negotiates_optional_codings(self):
+        middleware = CompressionMiddleware(lambda request: HttpResponse(b'{"a": 1}' * 500,
+                                                                        content_type='application/json'))
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='zstd, br, gzip')
+        response = middleware(request)
+        expected = 'zstd' if 'zstd' in middleware.encoders else 'br' if 'br' in middleware.encoders else 'gzip'
+        self.assertEqual(response['Content-Encoding'], expected)
+        self.assertLess(len(response.content), 4000)
+
+
+class BatchGetTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        region = Region.objects.create(code='78', name='Saint Petersburg')
+        self.publisher = Publisher.objects.create(name='Publisher', region=region)
+        self.books = []
+        for i in range(4):
+            book = Book.objects.create(title=f'Book {i}', publisher=self.publisher, year_of_release=2000 + i)
+            Volume.objects.create(book=book, volume_number=1, number_of_pages=100 + i)
+            self.books.append(book)
+
+    def test_books_keep_requested_order_and_report_missing(self):
+        ids = [self.books[2].pk, 999, self.books[0].pk, self.books[2].pk]
+        for fast in (True, False):
+            with override_settings(FAST_SERIALIZATION=fast), self.assertNumQueries(2):
+                response = self.client.get(f'/api/v1/books/batch/?ids={",".join(map(str, ids))}')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual([book['title'] for book in response.data['results']], ['Book 2', 'Book 0'])
+            self.assertEqual(response.data['results'][0]['volumes'][0]['number_of_pages'], 102)
+            self.assertEqual(response.data['missing'], [999])
+
+    def test_post_body_and_sparse_fields(self):
+        ids = [book.pk for book in reversed(self.books)]
+        with self.assertNumQueries(1):
+            response = self.client.post('/api/v1/books/batch/?fields=title', {'ids': ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [{'title': f'Book {i}'} for i in (3, 2, 1, 0)])
+
+        response = self.client.post('/api/v1/publishers/batch/', {'ids': [self.publisher.pk]}, format='json')
+        self.assertEqual(response.data['results'][0]['book_count'], 4)
+        lover = BookLover.objects.create(first_name='Anna', last_name='Petrova')
+        response = self.client.get(f'/api/v1/booklovers/batch/?ids={lover.pk},{lover.pk + 1}')
+        self.assertEqual(response.data['results'][0]['first_name'], 'Anna')
+        self.assertEqual(response.data['missing'], [lover.pk + 1])
+
+    @override_settings(BATCH_GET_MAX_SIZE=3)
+    def test_invalid_ids_are_rejected(self):
+        for url in ('/api/v1/books/batch/', '/api/v1/books/batch/?ids=1,x', '/api/v1/books/batch/?ids=1,2,3,4'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('ids', response.data)
+        response = self.client.post('/api/v1/books/batch/', {'ids': '1,2'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ExpandTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.region = Region.objects.create(code='78', name='Saint Petersburg')
+        self.publisher = Publisher.objects.create(name='Lenizdat', region=self.region)
+        for i in range(3):
+            book = Book.objects.create(title=f'Book {i}', publisher=self.publisher if i else None, year_of_release=2000)
+            Volume.objects.create(book=book, volume_number=1, number_of_pages=100 + i)
+
+    def test_books_inline_publisher_and_region_in_one_query(self):
+        self.publisher.refresh_from_db()
+        publisher = dict(PublisherSerializer(self.publisher).data, region=RegionSerializer(self.region).data)
+        for fast in (True, False):
+            with override_settings(FAST_SERIALIZATION=fast):
+                # Курсорная страница: без COUNT, книги с издательством и областью одним JOIN
+                with self.assertNumQueries(1):
+                    response = self.client.get('/api/v1/books/?pagination=cursor&expand=publisher.region'
+                                               '&exclude=volumes')
+                results = response.data['results']
+                self.assertEqual([book['publisher'] for book in results], [None, publisher, publisher])
+                with self.assertNumQueries(2):
+                    response = self.client.get('/api/v1/books/?pagination=cursor&expand=publisher.region')
+                self.assertEqual(response.data['results'][1]['publisher'], publisher)
+                self.assertEqual(response.data['results'][1]['volumes'][0]['number_of_pages'], 101)
+
+    def test_publishers_expand_region(self):
+        response = self.client.get('/api/v1/publishers/?pagination=cursor&expand=region')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['region'], RegionSerializer(self.region).data)
+        response = self.client.get('/api/v1/publishers/?pagination=cursor')
+        self.assertEqual(response.data['results'][0]['region'], self.region.pk)
+
+    def test_expand_in_exports_and_batches(self):
+        response = self.client.get('/api/v1/books/?format=ndjson&expand=publisher&ordering=desc')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(rows[0]['publisher']['name'], 'Lenizdat')
+        self.assertEqual(rows[0]['publisher']['region'], self.region.pk)
+
+        book = Book.objects.get(title='Book 2')
+        response = self.client.get(f'/api/v1/books/batch/?ids={book.pk}&expand=publisher.region')
+        self.assertEqual(response.data['results'][0]['publisher']['region']['code'], '78')
+
+    def test_unknown_relation_is_rejected(self):
+        for url in ('/api/v1/books/?expand=volumes', '/api/v1/books/?expand=publisher.owner',
+                    '/api/v1/regions/?expand=publishers'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('expand', response.data)
@@ -0,0 +1,153 @@
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from threading import Lock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.db.models import F
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZES = {
+    'small': (160, 240),
+    'medium': (320, 480),
+    'large': (640, 960),
+}
+THUMBNAIL_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+_executor = None
+_executor_lock = Lock()
+
+
+def get_sizes():
+    return getattr(settings, 'BOOK_COVER_THUMBNAIL_SIZES', THUMBNAIL_SIZES)
+
+
+def get_workers():
+    return getattr(settings, 'THUMBNAIL_WORKERS', 2)
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=get_workers(), thread_name_prefix='thumbnails')
+        return _executor
+
+
+def get_thumbnail_name(name, size, extension):
+    directory, filename = posixpath.split(name)
+    return posixpath.join(directory, 'thumbnails', f'{posixpath.splitext(filename)[0]}_{size}.{extension}')
+
+
+def render_thumbnails(source):
+    """Decodes ``source`` once and returns ``{size: {extension: bytes}}`` for every configured size."""
+    sizes = sorted(get_sizes().items(), key=lambda item: item[1][0] * item[1][1], reverse=True)
+    with Image.open(source) as image:
+        # JPEG декодируется сразу в уменьшенном масштабе, не раскрывая оригинал целиком
+        image.draft('RGB', sizes[0][1])
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        rendered = {}
+        for size, bounds in sizes:
+            # Каждый следующий размер уменьшается из предыдущего, а не из оригинала
+            image = image.copy()
+            image.thumbnail(bounds, Image.LANCZOS)
+            rendered[size] = {}
+            for extension, (image_format, options) in THUMBNAIL_FORMATS.items():
+                buffer = BytesIO()
+                image.save(buffer, image_format, **options)
+                rendered[size][extension] = buffer.getvalue()
+    return rendered
+
+
+def generate_thumbnails(book_id, name):
+    """
+    Builds the thumbnails of the cover ``name`` and stores them on the book,
+    unless the cover has been replaced in the meantime. Returns the stored names.
+    """
+    from first_lab.models import Book
+
+    try:
+        with default_storage.open(name, 'rb') as source:
+            rendered = render_thumbnails(source)
+    except (OSError, ValueError, Image.DecompressionBombError) as exc:
+        logger.warning('Can not build thumbnails for book %s from %s: %s', book_id, name, exc)
+        return None
+
+    thumbnails = {}
+    for size, encoded in rendered.items():
+        thumbnails[size] = {}
+        for extension, content in encoded.items():
+            thumbnail_name = get_thumbnail_name(name, size, extension)
+            if default_storage.exists(thumbnail_name):
+                default_storage.delete(thumbnail_name)
+            thumbnails[size][extension] = default_storage.save(thumbnail_name, ContentFile(content))
+
+    updated = Book.objects.filter(pk=book_id, cover_photo=name).update(
+        cover_thumbnails=thumbnails, version=F('version') + 1,
+    )
+    if not updated:
+        delete_thumbnails(thumbnails)
+        return None
+    return thumbnails
+
+
+def delete_thumbnails(thumbnails):
+    """Deletes the files of a ``{size: {extension: name}}`` mapping from the storage."""
+    for names in (thumbnails or {}).values():
+        for name in names.values():
+            default_storage.delete(name)
+
+
+def discard_thumbnails(book):
+    """
+    Deletes the book's current thumbnails once the transaction that replaces
+    its cover commits; call it before resetting ``cover_thumbnails``.
+    """
+    thumbnails = book.cover_thumbnails
+    if thumbnails:
+        transaction.on_commit(lambda: delete_thumbnails(thumbnails))
+
+
+def run_in_worker(book_id, name):
+    try:
+        generate_thumbnails(book_id, name)
+    except Exception:
+        logger.exception('Thumbnail generation failed for book %s', book_id)
+    finally:
+        # Соединения с БД привязаны к потоку пула
+        connections.close_all()
+
+
+def schedule_thumbnails(book):
+    """
+    Queues thumbnail generation for the book's cover once the current
+    transaction commits. THUMBNAIL_WORKERS = 0 builds them inline instead.
+    """
+    name = book.cover_photo.name if book.cover_photo else None
+    if not name:
+        return
+
+    def submit():
+        if get_workers() == 0:
+            generate_thumbnails(book.pk, name)
+        else:
+            get_executor().submit(run_in_worker, book.pk, name)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,130 @@
+import hashlib
+import os
+import re
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+READ_BLOCK_SIZE = 64 * 1024
+
+
+class ChunkError(Exception):
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def get_max_size():
+    return getattr(settings, 'COVER_UPLOAD_MAX_SIZE', 50 * 1024 * 1024)
+
+
+def get_max_chunk_size():
+    return getattr(settings, 'COVER_UPLOAD_MAX_CHUNK_SIZE', 8 * 1024 * 1024)
+
+
+def get_expiry():
+    return timedelta(hours=getattr(settings, 'COVER_UPLOAD_EXPIRY_HOURS', 24))
+
+
+def get_part_path(upload):
+    directory = getattr(settings, 'COVER_UPLOAD_DIR', os.path.join(tempfile.gettempdir(), 'network-cover-uploads'))
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f'{upload.pk}.part')
+
+
+def parse_content_range(header, size):
+    """Parses ``Content-Range: bytes start-end/total`` into an inclusive (start, end) pair."""
+    match = CONTENT_RANGE_RE.match((header or '').strip())
+    if match is None:
+        raise ChunkError('Content-Range header must be "bytes start-end/total"')
+    start, end, total = (int(value) for value in match.groups())
+    if total != size:
+        raise ChunkError(f'Total size must be {size}')
+    if start > end or end >= size:
+        raise ChunkError('Invalid byte range', 416)
+    if end - start + 1 > get_max_chunk_size():
+        raise ChunkError(f'Chunk must not exceed {get_max_chunk_size()} bytes', 413)
+    return start, end
+
+
+def write_chunk(upload, stream, start, end, checksum):
+    """
+    Copies the chunk from the request stream into the part file at ``start`` in
+    fixed-size blocks and checks its SHA-256 against ``checksum``. Touches only
+    the disk: it runs without a transaction, so a slow client holds neither a
+    database connection nor the upload row lock, see advance_offset.
+    """
+    if checksum is None or not SHA256_RE.match(checksum.lower()):
+        raise ChunkError('X-Chunk-SHA256 header with the hex SHA-256 of the chunk is required')
+    check_start(upload, start)
+
+    length = end - start + 1
+    digest = hashlib.sha256()
+    written = 0
+    descriptor = os.open(get_part_path(upload), os.O_RDWR | os.O_CREAT, 0o600)
+    with os.fdopen(descriptor, 'r+b') as part:
+        part.seek(start)
+        while written < length and stream is not None:
+            block = stream.read(min(READ_BLOCK_SIZE, length - written))
+            if not block:
+                break
+            digest.update(block)
+            part.write(block)
+            written += len(block)
+        part.flush()
+        # Подтверждаем фрагмент только после того, как он лег на диск
+        os.fsync(part.fileno())
+
+    if written != length:
+        raise ChunkError(f'Expected {length} bytes, received {written}')
+    if digest.hexdigest() != checksum.lower():
+        raise ChunkError('Chunk checksum mismatch')
+
+
+def advance_offset(upload, start, end):
+    """
+    Confirms a written chunk: ``upload`` must be locked with select_for_update.
+    The start is checked again, as another request may have moved the offset
+    while the chunk was being received. Returns the new offset.
+    """
+    check_start(upload, start)
+    upload.offset = max(upload.offset, end + 1)
+    upload.save(update_fields=['offset'])
+    return upload.offset
+
+
+def check_start(upload, start):
+    if start > upload.offset:
+        raise ChunkError(f'Chunk must start at or before offset {upload.offset}', 409)
+
+
+def get_file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as part:
+        for block in iter(lambda: part.read(READ_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def remove_part(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def discard(upload):
+    """Deletes the session; its part file goes once the transaction commits, a rollback keeps both."""
+    path = get_part_path(upload)
+    upload.delete()
+    transaction.on_commit(lambda: remove_part(path))
+
+
+def get_expired(queryset, now=None):
+    return queryset.filter(created_at__lt=(now or timezone.now()) - get_expiry())
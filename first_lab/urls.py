@@ -2,6 +2,7 @@ from django.urls import path
 from drf_yasg import openapi
 from drf_yasg.views import get_schema_view
 from rest_framework import permissions
+from rest_framework.parsers import MultiPartParser
 
 from first_lab.views import *
 
@@ -37,6 +38,16 @@ urlpatterns = [
         {'get': 'get',
          'post': 'create'}
     ), name='book-lovers'),
+    path('booklovers/import/', BookLoverViewSet.as_view(
+        {'post': 'import_rows'},
+        permission_classes=[permissions.IsAuthenticated],
+        parser_classes=[MultiPartParser],
+    ), name='book-lovers-import'),
+    path('booklovers/batch/', BookLoverViewSet.as_view(
+        {'get': 'batch_get',
+         'post': 'batch_get'},
+        permission_classes=[permissions.AllowAny],
+    ), name='book-lovers-batch'),
     path('auth/login/', AuthViewSet.as_view({'post': 'login'}), name='login'),
     path('auth/register/', AuthViewSet.as_view({'post': 'register'}), name='register'),
     path('auth/changepassword/', AuthViewSet.as_view({'post': 'change_password'}), name='change_password'),
@@ -45,6 +56,11 @@ urlpatterns = [
         {'get': 'list',
          'post': 'create'}
     ), name='publisher-list'),
+    path('publishers/batch/', PublisherViewSet.as_view(
+        {'get': 'batch_get',
+         'post': 'batch_get'},
+        permission_classes=[permissions.AllowAny],
+    ), name='publisher-batch'),
     path('publishers/<int:pk>/', PublisherViewSet.as_view(
         {'get': 'retrieve',
          'put': 'update',
@@ -54,11 +70,32 @@ urlpatterns = [
         'get': 'list',
         'post': 'create'
     }), name='book-list'),
+    path('books/batch/', BookViewSet.as_view(
+        {'get': 'batch_get',
+         'post': 'batch_get'},
+        permission_classes=[permissions.AllowAny],
+    ), name='book-batch'),
+    path('books/bulk/', BookViewSet.as_view({'post': 'bulk_create'}), name='book-bulk-create'),
+    path('books/<int:pk>/cover/', BookViewSet.as_view(
+        {'put': 'upload_cover'},
+        parser_classes=[MultiPartParser],
+    ), name='book-cover'),
+    path('books/<int:pk>/cover/uploads/', CoverUploadViewSet.as_view({'post': 'create'}),
+         name='book-cover-uploads'),
+    path('books/<int:pk>/cover/uploads/<uuid:upload_id>/', CoverUploadViewSet.as_view(
+        {'get': 'retrieve',
+         'put': 'upload_chunk',
+         'delete': 'destroy'}
+    ), name='book-cover-upload'),
+    path('books/<int:pk>/cover/uploads/<uuid:upload_id>/finalize/', CoverUploadViewSet.as_view(
+        {'post': 'finalize'}
+    ), name='book-cover-upload-finalize'),
     path('books/<int:pk>/', BookViewSet.as_view({
         'get': 'retrieve',
         'put': 'update',
         'delete': 'destroy'
     }), name='book-detail'),
+    path('metrics/', metrics, name='metrics'),
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
 ]
@@ -0,0 +1,212 @@
+from collections import defaultdict
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+# Для строк и целых из БД to_representation DRF возвращает значение как есть
+IDENTITY_REPRESENTATIONS = {
+    serializers.CharField.to_representation,
+    serializers.IntegerField.to_representation,
+}
+
+
+class ValuesSerializer:
+    """
+    Read-only fast path for list pages. The readable fields of a ModelSerializer
+    are compiled once into ``(name, column, convert)`` entries; rows then come
+    from ``values()`` and are rendered without model instances or per-field
+    DRF calls, except for the fields whose representation is not the column
+    value itself. The output equals ``serializer_class(rows, many=True).data``.
+
+    Nested many=True ModelSerializers over a reverse foreign key are read with
+    one extra ``values()`` query per page; a nested ModelSerializer over a
+    forward foreign key (an expanded relation) is read from joined columns of
+    the same query. ``compile`` returns None for serializers it can not
+    reproduce (source='*', dotted sources, method fields).
+    """
+
+    def __init__(self, model, entries, columns, nested, joined=None):
+        self.model = model
+        self.entries = entries
+        self.columns = columns
+        # name -> (relation, ValuesSerializer for the related rows)
+        self.nested = nested
+        # name -> ValuesSerializer over the joined columns of the same row
+        self.joined = joined or {}
+
+    @classmethod
+    def compile(cls, serializer_class, fields=None, extra_columns=(), expand=None):
+        return cls.compile_serializer(serializer_class(fields=fields, expand=expand), extra_columns)
+
+    @classmethod
+    def compile_serializer(cls, serializer, extra_columns=(), prefix=''):
+        model = serializer.Meta.model
+        opts = model._meta
+        entries = []
+        columns = [prefix + opts.pk.attname]
+        nested = {}
+        joined = {}
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if field.source == '*' or '.' in field.source:
+                return None
+            try:
+                model_field = opts.get_field(field.source)
+            except FieldDoesNotExist:
+                return None
+
+            if isinstance(field, serializers.ListSerializer):
+                if prefix or not model_field.one_to_many or not isinstance(field.child, serializers.ModelSerializer):
+                    return None
+                child = cls.compile_serializer(field.child, [model_field.field.attname])
+                if child is None:
+                    return None
+                nested[name] = (model_field, child)
+                entries.append((name, opts.pk.attname, None))
+                continue
+            if isinstance(field, serializers.ModelSerializer) and model_field.many_to_one:
+                # Внешний ключ задает null для пустой связи, остальное читается из колонок JOIN
+                child = cls.compile_serializer(field, prefix=f'{prefix}{model_field.name}__')
+                if child is None:
+                    return None
+                joined[name] = child
+                entries.append((name, prefix + model_field.attname, None))
+                columns.extend(column for column in [prefix + model_field.attname, *child.columns]
+                               if column not in columns)
+                continue
+            if not model_field.concrete or isinstance(field, serializers.BaseSerializer):
+                return None
+
+            if isinstance(field, serializers.RelatedField):
+                if not isinstance(field, serializers.PrimaryKeyRelatedField) or field.pk_field is not None:
+                    return None
+                convert = None
+            elif isinstance(field, serializers.FileField):
+                convert = cls.get_file_converter(field, model_field)
+            elif type(field).to_representation in IDENTITY_REPRESENTATIONS:
+                convert = None
+            else:
+                convert = field.to_representation
+            entries.append((name, prefix + model_field.attname, convert))
+            if prefix + model_field.attname not in columns:
+                columns.append(prefix + model_field.attname)
+
+        for name in extra_columns:
+            column = opts.get_field(name).attname
+            if column not in columns:
+                columns.append(column)
+        return cls(model, entries, columns, nested, joined)
+
+    @staticmethod
+    def get_file_converter(field, model_field):
+        # То же, что FileField.to_representation, но по имени файла из values(), без FieldFile
+        storage = model_field.storage
+        request = field.context.get('request')
+        use_url = getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL)
+
+        def convert(name):
+            if not name:
+                return None
+            if not use_url:
+                return name
+            url = storage.url(name)
+            return request.build_absolute_uri(url) if request is not None else url
+        return convert
+
+    def get_queryset(self, queryset):
+        return queryset.prefetch_related(None).values(*self.columns)
+
+    def get_related_queryset(self, relation, child, pks):
+        queryset = relation.related_model._default_manager.filter(**{f'{relation.field.attname}__in': pks})
+        return child.get_queryset(queryset)
+
+    def group_related(self, relation, child, rows):
+        key = relation.field.attname
+        groups = defaultdict(list)
+        for row, data in zip(rows, child.render(rows)):
+            groups[row[key]].append(data)
+        return groups
+
+    def render(self, rows, related=None):
+        # Вложенные списки берутся из сгруппированных строк по первичному ключу
+        related = related or {}
+        entries = [(name, column, related[name].__getitem__ if name in related else convert)
+                   for name, column, convert in self.entries]
+        return [self.render_row(row, entries) for row in rows]
+
+    def render_row(self, row, entries=None):
+        data = {}
+        for name, column, convert in entries or self.entries:
+            value = row[column]
+            if value is not None and convert is not None:
+                value = convert(value)
+            data[name] = value
+        for name, child in self.joined.items():
+            if data[name] is not None:
+                data[name] = child.render_row(row)
+        return data
+
+    def serialize(self, rows):
+        rows = list(rows)
+        related = {}
+        if self.nested and rows:
+            pks = [row[self.model._meta.pk.attname] for row in rows]
+            for name, (relation, child) in self.nested.items():
+                related_rows = list(self.get_related_queryset(relation, child, pks))
+                related[name] = self.group_related(relation, child, related_rows)
+        return self.render(rows, related)
+
+    async def aserialize(self, rows):
+        rows = list(rows)
+        related = {}
+        if self.nested and rows:
+            pks = [row[self.model._meta.pk.attname] for row in rows]
+            for name, (relation, child) in self.nested.items():
+                related_rows = [row async for row in self.get_related_queryset(relation, child, pks)]
+                related[name] = self.group_related(relation, child, related_rows)
+        return self.render(rows, related)
+
+
+class InstanceSerializer:
+    """The ValuesSerializer interface over the DRF serializer itself, for model instances."""
+
+    def __init__(self, serializer_class, fields=None, expand=None):
+        self.serializer_class = serializer_class
+        self.fields = fields
+        self.expand = expand
+
+    def get_queryset(self, queryset):
+        return queryset
+
+    def serialize(self, rows):
+        return self.serializer_class(rows, many=True, fields=self.fields, expand=self.expand).data
+
+    async def aserialize(self, rows):
+        # DRF может дочитывать отложенные поля и связи, это синхронный ORM
+        return await sync_to_async(self.serialize)(rows)
+
+
+@lru_cache(maxsize=256)
+def compile_values_serializer(serializer_class, fields, extra_columns, expand=None):
+    # Без контекста запроса результат зависит только от аргументов и не меняется, его можно разделять
+    return ValuesSerializer.compile(serializer_class, None if fields is None else list(fields), extra_columns, expand)
+
+
+def get_list_serializer(serializer_class, fields=None, extra_columns=(), expand=None):
+    """
+    ValuesSerializer for ``serializer_class`` when FAST_SERIALIZATION is on and it
+    can reproduce the serializer, otherwise InstanceSerializer. ``extra_columns``
+    are model fields the caller reads from the rows (cursor and sort columns).
+    """
+    if getattr(settings, 'FAST_SERIALIZATION', True):
+        values_serializer = compile_values_serializer(
+            serializer_class, None if fields is None else tuple(fields), tuple(extra_columns),
+            None if expand is None else tuple(expand))
+        if values_serializer is not None:
+            return values_serializer
+    return InstanceSerializer(serializer_class, fields, expand)
@@ -1,26 +1,116 @@
-from django.contrib.auth import authenticate
-from django.http import HttpResponse, Http404
+import hmac
+
+from django.conf import settings
+from django.contrib.auth import authenticate, user_logged_in
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseForbidden, Http404
 from drf_yasg import openapi
-from drf_yasg.utils import swagger_auto_schema
+from drf_yasg.utils import no_body, swagger_auto_schema
 from rest_framework import status, viewsets
 from rest_framework.authtoken.models import Token
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.generics import get_object_or_404
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework_simplejwt.tokens import RefreshToken
 
-from first_lab.models import Region, BookLover, Book, Publisher
+from first_lab.authentication import credential_cache
+from first_lab.batch import BatchRetrieveMixin
+from first_lab.cache import publisher_list_cache, region_list_cache
+from first_lab.conditional import ConditionalRequestMixin
+from first_lab.eager_loading import EagerLoadingMixin
+from first_lab.export import export_response, is_export_requested
+from first_lab.hashing import HashingBusy, check_password, set_password
+from first_lab.importers import BookLoverImporter, FORMATS, detect_format
+from first_lab.metrics import PROMETHEUS_CONTENT_TYPE, default_registry
+from first_lab.models import Region, BookLover, Book, Publisher, CoverUpload
+from first_lab.pagination import KeysetPagination
+from first_lab.renderers import CSVRenderer, NDJSONRenderer
+from first_lab.search import search_books
 from first_lab.serializator import RegionSerializer, BookLoverSerializer, UserSerializer, BookSerializer, \
-    PublisherSerializer
+    PublisherSerializer, BookCoverSerializer, CoverUploadSerializer
+from first_lab.uploads import ChunkError, advance_offset, discard, get_file_checksum, \
+    get_part_path, parse_content_range, write_chunk
+
+
+EXPORT_RENDERER_CLASSES = [*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer, CSVRenderer]
+
+EXPORT_FORMAT_PARAMETER = openapi.Parameter('format', openapi.IN_QUERY,
+                                            description="Stream every matching row as 'ndjson' or 'csv'",
+                                            type=openapi.TYPE_STRING)
+
+SPARSE_FIELDS_PARAMETERS = [
+    openapi.Parameter('fields', openapi.IN_QUERY, description="Comma separated fields to return",
+                      type=openapi.TYPE_STRING),
+    openapi.Parameter('exclude', openapi.IN_QUERY, description="Comma separated fields to leave out",
+                      type=openapi.TYPE_STRING),
+]
+
+BOOK_EXPAND_PARAMETER = openapi.Parameter('expand', openapi.IN_QUERY, description="Comma separated relations to "
+                                          "inline: 'publisher', 'publisher.region'", type=openapi.TYPE_STRING)
+PUBLISHER_EXPAND_PARAMETER = openapi.Parameter('expand', openapi.IN_QUERY, description="'region' to inline the region",
+                                               type=openapi.TYPE_STRING)
+
+BATCH_IDS_PARAMETER = openapi.Parameter('ids', openapi.IN_QUERY, description="Comma separated ids",
+                                        type=openapi.TYPE_STRING, required=True)
+BATCH_IDS_BODY = openapi.Schema(type=openapi.TYPE_OBJECT, required=['ids'], properties={
+    'ids': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_INTEGER)),
+})
+
+
+def get_batch_responses(serializer_class):
+    return {200: openapi.Schema(type=openapi.TYPE_OBJECT, properties={
+        'results': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(
+            type=openapi.TYPE_OBJECT, title=serializer_class.__name__.removesuffix('Serializer'))),
+        'missing': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_INTEGER)),
+    })}
+
+
+def get_sort(request, fields):
+    """``sort=<field>`` or ``sort=-<field>`` for one of ``fields`` as (field, descending), else None."""
+    value = request.GET.get('sort', '')
+    field = value.removeprefix('-')
+    if field not in fields:
+        return None
+    return field, value.startswith('-')
+
+
+def get_int_param(request, name):
+    try:
+        return int(request.GET.get(name))
+    except (TypeError, ValueError):
+        return None
 
 
 def index(request):
     return HttpResponse("Hello world!")
 
 
-class RegionViewSet(viewsets.ViewSet):
+def can_read_metrics(request):
+    """Clients from METRICS_ALLOWED_IPS, or any client sending ``Authorization: Bearer <METRICS_TOKEN>``."""
+    if request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', ['127.0.0.1', '::1']):
+        return True
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+    return bool(token) and scheme.lower() == 'bearer' and hmac.compare_digest(credentials.encode(), token.encode())
+
+
+def metrics(request):
+    if not can_read_metrics(request):
+        return HttpResponseForbidden()
+    content = default_registry.render(getattr(settings, 'METRICS_DIR', None))
+    return HttpResponse(content, content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+class RegionViewSet(EagerLoadingMixin, viewsets.ViewSet):
+    eager_serializer_class = RegionSerializer
+    renderer_classes = EXPORT_RENDERER_CLASSES
+    keyset_ordering_field = 'code'
 
     @staticmethod
     def get_ordering(request):
@@ -45,12 +135,32 @@ class RegionViewSet(viewsets.ViewSet):
         except Exception:
             return None
 
+    def get_list_queryset(self, request):
+        queryset = self.eager_load(Region.objects.all(), self.get_requested_fields(request),
+                                   self.get_requested_expansions(request))
+        ordering = self.get_ordering(request)
+        name_region = self.get_filter_region_name(request)
+
+        if name_region:
+            queryset = queryset.filter(name=name_region)
+
+        if ordering == 'asc':
+            queryset = queryset.order_by('code')
+        elif ordering == 'desc':
+            queryset = queryset.order_by('-code')
+        return queryset
+
     @swagger_auto_schema(manual_parameters=[
         openapi.Parameter('ordering', openapi.IN_QUERY, description="Ordering (asc or desc)", type=openapi.TYPE_STRING),
         openapi.Parameter('name', openapi.IN_QUERY, description="Filter by name", type=openapi.TYPE_STRING),
         openapi.Parameter('page', openapi.IN_QUERY, description="Page number", type=openapi.TYPE_INTEGER),
         openapi.Parameter('pagesize', openapi.IN_QUERY, description="Page size", type=openapi.TYPE_INTEGER),
+        openapi.Parameter('cursor', openapi.IN_QUERY, description="Cursor for keyset pagination",
+                          type=openapi.TYPE_STRING),
+        EXPORT_FORMAT_PARAMETER,
+        *SPARSE_FIELDS_PARAMETERS,
     ], responses={200: BookSerializer()})
+    @region_list_cache
     def get(self, request):
         pagination_data = self.get_pagination(request)
         if pagination_data:
@@ -60,58 +170,79 @@ class RegionViewSet(viewsets.ViewSet):
             page = None
             page_size = None
 
-        queryset = Region.objects.all()
-        ordering = self.get_ordering(request)
-        name_region = self.get_filter_region_name(request)
+        queryset = self.get_list_queryset(request)
+        fields = self.get_requested_fields(request)
+        expand = self.get_requested_expansions(request)
 
-        if name_region:
-            queryset = queryset.filter(name=name_region)
+        if is_export_requested(request):
+            return export_response(request, queryset, RegionSerializer, 'regions', fields=fields, expand=expand)
 
-        if ordering == 'asc':
-            queryset = queryset.order_by('code')
-        elif ordering == 'desc':
-            queryset = queryset.order_by('-code')
+        list_serializer = self.get_list_serializer(fields, expand)
+        queryset = list_serializer.get_queryset(queryset)
+
+        if KeysetPagination.is_requested(request):
+            paginator = KeysetPagination.for_view(self, request)
+            result_page = paginator.paginate_queryset(queryset, request)
+            data = list_serializer.serialize(result_page)
+            return paginator.get_paginated_response(data)
 
         paginator = MyModelPagination(page, page_size)
         result_page = paginator.paginate_queryset(queryset, request)
-        serializer = RegionSerializer(result_page, many=True)
-        return Response(data=serializer.data)
+        data = list_serializer.serialize(result_page)
+        return Response(data=data)
 
     def post(self, request):
         serializer = RegionSerializer(data=request.data)
         if serializer.is_valid():
             serializer.save()
+            region_list_cache.invalidate()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class RegionViewSetById(viewsets.ViewSet):
+class RegionViewSetById(ConditionalRequestMixin, EagerLoadingMixin, viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
+    eager_serializer_class = RegionSerializer
+    eager_extra_columns = ('version',)
 
     @staticmethod
-    def get_object(pk):
+    def get_object(pk, for_update=False):
+        queryset = Region.objects.select_for_update() if for_update else Region.objects.all()
         try:
-            return Region.objects.get(pk=pk)
+            return queryset.get(pk=pk)
         except Region.DoesNotExist:
             raise Http404
 
     @swagger_auto_schema(responses={200: RegionSerializer()})
     def get(self, request, pk):
-        queryset = self.get_object(pk)
+        not_modified = self.get_not_modified_response(request, Region, pk)
+        if not_modified is not None:
+            return not_modified
+        queryset = get_object_or_404(self.eager_load(Region.objects.all()), pk=pk)
         serializer = RegionSerializer(queryset)
-        return Response(data=serializer.data, status=status.HTTP_200_OK)
+        return self.with_etag(request, Response(data=serializer.data, status=status.HTTP_200_OK), queryset)
 
     def update(self, request, pk):
-        region = self.get_object(pk)
-        serializer = RegionSerializer(region, data=request.data)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data)
+        with transaction.atomic():
+            region = self.get_object(pk, for_update=True)
+            precondition_failed = self.get_precondition_failed_response(request, region)
+            if precondition_failed is not None:
+                return precondition_failed
+            serializer = RegionSerializer(region, data=request.data)
+            if serializer.is_valid():
+                serializer.save()
+                region_list_cache.invalidate()
+                # Область может быть раскрыта в списке издательств (?expand=region)
+                publisher_list_cache.invalidate()
+                return self.with_etag(request, Response(serializer.data), region)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def delete(self, request, pk):
         region = self.get_object(pk)
         region.delete()
+        region_list_cache.invalidate()
+        # Издательства области удаляются каскадом
+        publisher_list_cache.invalidate()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -133,7 +264,10 @@ class MyModelPagination(PageNumberPagination):
     page_size = 10
 
 
-class BookLoverViewSet(viewsets.ViewSet):
+class BookLoverViewSet(BatchRetrieveMixin, EagerLoadingMixin, viewsets.ViewSet):
+    eager_serializer_class = BookLoverSerializer
+    renderer_classes = EXPORT_RENDERER_CLASSES
+    keyset_ordering_field = 'birthday'
 
     @staticmethod
     def get_ordering(request):
@@ -187,24 +321,20 @@ class BookLoverViewSet(viewsets.ViewSet):
                               type=openapi.TYPE_INTEGER),
             openapi.Parameter('page_size', openapi.IN_QUERY, description="Page size for pagination",
                               type=openapi.TYPE_INTEGER),
+            openapi.Parameter('cursor', openapi.IN_QUERY, description="Cursor for keyset pagination",
+                              type=openapi.TYPE_STRING),
+            EXPORT_FORMAT_PARAMETER,
+            *SPARSE_FIELDS_PARAMETERS,
         ]
 
-    @swagger_auto_schema(manual_parameters=get_parameters())
-    def get(self, request):
-        pagination_data = self.get_pagination(request)
-        if pagination_data:
-            page = pagination_data['page']
-            page_size = pagination_data['page_size']
-        else:
-            page = None
-            page_size = None
-
+    def get_list_queryset(self, request):
         filter_birthday = self.get_filter_birthday(request)
         filter_date_of_joint = self.get_filter_date_of_joining(request)
         filter_first_name = self.get_filter_first_name(request)
         ordering = self.get_ordering(request)
 
-        queryset = BookLover.objects.all()
+        queryset = self.eager_load(BookLover.objects.all(), self.get_requested_fields(request),
+                                   self.get_requested_expansions(request))
 
         if filter_first_name:
             queryset = queryset.filter(first_name=filter_first_name)
@@ -217,11 +347,38 @@ class BookLoverViewSet(viewsets.ViewSet):
             queryset = queryset.order_by('birthday')
         elif ordering == 'desc':
             queryset = queryset.order_by('-birthday')
+        return queryset
+
+    @swagger_auto_schema(manual_parameters=get_parameters())
+    def get(self, request):
+        pagination_data = self.get_pagination(request)
+        if pagination_data:
+            page = pagination_data['page']
+            page_size = pagination_data['page_size']
+        else:
+            page = None
+            page_size = None
+
+        queryset = self.get_list_queryset(request)
+        fields = self.get_requested_fields(request)
+        expand = self.get_requested_expansions(request)
+
+        if is_export_requested(request):
+            return export_response(request, queryset, BookLoverSerializer, 'booklovers', fields=fields, expand=expand)
+
+        list_serializer = self.get_list_serializer(fields, expand)
+        queryset = list_serializer.get_queryset(queryset)
+
+        if KeysetPagination.is_requested(request):
+            paginator = KeysetPagination.for_view(self, request)
+            result_page = paginator.paginate_queryset(queryset, request)
+            data = list_serializer.serialize(result_page)
+            return paginator.get_paginated_response(data)
 
         paginator = MyModelPagination(page, page_size)
         result_page = paginator.paginate_queryset(queryset, request)
-        serializer = BookLoverSerializer(result_page, many=True)
-        return Response(data=serializer.data)
+        data = list_serializer.serialize(result_page)
+        return Response(data=data)
 
     @swagger_auto_schema(request_body=BookLoverSerializer)
     def create(self, request):
@@ -231,30 +388,85 @@ class BookLoverViewSet(viewsets.ViewSet):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @swagger_auto_schema(methods=['get'], manual_parameters=[BATCH_IDS_PARAMETER, *SPARSE_FIELDS_PARAMETERS],
+                         responses=get_batch_responses(BookLoverSerializer))
+    @swagger_auto_schema(methods=['post'], request_body=BATCH_IDS_BODY, manual_parameters=SPARSE_FIELDS_PARAMETERS,
+                         responses=get_batch_responses(BookLoverSerializer))
+    @action(detail=False, methods=['get', 'post'])
+    def batch_get(self, request):
+        return Response(self.get_batch(request))
+
+    @staticmethod
+    def get_import_format(request, upload):
+        try:
+            file_format = request.GET.get('file_format')
+        except Exception:
+            file_format = None
+        return file_format or detect_format(upload.name, upload.content_type)
+
+    @swagger_auto_schema(manual_parameters=[
+        openapi.Parameter('file', openapi.IN_FORM, description="CSV or NDJSON file", type=openapi.TYPE_FILE,
+                          required=True),
+        openapi.Parameter('file_format', openapi.IN_QUERY, description="'csv' or 'ndjson'",
+                          type=openapi.TYPE_STRING),
+        openapi.Parameter('key', openapi.IN_QUERY,
+                          description="Comma separated natural key fields, a unique constraint of BookLover",
+                          type=openapi.TYPE_STRING),
+    ])
+    @action(detail=False, methods=['post'])
+    def import_rows(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'File is required'}, status=status.HTTP_400_BAD_REQUEST)
+        file_format = self.get_import_format(request, upload)
+        if file_format not in FORMATS:
+            return Response({'error': 'Unsupported file format'}, status=status.HTTP_400_BAD_REQUEST)
+
+        key = request.GET.get('key')
+        try:
+            importer = BookLoverImporter(key_fields=key.split(',') if key else None)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            report = importer.run(upload, file_format)
+        except UnicodeDecodeError:
+            return Response({'error': 'File must be UTF-8 encoded'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report.as_dict(), status=status.HTTP_200_OK)
+
 
-class BookLoverViewSetById(viewsets.ViewSet):
+class BookLoverViewSetById(ConditionalRequestMixin, EagerLoadingMixin, viewsets.ViewSet):
     permission_classes = [IsAuthenticatedOrReadOnly]
+    eager_serializer_class = BookLoverSerializer
+    eager_extra_columns = ('version',)
 
     @staticmethod
-    def get_object(pk):
+    def get_object(pk, for_update=False):
+        queryset = BookLover.objects.select_for_update() if for_update else BookLover.objects.all()
         try:
-            return BookLover.objects.get(pk=pk)
+            return queryset.get(pk=pk)
         except BookLover.DoesNotExist:
             raise Http404
 
     @swagger_auto_schema(responses={200: BookLoverSerializer()})
     def get(self, request, pk):
-        queryset = self.get_object(pk)
+        not_modified = self.get_not_modified_response(request, BookLover, pk)
+        if not_modified is not None:
+            return not_modified
+        queryset = get_object_or_404(self.eager_load(BookLover.objects.all()), pk=pk)
         serializer = BookLoverSerializer(queryset)
-        return Response(data=serializer.data, status=status.HTTP_200_OK)
+        return self.with_etag(request, Response(data=serializer.data, status=status.HTTP_200_OK), queryset)
 
     @swagger_auto_schema(request_body=BookLoverSerializer)
     def update(self, request, pk):
-        book_lover = self.get_object(pk)
-        serializer = BookLoverSerializer(book_lover, data=request.data)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data)
+        with transaction.atomic():
+            book_lover = self.get_object(pk, for_update=True)
+            precondition_failed = self.get_precondition_failed_response(request, book_lover)
+            if precondition_failed is not None:
+                return precondition_failed
+            serializer = BookLoverSerializer(book_lover, data=request.data)
+            if serializer.is_valid():
+                serializer.save()
+                return self.with_etag(request, Response(serializer.data), book_lover)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def delete(self, request, pk):
@@ -292,8 +504,10 @@ class AuthViewSet(viewsets.ViewSet):
     def login(self, request):
         username = request.data.get('username')
         password = request.data.get('password')
-        user = authenticate(username=username, password=password)
+        user = authenticate(request, username=username, password=password)
         if user:
+            # Как django.contrib.auth.login, но без сессии: сессию заменяют токены
+            user_logged_in.send(sender=user.__class__, request=request, user=user)
             Token.objects.get_or_create(user=user)
             refresh = RefreshToken.for_user(user)
             return Response({'refresh': str(refresh), 'access': str(refresh.access_token)})
@@ -335,19 +549,28 @@ class AuthViewSet(viewsets.ViewSet):
             old_password = passwords.get('old_password')
             new_password = passwords.get('new_password')
 
-            if not user.check_password(old_password):
+            if not check_password(user, old_password):
                 return Response({'error': 'Invalid old password'}, status=status.HTTP_400_BAD_REQUEST)
 
-            user.set_password(new_password)
+            set_password(user, new_password)
             user.save()
+            credential_cache.invalidate_user(user.pk)
 
             return Response({'message': 'Password successfully changed'}, status=status.HTTP_200_OK)
+        except HashingBusy:
+            # 503 отдает HashingBusyMiddleware
+            raise
         except Exception:
             return Response({'error': 'UNAUTHORIZED'}, status=status.HTTP_401_UNAUTHORIZED)
 
 
-class PublisherViewSet(viewsets.ViewSet):
+class PublisherViewSet(BatchRetrieveMixin, ConditionalRequestMixin, EagerLoadingMixin, viewsets.ViewSet):
     permission_classes = [IsAuthenticatedOrReadOnly]
+    eager_serializer_class = PublisherSerializer
+    eager_extra_columns = ('version',)
+    renderer_classes = EXPORT_RENDERER_CLASSES
+    keyset_ordering_field = 'region'
+    sort_fields = ('book_count',)
 
     @staticmethod
     def get_ordering(request):
@@ -356,6 +579,9 @@ class PublisherViewSet(viewsets.ViewSet):
         except Exception:
             return None
 
+    def get_sort(self, request):
+        return get_sort(request, self.sort_fields)
+
     @staticmethod
     def get_filter_name(request):
         try:
@@ -372,19 +598,52 @@ class PublisherViewSet(viewsets.ViewSet):
         except Exception:
             return None
 
+    def get_list_queryset(self, request):
+        ordering = self.get_ordering(request)
+        filter_name = self.get_filter_name(request)
+
+        queryset = self.eager_load(Publisher.objects.all(), self.get_requested_fields(request),
+                                   self.get_requested_expansions(request))
+
+        if filter_name:
+            queryset = queryset.filter(name=filter_name)
+
+        min_books = get_int_param(request, 'min_books')
+        if min_books is not None:
+            queryset = queryset.filter(book_count__gte=min_books)
+
+        sort = self.get_sort(request)
+        if sort is not None:
+            field, descending = sort
+            prefix = '-' if descending else ''
+            queryset = queryset.order_by(f'{prefix}{field}', f'{prefix}id')
+        elif ordering == 'asc':
+            queryset = queryset.order_by('region')
+        elif ordering == 'desc':
+            queryset = queryset.order_by('-region')
+        return queryset
+
     @swagger_auto_schema(
         manual_parameters=[
             openapi.Parameter('ordering', openapi.IN_QUERY, description="Ordering parameter ('asc' or 'desc')",
                               type=openapi.TYPE_STRING),
             openapi.Parameter('name', openapi.IN_QUERY, description="Filter by name", type=openapi.TYPE_STRING),
+            openapi.Parameter('min_books', openapi.IN_QUERY, description="Only publishers with at least this "
+                                                                         "many books", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('sort', openapi.IN_QUERY, description="'book_count' or '-book_count', "
+                                                                    "overrides ordering", type=openapi.TYPE_STRING),
             openapi.Parameter('page', openapi.IN_QUERY, description="Page number", type=openapi.TYPE_INTEGER),
             openapi.Parameter('pagesize', openapi.IN_QUERY, description="Page size", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('cursor', openapi.IN_QUERY, description="Cursor for keyset pagination",
+                              type=openapi.TYPE_STRING),
+            EXPORT_FORMAT_PARAMETER,
+            *SPARSE_FIELDS_PARAMETERS,
+            PUBLISHER_EXPAND_PARAMETER,
         ],
         responses={200: PublisherSerializer(many=True)}
     )
+    @publisher_list_cache
     def list(self, request):
-        ordering = self.get_ordering(request)
-        filter_name = self.get_filter_name(request)
         pagination_data = self.get_pagination(request)
         if pagination_data:
             page = pagination_data['page']
@@ -393,53 +652,85 @@ class PublisherViewSet(viewsets.ViewSet):
             page = None
             page_size = None
 
-        queryset = Publisher.objects.all()
+        queryset = self.get_list_queryset(request)
+        fields = self.get_requested_fields(request)
+        expand = self.get_requested_expansions(request)
 
-        if filter_name:
-            queryset = queryset.filter(name=filter_name)
+        if is_export_requested(request):
+            return export_response(request, queryset, PublisherSerializer, 'publishers', fields=fields, expand=expand)
 
-        if ordering == 'asc':
-            queryset = queryset.order_by('region')
-        elif ordering == 'desc':
-            queryset = queryset.order_by('-region')
+        list_serializer = self.get_list_serializer(fields, expand)
+        queryset = list_serializer.get_queryset(queryset)
+
+        if KeysetPagination.is_requested(request):
+            paginator = KeysetPagination.for_view(self, request)
+            result_page = paginator.paginate_queryset(queryset, request)
+            data = list_serializer.serialize(result_page)
+            return paginator.get_paginated_response(data)
 
         paginator = MyModelPagination(page, page_size)
         result_page = paginator.paginate_queryset(queryset, request)
-        serializer = PublisherSerializer(result_page, many=True)
-        return Response(serializer.data)
+        data = list_serializer.serialize(result_page)
+        return Response(data)
 
     @swagger_auto_schema(request_body=PublisherSerializer)
     def create(self, request):
         serializer = PublisherSerializer(data=request.data)
         if serializer.is_valid():
             serializer.save()
+            publisher_list_cache.invalidate()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @swagger_auto_schema(methods=['get'], manual_parameters=[BATCH_IDS_PARAMETER, *SPARSE_FIELDS_PARAMETERS,
+                                                             PUBLISHER_EXPAND_PARAMETER],
+                         responses=get_batch_responses(PublisherSerializer))
+    @swagger_auto_schema(methods=['post'], request_body=BATCH_IDS_BODY,
+                         manual_parameters=[*SPARSE_FIELDS_PARAMETERS, PUBLISHER_EXPAND_PARAMETER],
+                         responses=get_batch_responses(PublisherSerializer))
+    @action(detail=False, methods=['get', 'post'])
+    def batch_get(self, request):
+        return Response(self.get_batch(request))
+
     @swagger_auto_schema(responses={200: PublisherSerializer()})
     def retrieve(self, request, pk=None):
-        queryset = Publisher.objects.all()
+        not_modified = self.get_not_modified_response(request, Publisher, pk)
+        if not_modified is not None:
+            return not_modified
+        queryset = self.eager_load(Publisher.objects.all())
         book = get_object_or_404(queryset, pk=pk)
         serializer = PublisherSerializer(book)
-        return Response(serializer.data)
+        return self.with_etag(request, Response(serializer.data), book)
 
     @swagger_auto_schema(responses={200: PublisherSerializer()})
     def update(self, request, pk=None):
-        book = Publisher.objects.get(pk=pk)
-        serializer = PublisherSerializer(book, data=request.data)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data)
+        with transaction.atomic():
+            book = get_object_or_404(Publisher.objects.select_for_update(), pk=pk)
+            precondition_failed = self.get_precondition_failed_response(request, book)
+            if precondition_failed is not None:
+                return precondition_failed
+            serializer = PublisherSerializer(book, data=request.data)
+            if serializer.is_valid():
+                serializer.save()
+                publisher_list_cache.invalidate()
+                return self.with_etag(request, Response(serializer.data), book)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def destroy(self, request, pk=None):
         book = Publisher.objects.get(pk=pk)
         book.delete()
+        publisher_list_cache.invalidate()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class BookViewSet(viewsets.ModelViewSet):
+class BookViewSet(BatchRetrieveMixin, ConditionalRequestMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticatedOrReadOnly]
+    eager_serializer_class = BookSerializer
+    eager_extra_columns = ('version',)
+    renderer_classes = EXPORT_RENDERER_CLASSES
+    prefetch_related_fields = ('volumes',)
+    keyset_ordering_field = 'id_book'
+    sort_fields = ('volume_count', 'total_pages')
 
     @staticmethod
     def get_ordering(request):
@@ -448,6 +739,9 @@ class BookViewSet(viewsets.ModelViewSet):
         except Exception:
             return None
 
+    def get_sort(self, request):
+        return get_sort(request, self.sort_fields)
+
     @staticmethod
     def get_filter_name(request):
         try:
@@ -471,18 +765,85 @@ class BookViewSet(viewsets.ModelViewSet):
         except Exception:
             return None
 
+    @staticmethod
+    def get_search(request):
+        try:
+            return request.GET.get('search', '').strip()
+        except Exception:
+            return None
+
+    @staticmethod
+    def get_allow_partial(request):
+        try:
+            return request.GET.get('allow_partial', '').lower() in ('1', 'true', 'yes')
+        except Exception:
+            return False
+
+    def get_list_queryset(self, request):
+        ordering = self.get_ordering(request)
+        filter_title = self.get_filter_name(request)
+        filter_date = self.get_filter_date(request)
+        search = self.get_search(request)
+
+        queryset = self.eager_load(Book.objects.all(), self.get_requested_fields(request),
+                                   self.get_requested_expansions(request))
+
+        if filter_title:
+            queryset = queryset.filter(title=filter_title)
+        if filter_date:
+            queryset = queryset.filter(year_of_release=filter_date)
+        # Счетчики хранятся в самой книге: фильтр и сортировка без JOIN и агрегатов по томам
+        min_pages = get_int_param(request, 'min_pages')
+        if min_pages is not None:
+            queryset = queryset.filter(total_pages__gte=min_pages)
+        max_pages = get_int_param(request, 'max_pages')
+        if max_pages is not None:
+            queryset = queryset.filter(total_pages__lte=max_pages)
+        volume_count = get_int_param(request, 'volume_count')
+        if volume_count is not None:
+            queryset = queryset.filter(volume_count=volume_count)
+        sort = self.get_sort(request)
+        if search:
+            if sort is None and ordering not in ('asc', 'desc') and KeysetPagination.is_requested(request):
+                # Курсор строится по колонке модели, а релевантность вычисляется в запросе
+                raise ValidationError({'cursor': ['Search results are ordered by relevance and can not be paged '
+                                                  'with a cursor; use page and pagesize, or sort or ordering']})
+            queryset = search_books(queryset, search).order_by('-rank', 'id_book')
+
+        if sort is not None:
+            field, descending = sort
+            prefix = '-' if descending else ''
+            queryset = queryset.order_by(f'{prefix}{field}', f'{prefix}id_book')
+        elif ordering == 'asc':
+            queryset = queryset.order_by('id_book')
+        elif ordering == 'desc':
+            queryset = queryset.order_by('-id_book')
+        return queryset
+
     @swagger_auto_schema(manual_parameters=[
         openapi.Parameter('ordering', openapi.IN_QUERY, description="Ordering (asc or desc)", type=openapi.TYPE_STRING),
         openapi.Parameter('title', openapi.IN_QUERY, description="Filter by title", type=openapi.TYPE_STRING),
+        openapi.Parameter('search', openapi.IN_QUERY, description="Full-text and fuzzy search by title, "
+                                                                  "ordered by relevance; cursor pages need sort "
+                                                                  "or ordering", type=openapi.TYPE_STRING),
         openapi.Parameter('year', openapi.IN_QUERY, description="Filter by year", type=openapi.TYPE_STRING),
+        openapi.Parameter('min_pages', openapi.IN_QUERY, description="Minimum total pages", type=openapi.TYPE_INTEGER),
+        openapi.Parameter('max_pages', openapi.IN_QUERY, description="Maximum total pages", type=openapi.TYPE_INTEGER),
+        openapi.Parameter('volume_count', openapi.IN_QUERY, description="Filter by number of volumes",
+                          type=openapi.TYPE_INTEGER),
+        openapi.Parameter('sort', openapi.IN_QUERY, description="'total_pages' or 'volume_count', '-' for "
+                                                                "descending; overrides ordering and relevance",
+                          type=openapi.TYPE_STRING),
         openapi.Parameter('page', openapi.IN_QUERY, description="Page number", type=openapi.TYPE_INTEGER),
         openapi.Parameter('pagesize', openapi.IN_QUERY, description="Page size", type=openapi.TYPE_INTEGER),
+        openapi.Parameter('cursor', openapi.IN_QUERY, description="Cursor for keyset pagination",
+                          type=openapi.TYPE_STRING),
+        EXPORT_FORMAT_PARAMETER,
+        *SPARSE_FIELDS_PARAMETERS,
+        BOOK_EXPAND_PARAMETER,
     ], responses={200: BookSerializer()})
     def list(self, request):
-        ordering = self.get_ordering(request)
-        filter_title = self.get_filter_name(request)
         pagination_data = self.get_pagination(request)
-        filter_date = self.get_filter_date(request)
 
         if pagination_data:
             page = pagination_data['page']
@@ -491,49 +852,207 @@ class BookViewSet(viewsets.ModelViewSet):
             page = None
             page_size = None
 
-        queryset = Book.objects.all()
+        queryset = self.get_list_queryset(request)
+        fields = self.get_requested_fields(request)
+        expand = self.get_requested_expansions(request)
 
-        if filter_title:
-            queryset = queryset.filter(title=filter_title)
-        if filter_date:
-            queryset = queryset.filter(year_of_release=filter_date)
+        if is_export_requested(request):
+            return export_response(request, queryset, BookSerializer, 'books', fields=fields, expand=expand)
 
-        if ordering == 'asc':
-            queryset = queryset.order_by('id_book')
-        elif ordering == 'desc':
-            queryset = queryset.order_by('-id_book')
+        list_serializer = self.get_list_serializer(fields, expand)
+        queryset = list_serializer.get_queryset(queryset)
+
+        if KeysetPagination.is_requested(request):
+            paginator = KeysetPagination.for_view(self, request)
+            result_page = paginator.paginate_queryset(queryset, request)
+            data = list_serializer.serialize(result_page)
+            return paginator.get_paginated_response(data)
 
         paginator = MyModelPagination(page, page_size)
         result_page = paginator.paginate_queryset(queryset, request)
-        serializer = BookSerializer(result_page, many=True)
-        return Response(serializer.data)
+        data = list_serializer.serialize(result_page)
+        return Response(data)
+
+    @swagger_auto_schema(methods=['get'], manual_parameters=[BATCH_IDS_PARAMETER, *SPARSE_FIELDS_PARAMETERS,
+                                                             BOOK_EXPAND_PARAMETER],
+                         responses=get_batch_responses(BookSerializer))
+    @swagger_auto_schema(methods=['post'], request_body=BATCH_IDS_BODY,
+                         manual_parameters=[*SPARSE_FIELDS_PARAMETERS, BOOK_EXPAND_PARAMETER],
+                         responses=get_batch_responses(BookSerializer))
+    @action(detail=False, methods=['get', 'post'])
+    def batch_get(self, request):
+        return Response(self.get_batch(request))
 
     @swagger_auto_schema(responses={200: BookSerializer()})
     def retrieve(self, request, pk=None):
-        queryset = Book.objects.all()
+        not_modified = self.get_not_modified_response(request, Book, pk)
+        if not_modified is not None:
+            return not_modified
+        queryset = self.eager_load(Book.objects.all())
         publisher = get_object_or_404(queryset, pk=pk)
         serializer = BookSerializer(publisher)
-        return Response(serializer.data)
+        return self.with_etag(request, Response(serializer.data), publisher)
 
     @swagger_auto_schema(request_body=BookSerializer)
     def create(self, request, *args, **kwargs):
+        if isinstance(request.data, list):
+            return self.bulk_create(request)
         serializer = BookSerializer(data=request.data)
         if serializer.is_valid():
             serializer.save()
+            publisher_list_cache.invalidate()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @staticmethod
+    def get_bulk_max_size():
+        return getattr(settings, 'BOOK_BULK_MAX_SIZE', 50000)
+
+    @swagger_auto_schema(request_body=BookSerializer(many=True), manual_parameters=[
+        openapi.Parameter('allow_partial', openapi.IN_QUERY,
+                          description="Create the valid books even if some items are invalid",
+                          type=openapi.TYPE_BOOLEAN),
+    ])
+    @action(detail=False, methods=['post'])
+    def bulk_create(self, request):
+        if not isinstance(request.data, list):
+            return Response({'error': 'Expected a list of books'}, status=status.HTTP_400_BAD_REQUEST)
+        max_size = self.get_bulk_max_size()
+        if len(request.data) > max_size:
+            return Response({'error': f'No more than {max_size} books per request'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = BookSerializer(data=request.data, many=True)
+        items, errors = serializer.validate_items()
+        if not items or (errors and not self.get_allow_partial(request)):
+            return Response({'created': 0, 'ids': [], 'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        books = serializer.create([item for _, item in items])
+        publisher_list_cache.invalidate()
+        return Response({'created': len(books), 'ids': [book.pk for book in books], 'errors': errors},
+                        status=status.HTTP_201_CREATED)
+
     @swagger_auto_schema(responses={200: BookSerializer()})
     def update(self, request, *args, **kwargs):
-        instance = self.get_object()
-        serializer = BookSerializer(instance, data=request.data)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data)
+        with transaction.atomic():
+            instance = get_object_or_404(Book.objects.select_for_update(), pk=kwargs.get('pk'))
+            precondition_failed = self.get_precondition_failed_response(request, instance)
+            if precondition_failed is not None:
+                return precondition_failed
+            serializer = BookSerializer(instance, data=request.data)
+            if serializer.is_valid():
+                serializer.save()
+                publisher_list_cache.invalidate()
+                return self.with_etag(request, Response(serializer.data), instance)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @swagger_auto_schema(manual_parameters=[
+        openapi.Parameter('cover_photo', openapi.IN_FORM, description="Cover image", type=openapi.TYPE_FILE,
+                          required=True),
+    ], responses={202: BookCoverSerializer()})
+    @action(detail=True, methods=['put'])
+    def upload_cover(self, request, pk=None):
+        with transaction.atomic():
+            instance = get_object_or_404(Book.objects.select_for_update(), pk=pk)
+            precondition_failed = self.get_precondition_failed_response(request, instance)
+            if precondition_failed is not None:
+                return precondition_failed
+            serializer = BookCoverSerializer(instance, data=request.data)
+            if serializer.is_valid():
+                serializer.save()
+                # Миниатюры строятся после коммита в пуле потоков, клиент увидит их в cover_thumbnails
+                return self.with_etag(request, Response(serializer.data, status=status.HTTP_202_ACCEPTED),
+                                      instance)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def destroy(self, request, pk):
         queryset = Book.objects.all()
         instance = get_object_or_404(queryset, pk =pk)
         instance.delete()
+        publisher_list_cache.invalidate()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class CoverUploadViewSet(ConditionalRequestMixin, viewsets.ViewSet):
+    """
+    Resumable cover upload: create a session, PUT byte ranges of the file with
+    Content-Range and X-Chunk-SHA256 headers, then finalize to attach the
+    assembled file to the book. GET returns the offset to resume from.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @staticmethod
+    def get_upload(request, pk, upload_id, for_update=False):
+        queryset = CoverUpload.objects.select_for_update() if for_update else CoverUpload.objects.all()
+        return get_object_or_404(queryset, pk=upload_id, book_id=pk, owner=request.user)
+
+    @swagger_auto_schema(request_body=CoverUploadSerializer, responses={201: CoverUploadSerializer()})
+    def create(self, request, pk):
+        book = get_object_or_404(Book.objects.only('pk'), pk=pk)
+        serializer = CoverUploadSerializer(data=request.data)
+        if serializer.is_valid():
+            serializer.save(book=book, owner=request.user)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @swagger_auto_schema(responses={200: CoverUploadSerializer()})
+    def retrieve(self, request, pk, upload_id):
+        return Response(CoverUploadSerializer(self.get_upload(request, pk, upload_id)).data)
+
+    @swagger_auto_schema(manual_parameters=[
+        openapi.Parameter('Content-Range', openapi.IN_HEADER, description="bytes start-end/total",
+                          type=openapi.TYPE_STRING, required=True),
+        openapi.Parameter('X-Chunk-SHA256', openapi.IN_HEADER, description="Hex SHA-256 of the chunk",
+                          type=openapi.TYPE_STRING, required=True),
+    ], responses={200: CoverUploadSerializer()})
+    def upload_chunk(self, request, pk, upload_id):
+        upload = self.get_upload(request, pk, upload_id)
+        try:
+            start, end = parse_content_range(request.headers.get('Content-Range'), upload.size)
+            # Тело читается из потока блоками прямо в файл без транзакции: медленный клиент
+            # не держит ни соединение из пула, ни блокировку строки
+            write_chunk(upload, request.stream, start, end, request.headers.get('X-Chunk-SHA256'))
+            with transaction.atomic():
+                upload = self.get_upload(request, pk, upload_id, for_update=True)
+                advance_offset(upload, start, end)
+        except ChunkError as exc:
+            return Response({'error': str(exc), 'offset': upload.offset}, status=exc.status_code)
+        return Response(CoverUploadSerializer(upload).data)
+
+    @swagger_auto_schema(request_body=no_body, responses={200: BookCoverSerializer()})
+    def finalize(self, request, pk, upload_id):
+        saved = []
+        try:
+            with transaction.atomic():
+                upload = self.get_upload(request, pk, upload_id, for_update=True)
+                if upload.offset != upload.size:
+                    return Response({'error': 'Upload is incomplete', 'offset': upload.offset},
+                                    status=status.HTTP_409_CONFLICT)
+                path = get_part_path(upload)
+                if upload.checksum and get_file_checksum(path) != upload.checksum:
+                    discard(upload)
+                    return Response({'error': 'File checksum mismatch'}, status=status.HTTP_400_BAD_REQUEST)
+
+                book = get_object_or_404(Book.objects.select_for_update(), pk=pk)
+                precondition_failed = self.get_precondition_failed_response(request, book)
+                if precondition_failed is not None:
+                    return precondition_failed
+                # Файл копируется, а не переносится: при откате сессия остается вместе со своими данными
+                with open(path, 'rb') as assembled:
+                    serializer = BookCoverSerializer(book, data={'cover_photo': File(assembled,
+                                                                                     name=upload.filename)})
+                    if not serializer.is_valid():
+                        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+                    serializer.save()
+                saved.append(book.cover_photo.name)
+                discard(upload)
+        except Exception:
+            # Транзакция откатилась: книга не ссылается на скопированную обложку
+            for name in saved:
+                default_storage.delete(name)
+            raise
+        return self.with_etag(request, Response(serializer.data), book)
+
+    def destroy(self, request, pk, upload_id):
+        discard(self.get_upload(request, pk, upload_id))
         return Response(status=status.HTTP_204_NO_CONTENT)